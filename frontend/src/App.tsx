@@ -25,8 +25,8 @@ const App = () => {
       <ThemeProvider>
         <LoadingProvider>
           <AuthProvider>
-            <SocketProvider>
-              <AlertQueueProvider>
+            <AlertQueueProvider>
+              <SocketProvider>
                 <AlertQueue>
                   <Content>
                     <Routes>
@@ -92,8 +92,8 @@ const App = () => {
                   <Navbar />
                   {/* <TopNavbar /> */}
                 </AlertQueue>
-              </AlertQueueProvider>
-            </SocketProvider>
+              </SocketProvider>
+            </AlertQueueProvider>
           </AuthProvider>
           <LoadingMask />
         </LoadingProvider>
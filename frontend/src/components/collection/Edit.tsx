@@ -6,7 +6,7 @@ import Modal from "components/modal";
 import UploadContent from "components/UploadContent";
 import { useAuth } from "contexts/AuthContext";
 import { useLoading } from "contexts/LoadingContext";
-import { useSocket } from "contexts/SocketContext";
+import { useSocket, withProgress } from "contexts/SocketContext";
 import { useAlertQueue } from "hooks/alerts";
 import { useEffect, useMemo, useState } from "react";
 import { ListManager } from "react-beautiful-dnd-grid";
@@ -24,7 +24,7 @@ const CollectionEdit: React.FC<CollectionEditProps> = ({
   const [title, setTitle] = useState<string>("");
   const [description, setDescription] = useState<string>("");
   const { auth, client } = useAuth();
-  const { updated_image } = useSocket();
+  const { translations, startTranslation, stopTranslation } = useSocket();
   const { startLoading, stopLoading } = useLoading();
   const [showUploadModal, setShowUploadModal] = useState(false);
   const [showDeleteImageModal, setShowDeleteImageModal] = useState(false);
@@ -52,13 +52,6 @@ const CollectionEdit: React.FC<CollectionEditProps> = ({
       asyncfunction();
     }
   }, [collection?.id]);
-  useEffect(() => {
-    if (updated_image && images) {
-      const img = images?.find((image) => image.id == updated_image.id);
-      if (img) img.is_translated = true;
-      setImages([...images]);
-    }
-  }, [updated_image]);
   const apiClient1: AxiosInstance = useMemo(
     () =>
       axios.create({
@@ -72,6 +65,55 @@ const CollectionEdit: React.FC<CollectionEditProps> = ({
     [auth?.token],
   );
   const API_Uploader = useMemo(() => new Api(apiClient1), [apiClient1]);
+  // Uploads and deletes change the collection on the server, so the version to edit from is read again
+  const refreshVersion = async (collection_id: string) => {
+    const { data } = await client.GET("/collection/get", {
+      params: { query: { id: collection_id } },
+    });
+    if (data)
+      setCollection((prev) => prev && { ...prev, version: data.version });
+  };
+  // Saves the editor's changes, retrying once from the latest version if the collection changed meanwhile
+  const saveCollection = async (
+    base: Collection,
+    image_ids: Array<string>,
+    retry: boolean,
+  ) => {
+    const { data, error, response } = await client.POST("/collection/edit", {
+      body: {
+        ...base,
+        images: image_ids,
+        featured_image,
+        title,
+        description,
+      },
+    });
+    if (response.status == 409 && retry) {
+      const { data: latest } = await client.GET("/collection/get", {
+        params: { query: { id: base.id } },
+      });
+      if (latest) {
+        // Keep the editor's order, dropping images deleted elsewhere and adding ones uploaded elsewhere
+        const merged = [
+          ...image_ids.filter((id) => latest.images.includes(id)),
+          ...latest.images.filter((id) => !image_ids.includes(id)),
+        ];
+        return saveCollection(latest, merged, false);
+      }
+    }
+    if (error || !data) {
+      addAlert(
+        response.status == 409
+          ? "The collection was changed elsewhere. Please reload it."
+          : error?.detail?.toString(),
+        "error",
+      );
+      return;
+    }
+    setCollection(data);
+    setReorderImageIds([...data.images]);
+    addAlert("The collection has been updated successfully!", "success");
+  };
   const handleSave = async (e: React.FormEvent) => {
     e.preventDefault();
     // Use e.nativeEvent to access the native event
@@ -84,23 +126,7 @@ const CollectionEdit: React.FC<CollectionEditProps> = ({
         if (collection && reorderImageIds) {
           const asyncfunction = async () => {
             startLoading();
-            collection.images = reorderImageIds;
-            const { error } = await client.POST("/collection/edit", {
-              body: { ...collection, featured_image, title, description },
-            });
-            if (error) addAlert(error.detail?.toString(), "error");
-            else {
-              setCollection({
-                ...collection,
-                featured_image,
-                title,
-                description,
-              });
-              addAlert(
-                "The collection has been updated successfully!",
-                "success",
-              );
-            }
+            await saveCollection(collection, reorderImageIds, true);
             stopLoading();
           };
           asyncfunction();
@@ -108,14 +134,18 @@ const CollectionEdit: React.FC<CollectionEditProps> = ({
         break;
       case "publish":
         if (collection) {
-          const { error } = await client.POST("/collection/set_publish", {
-            body: { id: collection.id, flag: !collection.publish_flag },
-          });
+          const { data, error } = await client.POST(
+            "/collection/set_publish",
+            {
+              body: { id: collection.id, flag: !collection.publish_flag },
+            },
+          );
           if (error) addAlert(error.detail?.toString(), "error");
-          else {
+          else if (data) {
             setCollection({
               ...collection,
-              publish_flag: !collection.publish_flag,
+              publish_flag: data.publish_flag,
+              version: data.version,
             });
             addAlert(
               "The collection has been updated successfully!",
@@ -140,7 +170,7 @@ const CollectionEdit: React.FC<CollectionEditProps> = ({
         if (collection.images.length == 0 || images == undefined) {
           // no images
           setImages([new_image]);
-          client.POST("/set_featured_image", {
+          await client.POST("/collection/set_featured_image", {
             body: { image_url: first_image, collection_id: collection.id },
           });
           // set the first image as featured one
@@ -153,18 +183,26 @@ const CollectionEdit: React.FC<CollectionEditProps> = ({
         collection.images.push(new_image.id);
         setReorderImageIds([...collection.images]);
         setCollection({ ...collection });
+        await refreshVersion(collection.id);
       }
     }
   };
   const handleTranslateOneImage = async (image_id: string) => {
     if (images) {
       startLoading();
-      addAlert(
-        "The image is being tranlated. Please wait a moment.",
-        "primary",
-      );
-      await client.POST("/image/translate", { body: { image_id } });
+      startTranslation(image_id);
+      const { error } = await client.POST("/image/translate", {
+        body: { image_id },
+      });
       stopLoading();
+      if (error) {
+        stopTranslation(image_id);
+        addAlert(error.detail?.toString(), "error");
+      } else
+        addAlert(
+          "The image is being tranlated. Please wait a moment.",
+          "primary",
+        );
     }
   };
   const onDeleteImage = async () => {
@@ -183,6 +221,7 @@ const CollectionEdit: React.FC<CollectionEditProps> = ({
         setImages(new_images);
         setReorderImageIds([...collection.images]);
         setCollection({ ...collection });
+        await refreshVersion(collection.id);
         addAlert("The image has been deleted!", "success");
       }
       setShowDeleteImageModal(false);
@@ -307,7 +346,8 @@ const CollectionEdit: React.FC<CollectionEditProps> = ({
                 <div className="w-full sm:w-1/2 lg:w-1/3 xl:w-1/4 2xl:w-1/5">
                   {image && (
                     <ImageComponent
-                      {...image}
+                      {...withProgress(image, translations[image.id])}
+                      is_translating={translations[image.id]?.pending ?? false}
                       handleTranslateOneImage={handleTranslateOneImage}
                       showDeleteModal={onShowDeleteImageModal}
                     />
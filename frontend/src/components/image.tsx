@@ -3,13 +3,16 @@ import { CheckCircleFill, LockFill, TrashFill } from "react-bootstrap-icons";
 import { ImageType } from "types/model";
 // Extend the existing ImageType interface to include the new function
 interface ImageWithFunction extends ImageType {
+  is_translating: boolean;
   handleTranslateOneImage: (image_id: string) => void;
   showDeleteModal: (id: string) => void;
 }
 const ImageComponent: React.FC<ImageWithFunction> = ({
   id,
   is_translated,
+  is_translating,
   image_url,
+  transcriptions,
   handleTranslateOneImage,
   showDeleteModal,
 }) => {
@@ -26,6 +29,13 @@ const ImageComponent: React.FC<ImageWithFunction> = ({
               <span>The image has been translated</span>
             </div>
           </>
+        ) : is_translating ? (
+          <>
+            <div className="absolute top-2 right-2 flex items-center text-white bg-blue-600 py-1 px-3 rounded text-xs">
+              <div className="w-3 h-3 mr-2 border-2 border-transparent border-t-white rounded-full animate-spin" />
+              <span>The image is being translated</span>
+            </div>
+          </>
         ) : (
           <>
             <div className="absolute top-2 right-2 flex items-center text-white bg-red-600 py-1 px-3 rounded text-xs">
@@ -34,6 +44,14 @@ const ImageComponent: React.FC<ImageWithFunction> = ({
             </div>
           </>
         )}
+        {/* The sentences are shown as soon as they are read */}
+        {transcriptions.length > 0 && (
+          <div className="absolute inset-x-0 bottom-0 max-h-20 overflow-y-auto bg-gray-900/70 text-white text-xs p-2">
+            {transcriptions.map((transcription, index) => (
+              <span key={index}>{transcription.text}</span>
+            ))}
+          </div>
+        )}
         {/* Centered Edit Button */}
         <div className="absolute inset-x-0 bottom-1/2 transform translate-y-1/2 flex items-center justify-center gap-2">
           {is_translated ? (
@@ -55,7 +73,8 @@ const ImageComponent: React.FC<ImageWithFunction> = ({
           ) : (
             <div className="flex gap-2">
               <button
-                className="bg-blue-500 text-white py-1 px-3 rounded"
+                className="bg-blue-500 text-white py-1 px-3 rounded disabled:bg-gray-600"
+                disabled={is_translating}
                 onClick={() => handleTranslateOneImage(id)}
               >
                 Translate
@@ -1,44 +1,153 @@
-import React, { createContext, useContext, useEffect, useState } from "react";
+import { useAlertQueue } from "hooks/alerts";
+import React, {
+  createContext,
+  useCallback,
+  useContext,
+  useEffect,
+  useState,
+} from "react";
 import io, { Socket } from "socket.io-client";
-import { ImageType } from "types/model";
+import { ImageType, Transcription } from "types/model";
 import { useAuth } from "./AuthContext";
 
+// What is known about an image while it is being translated
+export interface TranslationProgress {
+  pending: boolean;
+  transcriptions: Array<Transcription> | null;
+  is_translated: boolean;
+}
+
 interface SocketContextProps {
   socket: Socket | null;
-  updated_image: ImageType | null;
+  translations: Record<string, TranslationProgress>;
+  startTranslation: (image_id: string) => void;
+  stopTranslation: (image_id: string) => void;
 }
 
 const SERVER_URL = process.env.REACT_APP_BACKEND_URL || "http://localhost:8080";
 
+const emptyProgress: TranslationProgress = {
+  pending: true,
+  transcriptions: null,
+  is_translated: false,
+};
+
 // Create the context
 const SocketContext = createContext<SocketContextProps>({
   socket: null,
-  updated_image: null,
+  translations: {},
+  startTranslation: () => {},
+  stopTranslation: () => {},
 });
 
+// Applies the image's progress, as it arrives, over the image as it was loaded
+export const withProgress = (
+  image: ImageType,
+  progress: TranslationProgress | undefined,
+): ImageType => {
+  if (!progress) return image;
+  return {
+    ...image,
+    transcriptions: progress.transcriptions ?? image.transcriptions,
+    is_translated: progress.is_translated || image.is_translated,
+  };
+};
+
 // Provider component
 export const SocketProvider: React.FC<{ children: React.ReactNode }> = ({
   children,
 }) => {
   const [socket, setSocket] = useState<Socket | null>(null);
   const { auth } = useAuth();
-  const [updated_image, setImage] = useState<ImageType | null>(null);
+  const { addAlert } = useAlertQueue();
+  const [translations, setTranslations] = useState<
+    Record<string, TranslationProgress>
+  >({});
+
+  // Events can arrive faster than React renders, so each one updates the latest state
+  const updateProgress = useCallback(
+    (
+      image_id: string,
+      update: (progress: TranslationProgress) => TranslationProgress,
+    ) => {
+      setTranslations((prev) => ({
+        ...prev,
+        [image_id]: update(prev[image_id] ?? emptyProgress),
+      }));
+    },
+    [],
+  );
+
+  const startTranslation = useCallback(
+    (image_id: string) => updateProgress(image_id, () => emptyProgress),
+    [updateProgress],
+  );
+
+  const stopTranslation = useCallback(
+    (image_id: string) =>
+      updateProgress(image_id, (progress) => ({ ...progress, pending: false })),
+    [updateProgress],
+  );
+
   useEffect(() => {
     if (auth?.id) {
       const newSocket = io(SERVER_URL);
       newSocket.on("connect", () => {
         console.log("Connected to server");
-        newSocket.emit("register_user", auth.id); // Register the user with their ID
+        newSocket.emit("register_user", auth.token); // Register with the access token, which names the user
       });
 
       newSocket.on("disconnect", () => {
         console.log("Disconnected from server");
       });
-      // Listen for the 'notification' event from the server
-      newSocket.on("notification", (data: ImageType) => {
-        console.log(data);
-        setImage({ ...data });
+      // The sentences are sent as soon as they are read, before their speech
+      newSocket.on(
+        "translation_transcribed",
+        (data: { image_id: string; transcriptions: Array<Transcription> }) => {
+          updateProgress(data.image_id, (progress) => ({
+            ...progress,
+            transcriptions: data.transcriptions,
+          }));
+        },
+      );
+      // Then the speech of each sentence, as it is uploaded
+      newSocket.on(
+        "translation_audio",
+        (data: { image_id: string; index: number; audio_url: string }) => {
+          updateProgress(data.image_id, (progress) => {
+            if (!progress.transcriptions) return progress;
+            const transcriptions = progress.transcriptions.map(
+              (transcription, index) =>
+                index === data.index
+                  ? { ...transcription, audio_url: data.audio_url }
+                  : transcription,
+            );
+            return { ...progress, transcriptions };
+          });
+        },
+      );
+      // The server sends the translated image once its speech is ready
+      newSocket.on("translation_done", (data: { image: ImageType }) => {
+        updateProgress(data.image.id, () => ({
+          pending: false,
+          transcriptions: data.image.transcriptions,
+          is_translated: true,
+        }));
       });
+      newSocket.on(
+        "translation_failed",
+        (data: { image_id: string; error: string; retrying: boolean }) => {
+          if (data.retrying) {
+            addAlert(
+              "The translation failed and will be retried shortly.",
+              "info",
+            );
+            return;
+          }
+          stopTranslation(data.image_id);
+          addAlert(`The translation failed: ${data.error}`, "error");
+        },
+      );
 
       setSocket(newSocket);
 
@@ -49,7 +158,9 @@ export const SocketProvider: React.FC<{ children: React.ReactNode }> = ({
   }, [auth?.id]);
 
   return (
-    <SocketContext.Provider value={{ socket, updated_image }}>
+    <SocketContext.Provider
+      value={{ socket, translations, startTranslation, stopTranslation }}
+    >
       {children}
     </SocketContext.Provider>
   );
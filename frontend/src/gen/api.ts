@@ -30,7 +30,7 @@ export interface paths {
     };
     get: operations["public_collections"];
     put?: never;
-    post: operations["set_featured_image"];
+    post?: never;
     /** Delete Artifact */
     delete?: never;
     options?: never;
@@ -38,6 +38,22 @@ export interface paths {
     patch?: never;
     trace?: never;
   };
+  "/collection/set_featured_image": {
+    parameters: {
+      query?: never;
+      header?: never;
+      path?: never;
+      cookie?: never;
+    };
+    get?: never;
+    put?: never;
+    post: operations["set_featured_image"];
+    delete?: never;
+    options?: never;
+    head?: never;
+    patch?: never;
+    trace?: never;
+  };
   "/image/get_all": {
     parameters: {
       query?: never;
@@ -1039,7 +1055,7 @@ export interface operations {
           [name: string]: unknown;
         };
         content: {
-          "application/json": never;
+          "application/json": Collection;
         };
       };
       /** @description Validation Error */
@@ -1192,7 +1208,7 @@ export interface operations {
           [name: string]: unknown;
         };
         content: {
-          "application/json": never;
+          "application/json": Collection;
         };
       };
       /** @description Validation Error */
@@ -1290,7 +1306,7 @@ export interface operations {
           [name: string]: unknown;
         };
         content: {
-          "application/json": null;
+          "application/json": Collection;
         };
       };
       /** @description Validation Error */
@@ -6,9 +6,11 @@ export interface Collection {
   user: string;
   featured_image: string;
   publish_flag: boolean;
+  // Bumped by every change to the collection; edits sent with an older one are refused
+  version?: number;
 }
 
-interface Transcription {
+export interface Transcription {
   text: string;
   pinyin: string;
   translation: string;
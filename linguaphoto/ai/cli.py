@@ -1,55 +1,228 @@
-"""Defines a single CLI for calling the pipeline on an image."""
+"""Defines a single CLI for calling the pipeline on images.
+
+Inputs may be image files, directories (searched recursively for images) or
+glob patterns. Each image gets its own output directory holding the
+transcription and the synthesized speech for every sentence. Completed
+images are recorded in a manifest, so an interrupted run can be resumed by
+running the same command again.
+
+The OpenAI API key is read from the `OPENAI_API_KEY` environment variable.
+
+    python -m linguaphoto.ai.cli book/ output/ --concurrency 4
+"""
 
 import argparse
 import asyncio
+import glob
+import hashlib
+import json
 import logging
+import time
+from dataclasses import dataclass, field
 from io import BytesIO
 from pathlib import Path
 
 from openai import AsyncOpenAI
-from PIL import Image
 
+from linguaphoto.ai.client import get_openai_client
 from linguaphoto.ai.transcribe import transcribe_image
 from linguaphoto.ai.tts import synthesize_text
+from linguaphoto.models import Transcription
+from linguaphoto.utils.executors import run_in_thread
+from linguaphoto.utils.timing import StageTimer
 
 logger = logging.getLogger(__name__)
 
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp", ".gif"}
+MANIFEST_NAME = "manifest.jsonl"
+
+
+def find_images(inputs: list[str]) -> list[Path]:
+    """Expands files, directories and glob patterns into a sorted, de-duplicated list of images."""
+    paths: set[Path] = set()
+    for value in inputs:
+        matches = [Path(match) for match in glob.glob(value, recursive=True)] or [Path(value)]
+        for match in matches:
+            if match.is_dir():
+                paths.update(p for p in match.rglob("*") if p.suffix.lower() in IMAGE_SUFFIXES)
+            elif match.is_file():
+                paths.add(match)
+            else:
+                logger.warning("No images found for %s", value)
+    return sorted(path.resolve() for path in paths)
+
+
+def get_output_dir(root_dir: Path, image_path: Path) -> Path:
+    # The path hash keeps images with the same name in different directories apart.
+    digest = hashlib.sha1(str(image_path).encode("utf-8")).hexdigest()[:8]
+    return root_dir / f"{image_path.stem}-{digest}"
+
+
+def read_manifest(manifest_path: Path) -> set[str]:
+    """Returns the images recorded as completed in the manifest."""
+    if not manifest_path.exists():
+        return set()
+    done: set[str] = set()
+    with open(manifest_path, "r") as file:
+        for line in file:
+            try:
+                done.add(json.loads(line)["image"])
+            except (ValueError, KeyError):
+                # A line cut short by an interrupted run; that image is simply redone.
+                continue
+    return done
+
+
+@dataclass
+class BatchStats:
+    """Progress of a batch run."""
+
+    total: int
+    skipped: int = 0
+    done: int = 0
+    failed: int = 0
+    tokens: int = 0
+    stage_seconds: dict[str, float] = field(default_factory=dict)
+    started_at: float = field(default_factory=time.perf_counter)
+
+    def add(self, tokens: int, timer: StageTimer) -> None:
+        self.done += 1
+        self.tokens += tokens
+        for stage, seconds in timer.durations.items():
+            self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + seconds
+
+    @property
+    def images_per_minute(self) -> float:
+        elapsed = time.perf_counter() - self.started_at
+        return self.done / elapsed * 60 if elapsed > 0 else 0.0
+
+    def summary(self) -> str:
+        stages = " ".join(
+            f"{stage}={seconds / max(self.done, 1) * 1000:.0f}ms" for stage, seconds in self.stage_seconds.items()
+        )
+        return (
+            f"{self.done + self.skipped}/{self.total} images ({self.skipped} skipped, {self.failed} failed), "
+            f"{self.images_per_minute:.1f} images/min, {self.tokens} tokens, mean per image: {stages}"
+        )
+
+
+async def synthesize_to_file(
+    transcription: Transcription,
+    audio_path: Path,
+    client: AsyncOpenAI,
+    semaphore: asyncio.Semaphore,
+) -> None:
+    async with semaphore:
+        audio = BytesIO()
+        async for chunk in await synthesize_text(transcription.text, client):
+            audio.write(chunk)
+    await run_in_thread(audio_path.write_bytes, audio.getvalue())
+
+
+async def process_image(
+    image_path: Path,
+    output_dir: Path,
+    client: AsyncOpenAI,
+    tts_semaphore: asyncio.Semaphore,
+) -> tuple[int, StageTimer]:
+    """Transcribes one image and synthesizes its sentences concurrently.
+
+    Returns:
+        The tokens used and the time spent in each stage.
+    """
+    timer = StageTimer()
+    with timer.stage("read"):
+        content = await run_in_thread(image_path.read_bytes)
+    with timer.stage("transcribe"):
+        transcription_response = await transcribe_image(BytesIO(content), client)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    with timer.stage("speech"):
+        await asyncio.gather(
+            *(
+                synthesize_to_file(transcription, output_dir / f"audio_{i}.mp3", client, tts_semaphore)
+                for i, transcription in enumerate(transcription_response.transcriptions)
+            )
+        )
+    # The transcription is written last, so its presence means the image is complete.
+    transcription_json = transcription_response.model_dump_json(indent=2)
+    await run_in_thread((output_dir / "transcription.json").write_text, transcription_json)
+    return transcription_response.total_tokens, timer
+
+
+async def run_batch(
+    inputs: list[str],
+    root_dir: Path,
+    concurrency: int = 4,
+    tts_concurrency: int = 8,
+    manifest_path: Path | None = None,
+) -> BatchStats:
+    """Runs the pipeline over every image, skipping the ones the manifest records as done.
+
+    Args:
+        inputs: Image files, directories or glob patterns.
+        root_dir: The directory to write the outputs and manifest to.
+        concurrency: The maximum number of images processed at once.
+        tts_concurrency: The maximum number of sentences synthesized at once, across all images.
+        manifest_path: Where to record completed images; defaults to `manifest.jsonl` in `root_dir`.
+
+    Returns:
+        The statistics of the run.
+    """
+    root_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = manifest_path or root_dir / MANIFEST_NAME
+    images = find_images(inputs)
+    done = read_manifest(manifest_path)
+    pending = [path for path in images if str(path) not in done]
+    stats = BatchStats(total=len(images), skipped=len(images) - len(pending))
+    if stats.skipped:
+        logger.info("Skipping %d images already in %s", stats.skipped, manifest_path)
+
+    image_semaphore = asyncio.Semaphore(concurrency)
+    tts_semaphore = asyncio.Semaphore(tts_concurrency)
+    manifest_lock = asyncio.Lock()
+
+    async with get_openai_client() as client:
+
+        async def run_one(image_path: Path) -> None:
+            output_dir = get_output_dir(root_dir, image_path)
+            async with image_semaphore:
+                try:
+                    tokens, timer = await process_image(image_path, output_dir, client, tts_semaphore)
+                except Exception:
+                    stats.failed += 1
+                    logger.exception("Failed to process %s", image_path)
+                    return
+            entry = {"image": str(image_path), "output": str(output_dir), "tokens": tokens, **timer.durations}
+            async with manifest_lock:
+                with open(manifest_path, "a") as file:
+                    file.write(json.dumps(entry) + "\n")
+            stats.add(tokens, timer)
+            logger.info("[%d/%d] %s: %s", stats.done + stats.skipped, stats.total, image_path, timer.summary())
+
+        await asyncio.gather(*(run_one(path) for path in pending))
+
+    logger.info("Finished: %s", stats.summary())
+    return stats
+
 
 async def main() -> None:
     logging.basicConfig(level=logging.INFO)
 
-    parser = argparse.ArgumentParser(description="Transcribe an image to text and synthesize it to speech.")
-    parser.add_argument("image", type=str, help="The path to the image to transcribe.")
-    parser.add_argument("output", type=str, help="The path to save the transcription and synthesized speech.")
+    parser = argparse.ArgumentParser(description="Transcribe images to text and synthesize them to speech.")
+    parser.add_argument("inputs", nargs="+", help="Image files, directories or glob patterns to transcribe.")
+    parser.add_argument("output", type=str, help="The directory to save the transcriptions and speech to.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Images processed at once.")
+    parser.add_argument("--tts-concurrency", type=int, default=8, help="Sentences synthesized at once.")
+    parser.add_argument("--manifest", type=str, default=None, help="Manifest of completed images, for resuming.")
     args = parser.parse_args()
 
-    (root_dir := Path(args.output)).mkdir(parents=True, exist_ok=True)
-
-    # Transcribes the image.
-    image = Image.open(args.image)
-    client = AsyncOpenAI(
-        api_key="sk-svcacct-PFETCFHtqmHOmIpP_IAyQfBGz5LOpvC6Zudj7d5Wcdp9WjJT4ImAxuotGcpyT3BlbkFJRbtswQqIxYHam9TN13mCM04_OTZE-v8z-Rw1WEcwzyZqW_GcK0PNNyFp6BcA"
+    await run_batch(
+        args.inputs,
+        Path(args.output),
+        concurrency=args.concurrency,
+        tts_concurrency=args.tts_concurrency,
+        manifest_path=Path(args.manifest) if args.manifest else None,
     )
-    # Convert the ImageFile to BytesIO
-    image_bytes = BytesIO()
-    image.save(image_bytes, format="JPEG")  # Use the appropriate format for your image
-    image_bytes.seek(0)  # Reset the stream position to the beginning
-
-    # Now call the transcribe_image function with the BytesIO object
-    transcription_response = await transcribe_image(image_bytes, client)
-    print(transcription_response.model_dump_json(indent=2))
-    with open(root_dir / "transcription.json", "w") as file:
-        file.write(transcription_response.model_dump_json(indent=2))
-    logger.info("Transcription saved to %s", args.output)
-
-    # Runs TTS on the image text.
-    for i, transcription in enumerate(transcription_response.transcriptions):
-        text = transcription.text
-        audio_path = root_dir / f"audio_{i}.mp3"
-        with open(audio_path, "wb") as file:
-            async for chunk in await synthesize_text(text, client):
-                file.write(chunk)
-        logger.info("Synthesized speech saved to %s", audio_path)
 
 
 if __name__ == "__main__":
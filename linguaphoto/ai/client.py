@@ -0,0 +1,107 @@
+"""Defines the shared OpenAI client used by the translation pipeline.
+
+The client is started once by the application lifespan (or the standalone
+worker), so its HTTP connection pool, and the TLS handshakes behind it, are
+shared by every image instead of being set up per request. Code which runs
+outside of either, such as the CLIs, gets a client of its own.
+
+Set `OPENAI_BASE_URL` to point the pipeline at a local stand-in server.
+"""
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from types import TracebackType
+from typing import AsyncContextManager, AsyncIterator, Self
+
+from openai import DEFAULT_CONNECTION_LIMITS, AsyncOpenAI, DefaultAsyncHttpxClient, Timeout
+
+from linguaphoto.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+def create_openai_client() -> AsyncOpenAI:
+    """Creates an OpenAI client with the configured connection limits, keep-alive and timeouts."""
+    # The config types come from the SDK's exports, so they match the HTTP library it was built against.
+    limits_type = type(DEFAULT_CONNECTION_LIMITS)
+    http_client = DefaultAsyncHttpxClient(
+        limits=limits_type(
+            max_connections=settings.openai_max_connections,
+            max_keepalive_connections=settings.openai_max_keepalive_connections,
+            keepalive_expiry=settings.openai_keepalive_expiry,
+        ),
+        timeout=Timeout(settings.openai_timeout, connect=settings.openai_connect_timeout),
+    )
+    return AsyncOpenAI(
+        api_key=settings.openai_key,
+        base_url=settings.openai_base_url,
+        max_retries=settings.openai_max_retries,
+        http_client=http_client,
+    )
+
+
+class OpenAIClientPool(AsyncContextManager):
+    """The process-wide OpenAI client, opened and closed with the app.
+
+    The client itself is created on first use, so that the app can start
+    without OpenAI credentials; requests then fail as they would without the pool.
+    """
+
+    def __init__(self) -> None:
+        self._started = False
+        self._client: AsyncOpenAI | None = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def started(self) -> bool:
+        return self._started
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        if not self._started:
+            raise RuntimeError("OpenAI client pool has not been started!")
+        if self._client is None:
+            self._client = create_openai_client()
+            logger.info("Created OpenAI client (max_connections=%d)", settings.openai_max_connections)
+        return self._client
+
+    async def start(self) -> None:
+        self._started = True
+
+    async def close(self) -> None:
+        async with self._lock:
+            self._started = False
+            if self._client is None:
+                return
+            client, self._client = self._client, None
+            await client.close()
+            logger.info("Closed OpenAI client")
+
+    async def __aenter__(self) -> Self:
+        await self.start()
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        await self.close()
+
+
+openai_pool = OpenAIClientPool()
+
+
+@asynccontextmanager
+async def get_openai_client() -> AsyncIterator[AsyncOpenAI]:
+    """Yields the shared client if the pool is started, or otherwise a client for this block only."""
+    if openai_pool.started:
+        yield openai_pool.client
+        return
+    client = create_openai_client()
+    try:
+        yield client
+    finally:
+        await client.close()
@@ -0,0 +1,219 @@
+"""Defines a local stand-in for the parts of the OpenAI API the pipeline uses.
+
+It answers `/v1/chat/completions` with a transcription shaped like
+`TranscriptionResponse`, streamed in chunks if asked to, and streams made-up
+audio from `/v1/audio/speech`, with configurable latency, jitter, error rate
+and rate limiting. Point the app at it to load-test the pipeline without
+calling OpenAI:
+
+    python -m linguaphoto.ai.fake_openai --port 8001 --latency 0.8 --jitter 0.2
+    OPENAI_BASE_URL=http://localhost:8001/v1 OPENAI_API_KEY=fake ...
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+from collections import Counter
+from dataclasses import dataclass
+
+from aiohttp import web
+
+
+@dataclass
+class FakeOpenAIConfig:
+    """How the fake server behaves.
+
+    Latencies are in seconds; each request waits `latency` plus a uniformly
+    random amount of up to `jitter` either way. `error_rate` and
+    `rate_limit_rate` are the fractions of requests answered with a 500 or a
+    429 instead.
+    """
+
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    sentences: int = 3
+    # Gives every response new sentences, so repeated requests miss the speech cache.
+    unique_sentences: bool = True
+    # Streamed completions are sent in chunks of this many characters, `token_latency` apart.
+    stream_chunk_chars: int = 8
+    token_latency: float = 0.0
+    # Cuts the completion off after this many characters, as if it hit the token limit.
+    truncate_at: int | None = None
+    audio_bytes_per_char: int = 2000
+    audio_chunk_size: int = 4096
+    seed: int | None = None
+
+
+CONFIG_KEY = web.AppKey("config", FakeOpenAIConfig)
+STATS_KEY = web.AppKey("stats", Counter)
+
+
+def _error(status: int, message: str, error_type: str) -> web.Response:
+    headers = {"retry-after-ms": "10"} if status == 429 else None
+    body = {"error": {"message": message, "type": error_type, "param": None, "code": None}}
+    return web.json_response(body, status=status, headers=headers)
+
+
+class FakeOpenAI:
+    def __init__(self, config: FakeOpenAIConfig) -> None:
+        self.config = config
+        self.stats: Counter[str] = Counter()
+        self._random = random.Random(config.seed)
+        self._request_ids = itertools.count()
+
+    async def _delay_or_fail(self, route: str) -> web.Response | None:
+        self.stats[f"{route}_requests"] += 1
+        delay = self.config.latency + self._random.uniform(-self.config.jitter, self.config.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        roll = self._random.random()
+        if roll < self.config.rate_limit_rate:
+            self.stats[f"{route}_rate_limited"] += 1
+            return _error(429, "Rate limit reached (fake)", "requests")
+        if roll < self.config.rate_limit_rate + self.config.error_rate:
+            self.stats[f"{route}_errors"] += 1
+            return _error(500, "The server had an error (fake)", "server_error")
+        return None
+
+    async def chat_completions(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        if (failure := await self._delay_or_fail("chat")) is not None:
+            return failure
+        request_id = next(self._request_ids)
+        suffix = f"（{request_id}）" if self.config.unique_sentences else ""
+        content = {
+            "transcriptions": [
+                {
+                    "text": f"这是第{i + 1}句话{suffix}。",
+                    "pinyin": f"zhè shì dì {i + 1} jù huà.",
+                    "translation": f"This is sentence {i + 1}.",
+                    "audio_url": "",
+                }
+                for i in range(self.config.sentences)
+            ]
+        }
+        completion = json.dumps(content, ensure_ascii=False)
+        finish_reason = "stop"
+        if self.config.truncate_at is not None and len(completion) > self.config.truncate_at:
+            completion = completion[: self.config.truncate_at]
+            finish_reason = "length"
+        completion_tokens = 40 * self.config.sentences
+        prompt_tokens = 1000
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        metadata = {"id": f"chatcmpl-fake-{request_id}", "created": 0, "model": body.get("model", "gpt-4o")}
+        if body.get("stream"):
+            include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+            return await self._stream_completion(
+                request, metadata, completion, finish_reason, usage if include_usage else None
+            )
+        # A whole completion takes as long to generate as a streamed one.
+        chunks = -(-len(completion) // self.config.stream_chunk_chars)
+        if chunks > 1 and self.config.token_latency > 0:
+            await asyncio.sleep(self.config.token_latency * (chunks - 1))
+        return web.json_response(
+            {
+                **metadata,
+                "object": "chat.completion",
+                "choices": [
+                    {
+                        "index": 0,
+                        "finish_reason": finish_reason,
+                        "message": {"role": "assistant", "content": completion},
+                    }
+                ],
+                "usage": usage,
+            }
+        )
+
+    async def _stream_completion(
+        self,
+        request: web.Request,
+        metadata: dict[str, object],
+        completion: str,
+        finish_reason: str,
+        usage: dict[str, int] | None,
+    ) -> web.StreamResponse:
+        """Sends the completion as server-sent chunks, like a streamed chat completion."""
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+
+        async def send(choices: list[dict], chunk_usage: dict[str, int] | None = None) -> None:
+            chunk = {**metadata, "object": "chat.completion.chunk", "choices": choices, "usage": chunk_usage}
+            await response.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode())
+
+        size = self.config.stream_chunk_chars
+        for i in range(0, len(completion), size):
+            if i and self.config.token_latency > 0:
+                await asyncio.sleep(self.config.token_latency)
+            await send([{"index": 0, "delta": {"content": completion[i : i + size]}, "finish_reason": None}])
+        await send([{"index": 0, "delta": {}, "finish_reason": finish_reason}])
+        if usage is not None:
+            await send([], usage)
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def speech(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        if (failure := await self._delay_or_fail("speech")) is not None:
+            return failure
+        response = web.StreamResponse(headers={"Content-Type": "audio/mpeg"})
+        await response.prepare(request)
+        remaining = max(len(body.get("input", "")), 1) * self.config.audio_bytes_per_char
+        chunk = b"\xff\xf3" + bytes(self.config.audio_chunk_size - 2)
+        while remaining > 0:
+            await response.write(chunk[:remaining])
+            remaining -= len(chunk)
+        await response.write_eof()
+        return response
+
+
+def create_app(config: FakeOpenAIConfig | None = None) -> web.Application:
+    """Creates the fake server; its request, error and rate limit counts are in `app[STATS_KEY]`."""
+    fake = FakeOpenAI(config or FakeOpenAIConfig())
+    app = web.Application()
+    app[CONFIG_KEY] = fake.config
+    app[STATS_KEY] = fake.stats
+    app.router.add_post("/v1/chat/completions", fake.chat_completions)
+    app.router.add_post("/v1/audio/speech", fake.speech)
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Runs a local stand-in for the OpenAI API.")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every request.")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Maximum random seconds added or removed.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failing with a 500.")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests failing with a 429.")
+    parser.add_argument("--sentences", type=int, default=3, help="Sentences per transcription.")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Seconds between streamed chunks.")
+    parser.add_argument("--truncate-at", type=int, default=None, help="Characters after which completions stop.")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    config = FakeOpenAIConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        sentences=args.sentences,
+        token_latency=args.token_latency,
+        truncate_at=args.truncate_at,
+        seed=args.seed,
+    )
+    web.run_app(create_app(config), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    # python -m linguaphoto.ai.fake_openai
+    main()
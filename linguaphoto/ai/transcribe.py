@@ -2,16 +2,24 @@
 
 import base64
 import logging
+import time
 from io import BytesIO
+from typing import Any, AsyncIterator
 
-import aiohttp
 from openai import AsyncOpenAI
-from PIL import Image
+from openai.types.chat import ChatCompletionMessageParam
+from pydantic import ValidationError
 
-from linguaphoto.models import TranscriptionResponse
+from linguaphoto.ai.images import PreparedImage, prepare_image_async
+from linguaphoto.models import Transcription, TranscriptionResponse
+from linguaphoto.settings import settings
+from linguaphoto.utils.json_stream import ArrayElementParser
+from linguaphoto.utils.metrics import openai_request_duration, openai_request_errors, timed
 
 logger = logging.getLogger(__name__)
 
+VISION_MODEL = "gpt-4o"
+
 PROMPT = """
 This is a photo containing Chinese characters. For each section of characters
 in order, provide the transcription, Pinyin, and English translation,
@@ -43,31 +51,70 @@ In case you don't find any Chinese characters, return {"transcriptions": []}
 """.strip()
 
 
-def encode_image(image: Image.Image) -> str:
-    buffered = BytesIO()
-    if image.mode != "RGB":
-        image = image.convert("RGB")
-    image.save(buffered, format="JPEG")
-    return base64.b64encode(buffered.getvalue()).decode("utf-8")
+def encode_image(prepared: PreparedImage) -> str:
+    return base64.b64encode(prepared.data).decode("utf-8")
 
 
-async def transcribe_image(image_source: BytesIO, client: AsyncOpenAI) -> TranscriptionResponse:
-    image = Image.open(image_source)
-    """Transcribes the image to text.
+class TranscriptionStream:
+    """The transcriptions of an image, yielded as soon as the vision model has written each one.
+
+    The image is downscaled and re-encoded off the event loop first, which
+    keeps the request body small. The request goes through the client's
+    connection pool, so pass the shared client from `linguaphoto.ai.client`.
+
+    With `VISION_STREAM` set, the completion is streamed and parsed as it
+    arrives, so the caller can work on the first sentences while the model is
+    still writing the rest; otherwise the whole response is parsed at once.
+    Either way, malformed sentences are skipped and a sentence cut off by the
+    token limit is kept if its fields are complete. Iterate over the stream
+    once; afterwards `total_tokens` holds the tokens used and `truncated`
+    whether the model ran out of tokens.
 
     Args:
-        image: The image to transcribe.
+        image_source: The image file to transcribe.
         client: The OpenAI client.
-
-    Returns:
-        The transcription response.
     """
-    headers = {"Content-Type": "application/json", "Authorization": f"Bearer {client.api_key}"}
-    base64_image = encode_image(image)
 
-    payload = {
-        "model": "gpt-4o",
-        "messages": [
+    def __init__(self, image_source: BytesIO, client: AsyncOpenAI) -> None:
+        self.image_source = image_source
+        self.client = client
+        self.total_tokens = 0
+        self.truncated = False
+
+    async def __aiter__(self) -> AsyncIterator[Transcription]:
+        prepared = await prepare_image_async(self.image_source.getvalue())
+        base64_image = encode_image(prepared)
+        parser = ArrayElementParser("transcriptions")
+        count = 0
+
+        start = time.perf_counter()
+        with timed(openai_request_duration.labels("transcribe"), openai_request_errors.labels("transcribe")):
+            async for text in self._completion_text(base64_image):
+                for element in parser.feed(text):
+                    if (transcription := _to_transcription(element)) is not None:
+                        count += 1
+                        yield transcription
+        for element in parser.close():
+            if (transcription := _to_transcription(element)) is not None:
+                count += 1
+                yield transcription
+
+        logger.info(
+            "Vision request with a %dKB payload took %.0fms; image prepared %s",
+            len(base64_image) // 1024,
+            (time.perf_counter() - start) * 1000,
+            prepared.summary(),
+        )
+        if self.truncated or parser.skipped:
+            logger.warning(
+                "Vision response %s: kept %d sentences, skipped %d",
+                "hit the token limit" if self.truncated else "was malformed",
+                count,
+                parser.skipped,
+            )
+
+    async def _completion_text(self, base64_image: str) -> AsyncIterator[str]:
+        messages: list[ChatCompletionMessageParam] = [
             {
                 "role": "user",
                 "content": [
@@ -75,23 +122,60 @@ async def transcribe_image(image_source: BytesIO, client: AsyncOpenAI) -> Transc
                     {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}},
                 ],
             }
-        ],
-        "max_tokens": 1024,
-        "response_format": {"type": "json_object"},
-    }
-
-    async with aiohttp.ClientSession() as session:
-        async with session.post(
-            "https://api.openai.com/v1/chat/completions",
-            headers=headers,
-            json=payload,
-        ) as response:
-            response.raise_for_status()
-            data = await response.json()
-
-    raw_response = data["choices"][0]["message"]["content"]
-    transcription_response = TranscriptionResponse.model_validate_json(raw_response)
-    return transcription_response
+        ]
+        if not settings.vision_stream:
+            response = await self.client.chat.completions.create(
+                model=VISION_MODEL,
+                messages=messages,
+                max_tokens=settings.vision_max_tokens,
+                response_format={"type": "json_object"},
+            )
+            self.total_tokens = response.usage.total_tokens if response.usage else 0
+            self.truncated = response.choices[0].finish_reason == "length"
+            yield response.choices[0].message.content or ""
+            return
+
+        stream = await self.client.chat.completions.create(
+            model=VISION_MODEL,
+            messages=messages,
+            max_tokens=settings.vision_max_tokens,
+            response_format={"type": "json_object"},
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        async for chunk in stream:
+            # The usage comes in a final chunk without choices.
+            if chunk.usage is not None:
+                self.total_tokens = chunk.usage.total_tokens
+            for choice in chunk.choices:
+                if choice.finish_reason == "length":
+                    self.truncated = True
+                if choice.delta.content:
+                    yield choice.delta.content
+
+
+def _to_transcription(element: dict[str, Any]) -> Transcription | None:
+    try:
+        # The audio URL is filled in later, so the model may leave it out.
+        return Transcription.model_validate({**element, "audio_url": ""})
+    except ValidationError:
+        logger.warning("Skipping incomplete transcription %.200s", element)
+        return None
+
+
+async def transcribe_image(image_source: BytesIO, client: AsyncOpenAI) -> TranscriptionResponse:
+    """Transcribes the image to text.
+
+    Args:
+        image_source: The image file to transcribe.
+        client: The OpenAI client.
+
+    Returns:
+        The transcription response, once every sentence has been written.
+    """
+    stream = TranscriptionStream(image_source, client)
+    transcriptions = [transcription async for transcription in stream]
+    return TranscriptionResponse(transcriptions=transcriptions, total_tokens=stream.total_tokens)
 
 
 # async def run_adhoc_test() -> None:
@@ -2,32 +2,60 @@
 
 import argparse
 import asyncio
+import hashlib
+import json
 import logging
+import unicodedata
 from pathlib import Path
 from typing import AsyncIterator
 
 from openai import AsyncOpenAI
 
+from linguaphoto.ai.client import get_openai_client
 from linguaphoto.ai.transcribe import TranscriptionResponse
+from linguaphoto.utils.metrics import openai_request_duration, openai_request_errors, timed
 
 logger = logging.getLogger(__name__)
 
+TTS_MODEL = "tts-1"
+TTS_VOICE = "nova"
 
-async def synthesize_text(text: str, client: AsyncOpenAI) -> AsyncIterator[bytes]:
+
+def normalize_text(text: str) -> str:
+    """Normalizes text before synthesis, so equivalent sentences sound the same and share cached audio."""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def audio_cache_key(text: str, voice: str = TTS_VOICE, model: str = TTS_MODEL) -> str:
+    """Returns the content address of the speech for some text, voice and model."""
+    payload = json.dumps([model, voice, normalize_text(text)], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+async def synthesize_text(
+    text: str,
+    client: AsyncOpenAI,
+    voice: str = TTS_VOICE,
+    model: str = TTS_MODEL,
+) -> AsyncIterator[bytes]:
     """Synthesizes the text to speech.
 
     Args:
         text: The text to synthesize.
         client: The OpenAI client.
+        voice: The voice to use.
+        model: The TTS model to use.
 
     Returns:
         The synthesized speech.
     """
-    response = await client.audio.speech.create(
-        model="tts-1",
-        voice="nova",
-        input=text,
-    )
+    # Measures the time until the response starts; the audio is then streamed by the caller
+    with timed(openai_request_duration.labels("speech"), openai_request_errors.labels("speech")):
+        response = await client.audio.speech.create(
+            model=model,
+            voice=voice,  # type: ignore[arg-type]
+            input=text,
+        )
     return await response.aiter_bytes()
 
 
@@ -42,15 +70,15 @@ async def run_adhoc_test() -> None:
     with open(args.transcription, "r") as file:
         transcription_response = TranscriptionResponse.model_validate_json(file.read())
 
-    client = AsyncOpenAI()
     (root_dir := Path(args.output)).mkdir(parents=True, exist_ok=True)
-    for i, transcription in enumerate(transcription_response.transcriptions):
-        text = transcription.text
-        audio_path = root_dir / f"audio_{i}.mp3"
-        with open(audio_path, "wb") as file:
-            async for chunk in await synthesize_text(text, client):
-                file.write(chunk)
-        logger.info("Synthesized speech saved to %s", audio_path)
+    async with get_openai_client() as client:
+        for i, transcription in enumerate(transcription_response.transcriptions):
+            text = transcription.text
+            audio_path = root_dir / f"audio_{i}.mp3"
+            with open(audio_path, "wb") as file:
+                async for chunk in await synthesize_text(text, client):
+                    file.write(chunk)
+            logger.info("Synthesized speech saved to %s", audio_path)
 
 
 if __name__ == "__main__":
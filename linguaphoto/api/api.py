@@ -7,14 +7,20 @@ welcome message or can be used as a health check endpoint.
 Key Components:
 - APIRouter: A FastAPI router instance that groups related routes.
 - root(): A simple GET endpoint that returns a greeting message.
+- metrics(): Exports the process metrics in the Prometheus text format to
+  scrapers which send the `METRICS_TOKEN` bearer token.
 
 This module is intended to be included in the main FastAPI application
 to handle routing for the entire API.
 """
 
-from fastapi import APIRouter
+import secrets
+
+from fastapi import APIRouter, Header, HTTPException, Response
 
 from linguaphoto.api import apikey, collection, image, subscription, user
+from linguaphoto.settings import settings
+from linguaphoto.utils.metrics import CONTENT_TYPE, render
 
 # Create a new API router
 router = APIRouter()
@@ -31,3 +37,14 @@ router.include_router(apikey.router, prefix="/api-key")
 @router.get("/")
 async def root() -> dict[str, str]:
     return {"message": "Hello, World!, TEST"}
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics(authorization: str | None = Header(None)) -> Response:
+    # Traffic and error rates are not public, so the endpoint only exists for scrapers holding the token.
+    if not settings.metrics_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    expected = f"Bearer {settings.metrics_token}".encode("utf-8")
+    if authorization is None or not secrets.compare_digest(authorization.encode("utf-8"), expected):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return Response(content=render(), media_type=CONTENT_TYPE)
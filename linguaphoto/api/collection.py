@@ -1,10 +1,12 @@
 """Collection API."""
 
-from typing import List
+from typing import Any, List
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 
+from linguaphoto.crud.base import DEFAULT_SCAN_LIMIT, ITEMS_PER_PAGE
 from linguaphoto.crud.collection import CollectionCrud
+from linguaphoto.errors import ItemConflictError, ItemNotFoundError
 from linguaphoto.models import Collection
 from linguaphoto.schemas.collection import (
     CollectionCreateFragment,
@@ -12,11 +14,29 @@ from linguaphoto.schemas.collection import (
     CollectionPublishFragment,
     FeaturedImageFragnment,
 )
-from linguaphoto.utils.auth import get_current_user_id, get_current_user_id_by_api_key
+from linguaphoto.utils.auth import get_current_user_id, get_current_user_id_by_api_key, get_optional_user_id
+from linguaphoto.utils.cloudfront_url_signer import sign_for_viewer
+from linguaphoto.utils.utils import NEXT_CURSOR_HEADER
 
 router = APIRouter()
 
 
+async def _sign_featured_images(collections: List[Collection], viewer_id: str | None) -> List[Collection]:
+    featured_images = await sign_for_viewer([collection.featured_image for collection in collections], viewer_id)
+    return [
+        collection.model_copy(update={"featured_image": featured_image})
+        for collection, featured_image in zip(collections, featured_images)
+    ]
+
+
+async def _sign_edited(collection: Collection | None, viewer_id: str) -> Collection | None:
+    """Signs an edited collection's featured image as `/get` would for its editor."""
+    if collection is None:
+        return None
+    [collection] = await _sign_featured_images([collection], viewer_id)
+    return collection
+
+
 @router.post("/create", response_model=Collection)
 async def create(
     collection: CollectionCreateFragment,
@@ -35,13 +55,18 @@ async def create(
 
 
 @router.get("/get", response_model=Collection)
-async def getcollection(id: str, collection_crud: CollectionCrud = Depends()) -> Collection:
+async def getcollection(
+    id: str,
+    viewer_id: str | None = Depends(get_optional_user_id),
+    collection_crud: CollectionCrud = Depends(),
+) -> Collection:
     async with collection_crud:
         collection = await collection_crud.get_collection(id)
         if collection is None:
             raise ValueError
         # if collection.user != user_id:
         #     raise NotAuthorizedError
+        [collection] = await _sign_featured_images([collection], viewer_id)
         return collection
 
 
@@ -51,36 +76,54 @@ async def getcollections(
 ) -> List[Collection]:
     async with collection_crud:
         collections = await collection_crud.get_collections(user_id=user_id)
-        return collections
+        return await _sign_featured_images(collections, user_id)
 
 
 @router.get("/get_all_api_key", response_model=List[Collection])
 async def getcollection_api_key(
     user_id: str = Depends(get_current_user_id_by_api_key), collection_crud: CollectionCrud = Depends()
 ) -> List[Collection]:
-    print(user_id)
+    """Lists the user's collections for API-key clients.
+
+    These clients never receive the signed cookies, so every media URL is signed.
+    """
     async with collection_crud:
         collections = await collection_crud.get_collections(user_id=user_id)
-        return collections
+        return await _sign_featured_images(collections, None)
 
 
-@router.post("/edit")
+@router.post("/edit", response_model=Collection)
 async def editcollection(
     collection: CollectionEditFragment,
     user_id: str = Depends(get_current_user_id),
     collection_crud: CollectionCrud = Depends(),
-) -> None:
+) -> Collection | None:
+    """Edits a collection, returning it with its new version.
+
+    If `version` is given, the edit is refused with a 409 when the collection
+    has changed since, such as by an upload, instead of overwriting its images.
+    Reordering the images needs a version, since it would otherwise undo
+    uploads and deletes made meanwhile; without `images` they are kept as they are.
+    """
+    updates: dict[str, Any] = {
+        "title": collection.title,
+        "description": collection.description,
+        "featured_image": collection.featured_image,
+    }
+    if collection.images is not None:
+        if collection.version is None:
+            raise HTTPException(status_code=400, detail="The version is required to edit the images")
+        updates["images"] = collection.images
     async with collection_crud:
-        await collection_crud.edit_collection(
-            collection.id,
-            updates={
-                "title": collection.title,
-                "description": collection.description,
-                "images": collection.images,
-                "featured_image": collection.featured_image,
-            },
-        )
-        return
+        try:
+            edited = await collection_crud.edit_collection(
+                collection.id, updates=updates, expected_version=collection.version
+            )
+        except ItemNotFoundError:
+            raise HTTPException(status_code=404, detail="Collection not found")
+        except ItemConflictError:
+            raise HTTPException(status_code=409, detail="Collection was changed by another request")
+        return await _sign_edited(edited, user_id)
 
 
 @router.get("/delete")
@@ -94,32 +137,61 @@ async def deletecollection(
         return
 
 
-@router.post("/set_featured_image", response_model=None)
+@router.post("/set_featured_image", response_model=Collection)
 async def setfeaturedimage(
     data: FeaturedImageFragnment,
     user_id: str = Depends(get_current_user_id),
     collection_crud: CollectionCrud = Depends(),
-) -> None:
+) -> Collection | None:
+    """Sets the collection's featured image, returning it with its new version."""
     async with collection_crud:
-        await collection_crud.edit_collection(data.collection_id, updates={"featured_image": data.image_url})
-        return
+        try:
+            edited = await collection_crud.edit_collection(
+                data.collection_id, updates={"featured_image": data.image_url}
+            )
+        except ItemNotFoundError:
+            raise HTTPException(status_code=404, detail="Collection not found")
+        return await _sign_edited(edited, user_id)
 
 
-@router.post("/set_publish")
+@router.post("/set_publish", response_model=Collection)
 async def publishcollection(
     data: CollectionPublishFragment,
     user_id: str = Depends(get_current_user_id),
     collection_crud: CollectionCrud = Depends(),
-) -> None:
+) -> Collection | None:
+    """Publishes or unpublishes the collection, returning it with its new version."""
     async with collection_crud:
-        await collection_crud.edit_collection(data.id, updates={"publish_flag": data.flag})
-        return
+        try:
+            edited = await collection_crud.edit_collection(data.id, updates={"publish_flag": data.flag})
+        except ItemNotFoundError:
+            raise HTTPException(status_code=404, detail="Collection not found")
+        return await _sign_edited(edited, user_id)
 
 
 @router.get("/get_public_items")
 async def publiccoleections(
+    response: Response,
+    limit: int | None = Query(None, ge=1, le=DEFAULT_SCAN_LIMIT),
+    cursor: str | None = None,
+    viewer_id: str | None = Depends(get_optional_user_id),
     collection_crud: CollectionCrud = Depends(),
 ) -> List[Collection]:
+    """Lists published collections.
+
+    Without `limit` or `cursor` every published collection is returned. With
+    either one, a single page is returned and the cursor of the next page, if
+    any, is sent in the `X-Next-Cursor` header.
+    """
     async with collection_crud:
-        collections = await collection_crud.get_public_collections()
-        return collections
+        if limit is None and cursor is None:
+            collections = await collection_crud.get_public_collections()
+        else:
+            try:
+                page = await collection_crud.get_public_collections_page(limit or ITEMS_PER_PAGE, cursor)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            if page.cursor is not None:
+                response.headers[NEXT_CURSOR_HEADER] = page.cursor
+            collections = page.items
+        return await _sign_featured_images(collections, viewer_id)
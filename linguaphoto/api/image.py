@@ -1,33 +1,26 @@
 """Image APIs."""
 
-import asyncio
-from typing import Annotated, List
+from typing import Annotated, List, Literal
 
-from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, Response, UploadFile
 
-from linguaphoto.crud.collection import CollectionCrud
+from linguaphoto.crud.base import DEFAULT_SCAN_LIMIT, ITEMS_PER_PAGE
 from linguaphoto.crud.image import ImageCrud
 from linguaphoto.models import Image
+from linguaphoto.schemas.events import TranslationDone
 from linguaphoto.schemas.image import ImageTranslateFragment
 from linguaphoto.socket_manager import notify_user
 from linguaphoto.utils.auth import (
     get_current_user_id,
     get_current_user_id_by_api_key,
+    get_optional_user_id,
     subscription_validate,
     subscription_validate_by_api_key,
 )
+from linguaphoto.utils.utils import NEXT_CURSOR_HEADER
+from linguaphoto.worker import translation_pool
 
 router = APIRouter()
-translating_images: List[str] = []
-
-
-async def translate_background(image_id: str, image_crud: ImageCrud, user_id: str) -> None:
-    async with image_crud:
-        translating_images.append(image_id)
-        image = await image_crud.translate(image_id, user_id)
-        translating_images.remove(image_id)
-        if image:
-            await notify_user(user_id, image.model_dump())  # Use await here
 
 
 @router.post("/upload", response_model=Image)
@@ -41,9 +34,12 @@ async def upload_image(
     """Upload Image and create new Image."""
     async with image_crud:
         image = await image_crud.create_image(file, user_id, id)
-        if image:
-            # Run translate in the background
-            asyncio.create_task(translate_background(image.id, image_crud, user_id))
+        if image.is_translated:
+            # A duplicate of an already translated upload; there is nothing left to do
+            await notify_user(user_id, TranslationDone(image_id=image.id, image=image))
+        else:
+            # Queue the translation; a worker notifies the user when it is done
+            await translation_pool.enqueue(image.id, user_id)
         return image
 
 
@@ -55,20 +51,58 @@ async def upload_image_by_api_key(
     is_subscribed: bool = Depends(subscription_validate_by_api_key),
     image_crud: ImageCrud = Depends(),
 ) -> Image:
-    """Upload Image and create new Image."""
+    """Upload Image and create new Image.
+
+    API-key clients never receive the signed cookies, so the returned media URLs are signed.
+    """
     async with image_crud:
         image = await image_crud.create_image(file, user_id, id)
-        if image:
-            # Run translate in the background
-            asyncio.create_task(translate_background(image.id, image_crud, user_id))
+        if image.is_translated:
+            # A duplicate of an already translated upload; there is nothing left to do
+            await notify_user(user_id, TranslationDone(image_id=image.id, image=image))
+        else:
+            # Queue the translation; a worker notifies the user when it is done
+            await translation_pool.enqueue(image.id, user_id)
+        [image] = await image_crud.sign_images_for_viewer([image], None)
         return image
 
 
 @router.get("/get_all", response_model=List[Image])
-async def get_images(collection_id: str, image_crud: ImageCrud = Depends()) -> List[Image]:
+async def get_images(
+    collection_id: str,
+    response: Response,
+    *,
+    order: Literal["stored", "uploaded"] = "stored",
+    limit: int | None = Query(None, ge=1, le=DEFAULT_SCAN_LIMIT),
+    cursor: str | None = None,
+    viewer_id: str | None = Depends(get_optional_user_id),
+    image_crud: ImageCrud = Depends(),
+) -> List[Image]:
+    """Lists a collection's images.
+
+    Images are returned in the collection's stored order, or with `order=uploaded`
+    in the order they were uploaded. Without `limit` or `cursor` every image is
+    returned; with either one, a single page is returned and the cursor of the
+    next page, if any, is sent in the `X-Next-Cursor` header. Cursors only
+    resume the order they were returned for. Media the viewer's signed cookies
+    do not cover, such as another user's published images, is returned signed.
+    """
     async with image_crud:
-        images = await image_crud.get_images(collection_id=collection_id)
-        return images
+        if limit is None and cursor is None:
+            if order == "uploaded":
+                images = await image_crud.list_images(collection_id)
+            else:
+                images = await image_crud.get_images(collection_id=collection_id)
+        else:
+            get_page = image_crud.list_images_page if order == "uploaded" else image_crud.get_images_page
+            try:
+                page = await get_page(collection_id, limit or ITEMS_PER_PAGE, cursor)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            if page.cursor is not None:
+                response.headers[NEXT_CURSOR_HEADER] = page.cursor
+            images = page.items
+        return await image_crud.sign_images_for_viewer(images, viewer_id)
 
 
 @router.get("/delete")
@@ -76,19 +110,12 @@ async def delete_image(
     id: str,
     user_id: str = Depends(get_current_user_id),
     image_crud: ImageCrud = Depends(),
-    collection_crud: CollectionCrud = Depends(),
 ) -> None:
-    print(id)
     async with image_crud:
         image = await image_crud.get_image(id)
         if image:
-            async with collection_crud:
-                collection = await collection_crud.get_collection(image.collection)
-                if collection:
-                    updated_images = list(filter(lambda image: image != id, collection.images))
-                    await collection_crud.edit_collection(image.collection, {"images": updated_images})
-                await image_crud.delete_image(id)
-                return
+            await image_crud.delete_image(image)
+            return
     raise HTTPException(status_code=400, detail="Image is invalid")
 
 
@@ -96,12 +123,7 @@ async def delete_image(
 async def translate(
     data: ImageTranslateFragment,
     user_id: str = Depends(get_current_user_id),
-    image_crud: ImageCrud = Depends(),
     is_subscribed: bool = Depends(subscription_validate),
 ) -> None:
-    image_id = data.image_id
-    if image_id not in translating_images:
-        async with image_crud:
-            translating_images.append(image_id)
-            asyncio.create_task(translate_background(image_id, image_crud, user_id=user_id))
-            translating_images.remove(image_id)
+    # Jobs are deduplicated per image, so repeated requests while one is queued or running are no-ops
+    await translation_pool.enqueue(data.image_id, user_id)
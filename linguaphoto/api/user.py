@@ -2,7 +2,7 @@
 
 from datetime import timedelta
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 
 from linguaphoto.crud.user import UserCrud
 from linguaphoto.schemas.user import (
@@ -10,17 +10,37 @@ from linguaphoto.schemas.user import (
     UserSigninRespondFragment,
     UserSignupFragment,
 )
+from linguaphoto.settings import settings
 from linguaphoto.utils.auth import (
     create_access_token,
     decode_access_token,
     oauth2_schema,
 )
+from linguaphoto.utils.cloudfront_url_signer import get_media_prefix, get_url_signer
 
 router = APIRouter()
 
 
+async def set_media_cookies(response: Response, user_id: str) -> None:
+    """Issues CloudFront signed cookies for the user's media prefix, in signed-cookie mode."""
+    if not settings.media_signed_cookies:
+        return
+    resource = f"{settings.media_hosting_server}/{get_media_prefix(user_id)}/*"
+    cookies = await get_url_signer().sign_cookies(resource, expire_days=settings.media_cookie_expire_days)
+    for name, value in cookies.items():
+        response.set_cookie(
+            name,
+            value,
+            max_age=settings.media_cookie_expire_days * 86400,
+            domain=settings.media_cookie_domain,
+            secure=True,
+            httponly=True,
+            samesite="lax",
+        )
+
+
 @router.post("/signup", response_model=UserSigninRespondFragment | None)
-async def signup(user: UserSignupFragment, user_crud: UserCrud = Depends()) -> dict | None:
+async def signup(user: UserSignupFragment, response: Response, user_crud: UserCrud = Depends()) -> dict | None:
     """User registration endpoint.
 
     This endpoint allows a new user to sign up by providing the necessary user details.
@@ -31,31 +51,34 @@ async def signup(user: UserSignupFragment, user_crud: UserCrud = Depends()) -> d
         if new_user is None:
             return None
         token = create_access_token({"id": new_user.id}, timedelta(hours=24))
+        await set_media_cookies(response, new_user.id)
         res_user = new_user.model_dump()
         res_user.update({"token": token, "is_auth": True})
         return res_user
 
 
 @router.post("/signin", response_model=UserSigninRespondFragment | None)
-async def signin(user: UserSigninFragment, user_crud: UserCrud = Depends()) -> dict | None:
+async def signin(user: UserSigninFragment, response: Response, user_crud: UserCrud = Depends()) -> dict | None:
     """User login endpoint.
 
     This endpoint allows an existing user to sign in by verifying their credentials.
     If successful, it returns the user's details along with an access token.
     """
     async with user_crud:
-        if await user_crud.verify_user_by_email(user):
-            res_user = await user_crud.get_user_by_email(user.email)
-            user_dict = res_user.__dict__
-            token = create_access_token({"id": user_dict["id"]}, timedelta(hours=24))
-            user_dict.update({"token": token, "is_auth": True})
-            return user_dict
-        else:
+        res_user = await user_crud.authenticate(user)
+        if res_user is None:
             raise HTTPException(status_code=422, detail="Could not validate credentials")
+        user_dict = res_user.model_dump()
+        token = create_access_token({"id": res_user.id}, timedelta(hours=24))
+        await set_media_cookies(response, res_user.id)
+        user_dict.update({"token": token, "is_auth": True})
+        return user_dict
 
 
 @router.get("/me", response_model=UserSigninRespondFragment | None)
-async def get_me(token: str = Depends(oauth2_schema), user_crud: UserCrud = Depends()) -> dict | None:
+async def get_me(
+    response: Response, token: str = Depends(oauth2_schema), user_crud: UserCrud = Depends()
+) -> dict | None:
     """Retrieve the currently authenticated user's information.
 
     This endpoint uses the provided token to decode and identify the user.
@@ -68,6 +91,7 @@ async def get_me(token: str = Depends(oauth2_schema), user_crud: UserCrud = Depe
         user = await user_crud.get_user(id, True)
         if user is None:
             raise HTTPException(status_code=422, detail="user not found")
+        await set_media_cookies(response, user.id)
         dict_user = user.model_dump()
         dict_user.update({"token": token, "is_auth": True})
         print(dict_user)
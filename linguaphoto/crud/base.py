@@ -1,27 +1,51 @@
 """Defines the base CRUD interface."""
 
+import asyncio
+import base64
 import itertools
+import json
 import logging
+import re
+from contextlib import AsyncExitStack
+from dataclasses import dataclass
+from decimal import Decimal
 from types import TracebackType
-from typing import Any, AsyncContextManager, BinaryIO, Literal, Self, TypeVar
+from typing import Any, AsyncContextManager, AsyncIterator, BinaryIO, Generic, Literal, Self, TypeVar
 
 import aioboto3
+from aiobotocore.client import AioBaseClient
+from aiobotocore.config import AioConfig
 from boto3.dynamodb.conditions import ComparisonCondition, Key
+from boto3.s3.transfer import TransferConfig
+from botocore.awsrequest import AWSResponse
 from botocore.exceptions import ClientError
+from botocore.model import OperationModel
+from fastapi import UploadFile
 from types_aiobotocore_dynamodb.service_resource import DynamoDBServiceResource
+from types_aiobotocore_dynamodb.type_defs import AttributeDefinitionTypeDef, GlobalSecondaryIndexTypeDef
 from types_aiobotocore_s3.service_resource import S3ServiceResource
 
-from linguaphoto.errors import InternalError, ItemNotFoundError
-from linguaphoto.models import BaseModel, LinguaBaseModel
+from linguaphoto.errors import InternalError, ItemConflictError, ItemNotFoundError
+from linguaphoto.models import LinguaBaseModel
 from linguaphoto.settings import settings
+from linguaphoto.utils.metrics import (
+    aws_request_errors,
+    aws_request_retries,
+    aws_requests,
+    dynamodb_consumed_capacity,
+    track_operation,
+)
 from linguaphoto.utils.utils import get_cors_origins
 
-T = TypeVar("T", bound=BaseModel)
+T = TypeVar("T", bound=LinguaBaseModel)
 
 TABLE_NAME = settings.dynamodb_table_name
 DEFAULT_CHUNK_SIZE = 100
+MAX_BATCH_GET_ATTEMPTS = 8
+BATCH_GET_BACKOFF_SECONDS = 0.05
 DEFAULT_SCAN_LIMIT = 1000
 ITEMS_PER_PAGE = 12
+S3_READ_CHUNK_SIZE = 1 << 20
 
 TableKey = tuple[str, Literal["S", "N", "B"], Literal["HASH", "RANGE"]]
 GlobalSecondaryIndex = tuple[str, str, Literal["S", "N", "B"], Literal["HASH", "RANGE"]]
@@ -29,10 +53,209 @@ GlobalSecondaryIndex = tuple[str, str, Literal["S", "N", "B"], Literal["HASH", "
 logger = logging.getLogger(__name__)
 
 
+@dataclass(frozen=True)
+class Page(Generic[T]):
+    """One page of query results.
+
+    `cursor` is an opaque token which resumes the query after the last item
+    of this page, or None if there are no more results.
+    """
+
+    items: list[T]
+    cursor: str | None
+
+
+def document_path(path: str, names: dict[str, str]) -> str:
+    """Returns the update expression for an attribute path, such as `transcriptions[2].audio_url`.
+
+    Every attribute name in the path is replaced by a `#name` placeholder,
+    which is added to `names`, so paths may use reserved words.
+    """
+    parts = []
+    for part in path.split("."):
+        name, bracket, index = part.partition("[")
+        names[f"#{name}"] = name
+        parts.append(f"#{name}{bracket}{index}")
+    return ".".join(parts)
+
+
+def encode_cursor(last_evaluated_key: dict[str, Any]) -> str:
+    """Encodes a DynamoDB `LastEvaluatedKey` as an opaque, URL-safe cursor."""
+    key = {k: int(v) if isinstance(v, Decimal) else v for k, v in last_evaluated_key.items()}
+    return base64.urlsafe_b64encode(json.dumps(key, separators=(",", ":")).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> dict[str, Any]:
+    """Decodes a cursor from `encode_cursor` back into an `ExclusiveStartKey`.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, UnicodeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(key, dict) or "id" not in key:
+        raise ValueError("Invalid cursor")
+    return key
+
+
+def get_client_config() -> AioConfig:
+    """Returns the botocore configuration shared by every AWS client."""
+    return AioConfig(
+        max_pool_connections=settings.aws_max_pool_connections,
+        retries={"mode": settings.aws_retry_mode, "max_attempts": settings.aws_max_attempts},
+        tcp_keepalive=settings.aws_tcp_keepalive,
+        connector_args={"keepalive_timeout": settings.aws_keepalive_timeout},
+    )
+
+
+def get_transfer_config() -> TransferConfig:
+    """Returns the S3 transfer configuration, which bounds the memory used per upload."""
+    return TransferConfig(
+        multipart_threshold=settings.s3_part_size,
+        multipart_chunksize=settings.s3_part_size,
+        max_concurrency=settings.s3_upload_concurrency,
+    )
+
+
+def _request_consumed_capacity(params: dict[str, Any], model: OperationModel, **kwargs: object) -> None:
+    if model.input_shape is not None and "ReturnConsumedCapacity" in model.input_shape.members:
+        params.setdefault("ReturnConsumedCapacity", "TOTAL")
+
+
+def _record_call(http_response: AWSResponse, parsed: dict[str, Any], model: OperationModel, **kwargs: object) -> None:
+    service = model.service_model.endpoint_prefix
+    aws_requests.labels(service, model.name).inc()
+    if http_response.status_code >= 400:
+        aws_request_errors.labels(service, model.name).inc()
+    if retries := parsed.get("ResponseMetadata", {}).get("RetryAttempts", 0):
+        aws_request_retries.labels(service, model.name).inc(retries)
+    if capacity := parsed.get("ConsumedCapacity"):
+        # Batch operations report a list with one entry per table.
+        for entry in capacity if isinstance(capacity, list) else [capacity]:
+            dynamodb_consumed_capacity.labels(model.name).inc(entry.get("CapacityUnits", 0))
+
+
+def instrument_client(client: AioBaseClient) -> None:
+    """Counts an AWS client's calls, errors, retries and DynamoDB consumed capacity."""
+    events = client.meta.events
+    if settings.dynamodb_consumed_capacity:
+        # Runs before boto3 copies the parameters, so the copy it sends includes the flag.
+        events.register_first(
+            "provide-client-params.dynamodb", _request_consumed_capacity, unique_id="metrics-capacity"
+        )
+    events.register("after-call", _record_call, unique_id="metrics-calls")
+
+
+async def open_resources(stack: AsyncExitStack) -> tuple[DynamoDBServiceResource, S3ServiceResource]:
+    """Opens DynamoDB and S3 resources, registering their cleanup on `stack`.
+
+    Args:
+        stack: The exit stack which owns the opened resources.
+
+    Returns:
+        The DynamoDB and S3 service resources.
+    """
+    session = aioboto3.Session()
+    config = get_client_config()
+    db = await stack.enter_async_context(
+        session.resource(
+            "dynamodb",
+            region_name=settings.aws_region_name,
+            aws_access_key_id=settings.aws_access_key_id,
+            aws_secret_access_key=settings.aws_secret_access_key,
+            config=config,
+        )
+    )
+    s3 = await stack.enter_async_context(
+        session.resource(
+            "s3",
+            region_name=settings.aws_region_name,
+            aws_access_key_id=settings.aws_access_key_id,
+            aws_secret_access_key=settings.aws_secret_access_key,
+            config=config,
+        )
+    )
+    instrument_client(db.meta.client)
+    instrument_client(s3.meta.client)
+    return db, s3
+
+
+class ClientPool(AsyncContextManager):
+    """Process-wide DynamoDB and S3 resources shared by every CRUD instance.
+
+    The pool is started once by the application lifespan. While it is running,
+    `BaseCrud` borrows its resources instead of opening a new session, so the
+    session setup, credential resolution and TLS handshakes are paid once per
+    process rather than once per request.
+    """
+
+    def __init__(self) -> None:
+        self._stack: AsyncExitStack | None = None
+        self._db: DynamoDBServiceResource | None = None
+        self._s3: S3ServiceResource | None = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def started(self) -> bool:
+        return self._stack is not None
+
+    @property
+    def db(self) -> DynamoDBServiceResource:
+        if self._db is None:
+            raise RuntimeError("Client pool has not been started!")
+        return self._db
+
+    @property
+    def s3(self) -> S3ServiceResource:
+        if self._s3 is None:
+            raise RuntimeError("Client pool has not been started!")
+        return self._s3
+
+    async def start(self) -> None:
+        async with self._lock:
+            if self._stack is not None:
+                return
+            stack = AsyncExitStack()
+            try:
+                self._db, self._s3 = await open_resources(stack)
+            except BaseException:
+                await stack.aclose()
+                raise
+            self._stack = stack
+            logger.info("Started AWS client pool (max_pool_connections=%d)", settings.aws_max_pool_connections)
+
+    async def close(self) -> None:
+        async with self._lock:
+            if self._stack is None:
+                return
+            stack, self._stack = self._stack, None
+            self._db, self._s3 = None, None
+            await stack.aclose()
+            logger.info("Closed AWS client pool")
+
+    async def __aenter__(self) -> Self:
+        await self.start()
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        await self.close()
+
+
+client_pool = ClientPool()
+
+
 class BaseCrud(AsyncContextManager):
     def __init__(self) -> None:
         self.__db: DynamoDBServiceResource | None = None
         self.__s3: S3ServiceResource | None = None
+        self.__stack: AsyncExitStack | None = None
 
     @property
     def db(self) -> DynamoDBServiceResource:
@@ -52,24 +275,29 @@ class BaseCrud(AsyncContextManager):
 
     @classmethod
     def get_gsis(cls) -> set[str]:
-        return {"type"}
+        return {"type", "user", "email", "collection", "api_key", "status", "content_hash"}
+
+    @classmethod
+    def get_gsi_sort_keys(cls) -> dict[str, tuple[str, Literal["S", "N", "B"]]]:
+        """Maps GSI hash key columns to the column used as that index's sort key."""
+        return {"collection": ("created_at", "N"), "status": ("available_at", "N")}
 
     async def __aenter__(self) -> Self:
-        session = aioboto3.Session()
-        db = await session.resource(
-            "dynamodb",
-            region_name=settings.aws_region_name,
-            aws_access_key_id=settings.aws_access_key_id,
-            aws_secret_access_key=settings.aws_secret_access_key,
-        ).__aenter__()
-        s3 = await session.resource(
-            "s3",
-            region_name=settings.aws_region_name,
-            aws_access_key_id=settings.aws_access_key_id,
-            aws_secret_access_key=settings.aws_secret_access_key,
-        ).__aenter__()
-        self.__db = db
-        self.__s3 = s3
+        if client_pool.started:
+            # Borrows the process-wide resources; nothing to clean up on exit.
+            self.__db = client_pool.db
+            self.__s3 = client_pool.s3
+            return self
+
+        # Outside of the application (CLI scripts, tests) there is no running
+        # pool, so this instance owns a short-lived set of resources instead.
+        stack = AsyncExitStack()
+        try:
+            self.__db, self.__s3 = await open_resources(stack)
+        except BaseException:
+            await stack.aclose()
+            raise
+        self.__stack = stack
         return self
 
     async def __aexit__(
@@ -78,24 +306,20 @@ class BaseCrud(AsyncContextManager):
         exc_value: BaseException | None,
         traceback: TracebackType | None,
     ) -> None:
-        # Check if exc_type is None before using issubclass
-        exception_type = exc_type if exc_type is not None and issubclass(exc_type, Exception) else None
-        exception_value = exc_value if isinstance(exc_value, Exception) else None
-
-        # Pass compatible Exception types to aioboto3's __aexit__
-        if self.__db:
-            await self.__db.__aexit__(exception_type, exception_value, traceback)
-        if self.__s3:
-            await self.__s3.__aexit__(exception_type, exception_value, traceback)
+        if self.__stack is not None:
+            stack, self.__stack = self.__stack, None
+            await stack.__aexit__(exc_type, exc_value, traceback)
+            self.__db = None
+            self.__s3 = None
 
     def _validate_item(self, data: dict[str, Any], item_class: type[T]) -> T:
         if (item_type := data.pop("type")) != item_class.__name__:
             raise InternalError(f"Item type {str(item_type)} is not a {item_class.__name__}")
         return item_class.model_validate(data)
 
-    async def _add_item(self, item: LinguaBaseModel, unique_fields: list[str] | None = None) -> None:
-        table = await self.db.Table(TABLE_NAME)
-        item_data = item.__dict__
+    @staticmethod
+    def _item_data(item: LinguaBaseModel) -> dict[str, Any]:
+        item_data = item.model_dump()
 
         # Ensure no empty strings are present
         item_data = {k: v for k, v in item_data.items() if v is not None and v != ""}
@@ -104,6 +328,12 @@ class BaseCrud(AsyncContextManager):
         if "type" in item_data:
             raise InternalError("Cannot add item with 'type' attribute")
         item_data["type"] = item.__class__.__name__
+        return item_data
+
+    @track_operation
+    async def _add_item(self, item: LinguaBaseModel, unique_fields: list[str] | None = None) -> None:
+        table = await self.db.Table(TABLE_NAME)
+        item_data = self._item_data(item)
 
         # Prepare the condition expression
         condition = "attribute_not_exists(id)"
@@ -124,6 +354,47 @@ class BaseCrud(AsyncContextManager):
             logger.exception("Failed to insert item into DynamoDB")
             raise
 
+    @track_operation
+    async def _put_item(
+        self,
+        item: LinguaBaseModel,
+        *,
+        condition_expression: str | None = None,
+        condition_values: dict[str, Any] | None = None,
+    ) -> None:
+        """Writes a whole item, replacing any stored one, optionally only if a condition holds.
+
+        Unlike `_update_item`, the item is built from its model, with its
+        defaults, so this is how items are created when other writers may race
+        to create or recreate them.
+
+        Args:
+            item: The item to write.
+            condition_expression: Optional condition the stored item, if any,
+                must satisfy, such as `attribute_not_exists(id)`. Attributes
+                are referenced as `#name` and values as `:name`, with the
+                values supplied in `condition_values`.
+            condition_values: Values referenced by `condition_expression`.
+
+        Raises:
+            ItemConflictError: If the condition does not hold.
+        """
+        table = await self.db.Table(TABLE_NAME)
+        extra_params: dict[str, Any] = {}
+        if condition_expression is not None:
+            extra_params["ConditionExpression"] = condition_expression
+            if names := {f"#{k}": k for k in re.findall(r"#(\w+)", condition_expression)}:
+                extra_params["ExpressionAttributeNames"] = names
+            if condition_values:
+                extra_params["ExpressionAttributeValues"] = condition_values
+        try:
+            await table.put_item(Item=self._item_data(item), **extra_params)
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                raise ItemConflictError(f"Condition failed when writing {item.id}")
+            raise
+
+    @track_operation
     async def _get_item(self, item_id: str, item_class: type[T], throw_if_missing: bool = False) -> T | None:
         table = await self.db.Table(TABLE_NAME)
         item_dict = await table.get_item(Key={"id": item_id})
@@ -134,55 +405,328 @@ class BaseCrud(AsyncContextManager):
         item_data = item_dict["Item"]
         return self._validate_item(item_data, item_class)
 
-    async def _get_items_from_secondary_index(
+    async def _batch_get_chunk(self, ids: list[str]) -> list[dict[str, Any]]:
+        request: dict[str, Any] = {TABLE_NAME: {"Keys": [{"id": item_id} for item_id in ids]}}
+        items: list[dict[str, Any]] = []
+        for attempt in range(MAX_BATCH_GET_ATTEMPTS):
+            response = await self.db.batch_get_item(RequestItems=request)
+            items.extend(response.get("Responses", {}).get(TABLE_NAME, []))
+            request = response.get("UnprocessedKeys", {})
+            if not request:
+                return items
+            # DynamoDB returns unprocessed keys when throttled, so back off before retrying them.
+            await asyncio.sleep(BATCH_GET_BACKOFF_SECONDS * 2**attempt)
+        raise InternalError(f"Failed to fetch {len(request[TABLE_NAME]['Keys'])} items after retrying")
+
+    @track_operation
+    async def _batch_get_items(
+        self,
+        ids: list[str],
+        item_class: type[T],
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> list[T]:
+        """Fetches many items by ID using concurrent `BatchGetItem` calls.
+
+        Args:
+            ids: The IDs of the items to fetch.
+            item_class: The class of the items being fetched.
+            chunk_size: Number of keys per request; DynamoDB allows at most 100.
+
+        Returns:
+            The items in the same order as `ids`. Missing items are skipped.
+        """
+        unique_ids = list(dict.fromkeys(ids))
+        chunks = [unique_ids[i : i + chunk_size] for i in range(0, len(unique_ids), chunk_size)]
+        results = await asyncio.gather(*(self._batch_get_chunk(chunk) for chunk in chunks))
+        items_by_id = {
+            item.id: item for item in (self._validate_item(data, item_class) for data in itertools.chain(*results))
+        }
+        return [items_by_id[item_id] for item_id in ids if item_id in items_by_id]
+
+    async def _iter_query(
+        self,
+        query_params: dict[str, Any],
+        item_class: type[T],
+        page_size: int,
+        cursor: str | None,
+        max_rows: int | None = None,
+    ) -> AsyncIterator[Page[T]]:
+        """Runs a query page by page, following `LastEvaluatedKey`.
+
+        Pages which come back empty because of a filter expression are
+        skipped, so every yielded page has at least one item. Since `Limit`
+        applies before filtering, pages may still hold fewer than `page_size`
+        items. If `max_rows` is set, the query stops once that many rows have
+        been read, with a last page, empty if nothing matched, whose cursor
+        continues from there.
+
+        Raises:
+            ValueError: If `cursor` is not a valid start key for the query.
+        """
+        table = await self.db.Table(TABLE_NAME)
+        query_params = {**query_params, "Limit": page_size}
+        if cursor is not None:
+            query_params["ExclusiveStartKey"] = decode_cursor(cursor)
+        rows_read = 0
+        while True:
+            try:
+                response = await table.query(**query_params)
+            except ClientError as e:
+                if cursor is not None and e.response["Error"]["Code"] == "ValidationException":
+                    raise ValueError("Invalid cursor") from e
+                raise
+            last_evaluated_key = response.get("LastEvaluatedKey")
+            items = [self._validate_item(item, item_class) for item in response["Items"]]
+            rows_read += response["ScannedCount"]
+            out_of_rows = max_rows is not None and rows_read >= max_rows
+            if items or (out_of_rows and last_evaluated_key is not None):
+                yield Page(items, None if last_evaluated_key is None else encode_cursor(last_evaluated_key))
+            if last_evaluated_key is None or out_of_rows:
+                return
+            query_params["ExclusiveStartKey"] = last_evaluated_key
+
+    def iter_items(
+        self,
+        item_class: type[T],
+        *,
+        expression_attribute_names: dict[str, str] | None = None,
+        expression_attribute_values: dict[str, Any] | None = None,
+        filter_expression: str | None = None,
+        page_size: int = DEFAULT_SCAN_LIMIT,
+        cursor: str | None = None,
+        max_rows: int | None = None,
+    ) -> AsyncIterator[Page[T]]:
+        """Iterates over every item of a given type, one page at a time.
+
+        Args:
+            item_class: The class of the items to list.
+            expression_attribute_names: Names used by `filter_expression`.
+            expression_attribute_values: Values used by `filter_expression`.
+            filter_expression: Optional filter applied to each page.
+            page_size: Number of items DynamoDB evaluates per page.
+            cursor: Resumes iteration from a previous page's cursor.
+            max_rows: If set, iteration stops after reading this many items,
+                filtered out or not, with a cursor to continue from.
+
+        Returns:
+            An async iterator over the pages of matching items.
+        """
+        query_params: dict[str, Any] = {
+            "IndexName": self.get_gsi_index_name("type"),
+            "KeyConditionExpression": Key("type").eq(item_class.__name__),
+        }
+        if expression_attribute_names:
+            query_params["ExpressionAttributeNames"] = expression_attribute_names
+        if expression_attribute_values:
+            query_params["ExpressionAttributeValues"] = expression_attribute_values
+        if filter_expression:
+            query_params["FilterExpression"] = filter_expression
+        return self._iter_query(query_params, item_class, page_size, cursor, max_rows)
+
+    def iter_index(
         self,
         secondary_index_name: str,
         secondary_index_value: str,
         item_class: type[T],
+        *,
         additional_filter_expression: ComparisonCondition | None = None,
-    ) -> list[T]:
+        sort_key_condition: ComparisonCondition | None = None,
+        ascending: bool = True,
+        page_size: int = DEFAULT_SCAN_LIMIT,
+        cursor: str | None = None,
+    ) -> AsyncIterator[Page[T]]:
+        """Iterates over the items sharing a secondary index key, one page at a time.
+
+        Args:
+            secondary_index_name: The column the GSI is keyed on.
+            secondary_index_value: The value to look up.
+            item_class: The class of the items to list.
+            additional_filter_expression: Optional filter applied to each page.
+            sort_key_condition: Optional key condition on the index's sort key.
+            ascending: Whether to return items in ascending sort key order.
+            page_size: Number of items DynamoDB evaluates per page.
+            cursor: Resumes iteration from a previous page's cursor.
+
+        Returns:
+            An async iterator over the pages of matching items.
+        """
         filter_expression: ComparisonCondition = Key("type").eq(item_class.__name__)
         if additional_filter_expression is not None:
             filter_expression &= additional_filter_expression
-        table = await self.db.Table(TABLE_NAME)
-        item_dict = await table.query(
-            IndexName=self.get_gsi_index_name(secondary_index_name),
-            KeyConditionExpression=Key(secondary_index_name).eq(secondary_index_value),
-            FilterExpression=filter_expression,
-        )
-        items = item_dict["Items"]
-        return [self._validate_item(item, item_class) for item in items]
+        key_condition: ComparisonCondition = Key(secondary_index_name).eq(secondary_index_value)
+        if sort_key_condition is not None:
+            key_condition &= sort_key_condition
+        query_params: dict[str, Any] = {
+            "IndexName": self.get_gsi_index_name(secondary_index_name),
+            "KeyConditionExpression": key_condition,
+            "FilterExpression": filter_expression,
+            "ScanIndexForward": ascending,
+        }
+        return self._iter_query(query_params, item_class, page_size, cursor)
 
+    @track_operation
+    async def _get_items_from_secondary_index(
+        self,
+        secondary_index_name: str,
+        secondary_index_value: str,
+        item_class: type[T],
+        additional_filter_expression: ComparisonCondition | None = None,
+        ascending: bool = True,
+    ) -> list[T]:
+        items: list[T] = []
+        async for page in self.iter_index(
+            secondary_index_name,
+            secondary_index_value,
+            item_class,
+            additional_filter_expression=additional_filter_expression,
+            ascending=ascending,
+        ):
+            items.extend(page.items)
+        return items
+
+    @track_operation
     async def _update_item(
         self,
         id: str,
         model_type: type[T],
-        updates: dict[str, Any],
-    ) -> None:
+        updates: dict[str, Any] | None = None,
+        *,
+        append: dict[str, list[Any]] | None = None,
+        remove: list[str] | None = None,
+        add: dict[str, int | float] | None = None,
+        expected_version: int | None = None,
+        condition_expression: str | None = None,
+        condition_values: dict[str, Any] | None = None,
+        return_item: bool = False,
+    ) -> T | None:
+        """Updates an item in a single write, optionally only if a condition holds.
+
+        The changes are applied by DynamoDB, so they need no read first and
+        concurrent writers do not overwrite each other's changes to different
+        elements. Keys and paths may be document paths, such as
+        `transcriptions[2].audio_url`, to change part of an attribute.
+
+        Args:
+            id: The ID of the item to update.
+            model_type: The class of the item.
+            updates: The attributes to set.
+            append: Values to append to list attributes, which are created
+                if they are missing.
+            remove: Attributes or list elements, such as `images[3]`, to remove.
+            add: Amounts to add to number attributes, which start from zero.
+            expected_version: If set, the item's `version` attribute must
+                have this value, with 0 also matching items without one, and
+                is incremented by the update.
+            condition_expression: Optional condition the stored item must
+                satisfy. Attributes are referenced as `#name` and values as
+                `:name`, with the values supplied in `condition_values`.
+            condition_values: Values referenced by `condition_expression`.
+            return_item: Whether to return the item as it is after the update.
+
+        Returns:
+            The updated item if `return_item` is set, otherwise None.
+
+        Raises:
+            ItemConflictError: If the condition or the expected version does not hold.
+        """
         key = {"id": id}
 
-        update_expression = "SET " + ", ".join(f"#{k} = :{k}" for k in updates.keys())
-        expression_attribute_values = {f":{k}": v for k, v in updates.items()}
-        expression_attribute_names = {f"#{k}": k for k in updates.keys()}
+        expression_attribute_names: dict[str, str] = {}
+        expression_attribute_values: dict[str, Any] = {}
+        assignments = []
+        for k, v in (updates or {}).items():
+            placeholder = ":" + re.sub(r"\W", "_", k)
+            assignments.append(f"{document_path(k, expression_attribute_names)} = {placeholder}")
+            expression_attribute_values[placeholder] = v
+        for k, v in (append or {}).items():
+            placeholder = ":" + re.sub(r"\W", "_", k) + "_append"
+            path = document_path(k, expression_attribute_names)
+            assignments.append(f"{path} = list_append(if_not_exists({path}, :empty_list), {placeholder})")
+            expression_attribute_values[":empty_list"] = []
+            expression_attribute_values[placeholder] = v
+        increments = dict(add or {})
+        conditions = [condition_expression] if condition_expression is not None else []
+        if expected_version is not None:
+            increments["version"] = increments.get("version", 0) + 1
+            conditions.append(
+                "#version = :expected_version"
+                if expected_version
+                else "(attribute_not_exists(#version) OR #version = :expected_version)"
+            )
+            expression_attribute_values[":expected_version"] = expected_version
+        additions = []
+        for k, v in increments.items():
+            placeholder = ":" + re.sub(r"\W", "_", k) + "_add"
+            additions.append(f"{document_path(k, expression_attribute_names)} {placeholder}")
+            expression_attribute_values[placeholder] = v
+
+        clauses = []
+        if assignments:
+            clauses.append("SET " + ", ".join(assignments))
+        if remove:
+            clauses.append("REMOVE " + ", ".join(document_path(path, expression_attribute_names) for path in remove))
+        if additions:
+            clauses.append("ADD " + ", ".join(additions))
+        extra_params: dict[str, Any] = {}
+        if conditions:
+            extra_params["ConditionExpression"] = " AND ".join(f"({condition})" for condition in conditions)
+            for condition in conditions:
+                expression_attribute_names.update({f"#{k}": k for k in re.findall(r"#(\w+)", condition)})
+            expression_attribute_values.update(condition_values or {})
+        if expression_attribute_values:
+            extra_params["ExpressionAttributeValues"] = expression_attribute_values
 
         try:
-            await self.db.meta.client.update_item(
+            response = await self.db.meta.client.update_item(
                 TableName=TABLE_NAME,
                 Key=key,
-                UpdateExpression=update_expression,
-                ExpressionAttributeValues=expression_attribute_values,
+                UpdateExpression=" ".join(clauses),
                 ExpressionAttributeNames=expression_attribute_names,
-                ReturnValues="NONE",
+                ReturnValues="ALL_NEW" if return_item else "NONE",
+                **extra_params,
             )
         except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                raise ItemConflictError(f"Condition failed when updating {id}")
             if e.response["Error"]["Code"] == "ValidationException":
                 raise ValueError(f"Invalid update: {str(e)}")
             raise
+        if return_item:
+            return self._validate_item(response["Attributes"], model_type)
+        return None
 
+    @track_operation
     async def _delete_item(self, item: LinguaBaseModel | str) -> None:
         table = await self.db.Table(TABLE_NAME)
         await table.delete_item(Key={"id": item if isinstance(item, str) else item.id})
 
+    @staticmethod
+    def _gsi_schemas(gsis: list[GlobalSecondaryIndex]) -> dict[str, GlobalSecondaryIndexTypeDef]:
+        """Groups GSI key entries by index name into `GlobalSecondaryIndexes` specs.
+
+        An index with a sort key is described by two entries sharing the same
+        index name, one with key type HASH and one with key type RANGE.
+        """
+        key_schemas: dict[str, list[tuple[str, Literal["HASH", "RANGE"]]]] = {}
+        for i, n, _, t in sorted(gsis, key=lambda gsi: gsi[3]):
+            key_schemas.setdefault(i, []).append((n, t))
+        return {
+            i: {
+                "IndexName": i,
+                "KeySchema": [{"AttributeName": n, "KeyType": t} for n, t in key_schema],
+                "Projection": {"ProjectionType": "ALL"},
+            }
+            for i, key_schema in key_schemas.items()
+        }
+
+    @staticmethod
+    def _attribute_definitions(
+        keys: list[TableKey],
+        gsis: list[GlobalSecondaryIndex],
+    ) -> list[AttributeDefinitionTypeDef]:
+        attributes = dict(itertools.chain(((n, t) for (n, t, _) in keys), ((n, t) for _, n, t, _ in gsis)))
+        return [{"AttributeName": n, "AttributeType": t} for n, t in attributes.items()]
+
     async def _create_dynamodb_table(
         self,
         name: str,
@@ -210,31 +754,17 @@ class BaseCrud(AsyncContextManager):
 
             if gsis:
                 table = await self.db.create_table(
-                    AttributeDefinitions=[
-                        {"AttributeName": n, "AttributeType": t}
-                        for n, t in itertools.chain(((n, t) for (n, t, _) in keys), ((n, t) for _, n, t, _ in gsis))
-                    ],
+                    AttributeDefinitions=self._attribute_definitions(keys, gsis),
                     TableName=name,
                     KeySchema=[{"AttributeName": n, "KeyType": t} for n, _, t in keys],
-                    GlobalSecondaryIndexes=(
-                        [
-                            {
-                                "IndexName": i,
-                                "KeySchema": [{"AttributeName": n, "KeyType": t}],
-                                "Projection": {"ProjectionType": "ALL"},
-                            }
-                            for i, n, _, t in gsis
-                        ]
-                    ),
+                    GlobalSecondaryIndexes=list(self._gsi_schemas(gsis).values()),
                     DeletionProtectionEnabled=deletion_protection,
                     BillingMode="PAY_PER_REQUEST",
                 )
 
             else:
                 table = await self.db.create_table(
-                    AttributeDefinitions=[
-                        {"AttributeName": n, "AttributeType": t} for n, t in ((n, t) for (n, t, _) in keys)
-                    ],
+                    AttributeDefinitions=self._attribute_definitions(keys, []),
                     TableName=name,
                     KeySchema=[{"AttributeName": n, "KeyType": t} for n, _, t in keys],
                     DeletionProtectionEnabled=deletion_protection,
@@ -243,38 +773,95 @@ class BaseCrud(AsyncContextManager):
 
             await table.wait_until_exists()
 
+    async def _create_missing_gsis(self, name: str, keys: list[TableKey], gsis: list[GlobalSecondaryIndex]) -> None:
+        """Adds any GSIs which do not exist yet to an existing table.
+
+        DynamoDB only allows one index to be created per `UpdateTable` call,
+        so this waits for each index to finish backfilling before moving on.
+
+        Args:
+            name: Name of the table.
+            keys: Primary and secondary keys of the table.
+            gsis: The GSIs the table should have.
+        """
+        description = await self.db.meta.client.describe_table(TableName=name)
+        existing = {gsi["IndexName"] for gsi in description["Table"].get("GlobalSecondaryIndexes", [])}
+        for index_name, schema in self._gsi_schemas(gsis).items():
+            if index_name in existing:
+                continue
+            logger.info("Creating index %s on table %s", index_name, name)
+            index_gsis = [gsi for gsi in gsis if gsi[0] == index_name]
+            await self.db.meta.client.update_table(
+                TableName=name,
+                AttributeDefinitions=self._attribute_definitions(keys, index_gsis),
+                GlobalSecondaryIndexUpdates=[{"Create": schema}],
+            )
+            while True:
+                description = await self.db.meta.client.describe_table(TableName=name)
+                statuses = {
+                    gsi["IndexName"]: gsi.get("IndexStatus", "ACTIVE")
+                    for gsi in description["Table"].get("GlobalSecondaryIndexes", [])
+                }
+                if statuses.get(index_name) == "ACTIVE":
+                    break
+                await asyncio.sleep(5)
+
+    @track_operation
     async def _list_items(
         self,
         item_class: type[T],
+        *,
         expression_attribute_names: dict[str, str] | None = None,
         expression_attribute_values: dict[str, Any] | None = None,
         filter_expression: str | None = None,
-        offset: int | None = None,
-        limit: int = DEFAULT_SCAN_LIMIT,
+        cursor: str | None = None,
+        limit: int | None = DEFAULT_SCAN_LIMIT,
     ) -> list[T]:
-        table = await self.db.Table(TABLE_NAME)
-
-        query_params = {
-            "IndexName": "type-index",
-            "KeyConditionExpression": Key("type").eq(item_class.__name__),
-            "Limit": limit,
-        }
-
-        if expression_attribute_names:
-            query_params["ExpressionAttributeNames"] = expression_attribute_names
-        if expression_attribute_values:
-            query_params["ExpressionAttributeValues"] = expression_attribute_values
-        if filter_expression:
-            query_params["FilterExpression"] = filter_expression
-        if offset:
-            query_params["ExclusiveStartKey"] = {"id": offset}
-
-        items = (await table.query(**query_params))["Items"]
-        return [self._validate_item(item, item_class) for item in items]
+        items: list[T] = []
+        async for page in self.iter_items(
+            item_class,
+            expression_attribute_names=expression_attribute_names,
+            expression_attribute_values=expression_attribute_values,
+            filter_expression=filter_expression,
+            cursor=cursor,
+        ):
+            items.extend(page.items)
+            if limit is not None and len(items) >= limit:
+                return items[:limit]
+        return items
+
+    @track_operation
+    async def _upload_to_s3(
+        self,
+        file: BinaryIO | UploadFile,
+        unique_filename: str,
+        content_type: str | None = None,
+    ) -> None:
+        """Uploads a file to S3, as a multipart upload if it is larger than one part.
 
-    async def _upload_to_s3(self, file: BinaryIO, unique_filename: str) -> None:
+        Args:
+            file: The file to upload; an `UploadFile` is read without blocking the event loop.
+            unique_filename: The key of the object under `uploads/`.
+            content_type: The object's content type, if known.
+        """
         bucket = await self.s3.Bucket(settings.bucket_name)
-        await bucket.upload_fileobj(file, f"uploads/{unique_filename}")
+        await bucket.upload_fileobj(
+            file,  # type: ignore[arg-type]
+            f"uploads/{unique_filename}",
+            ExtraArgs={"ContentType": content_type} if content_type else None,
+            Config=get_transfer_config(),
+        )
+
+    @track_operation
+    async def _download_from_s3(self, unique_filename: str) -> bytes:
+        """Downloads a file uploaded with `_upload_to_s3`, streaming the body in chunks."""
+        response = await self.s3.meta.client.get_object(Bucket=settings.bucket_name, Key=f"uploads/{unique_filename}")
+        content = bytearray()
+        body = response["Body"]
+        async with body:
+            async for chunk in body.iter_chunks(S3_READ_CHUNK_SIZE):
+                content += chunk
+        return bytes(content)
 
     async def _create_s3_bucket(self) -> None:
         """Creates an S3 bucket if it does not already exist."""
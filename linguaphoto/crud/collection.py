@@ -2,9 +2,13 @@
 
 from typing import List
 
-from linguaphoto.crud.base import BaseCrud
+from linguaphoto.crud.base import DEFAULT_SCAN_LIMIT, BaseCrud, Page, encode_cursor
+from linguaphoto.errors import ItemConflictError, ItemNotFoundError
 from linguaphoto.models import Collection
 
+# Collections read per page of published ones, so sparse pages do not read the whole table
+PUBLIC_COLLECTIONS_MAX_ROWS = DEFAULT_SCAN_LIMIT
+
 
 class CollectionCrud(BaseCrud):
     async def create_collection(self, user_id: str, title: str, description: str) -> Collection:
@@ -20,8 +24,40 @@ class CollectionCrud(BaseCrud):
         collections = await self._get_items_from_secondary_index("user", user_id, Collection)
         return collections
 
-    async def edit_collection(self, collection_id: str, updates: dict) -> None:
-        await self._update_item(collection_id, Collection, updates)
+    async def edit_collection(
+        self,
+        collection_id: str,
+        updates: dict,
+        expected_version: int | None = None,
+    ) -> Collection | None:
+        """Sets attributes of a collection and returns it as updated, with its new version.
+
+        Args:
+            collection_id: The ID of the collection.
+            updates: The attributes to set.
+            expected_version: If set, the edit is only made if the collection
+                is still at this version, so that it does not undo changes,
+                such as uploads, made since the editor read it.
+
+        Raises:
+            ItemNotFoundError: If the collection does not exist.
+            ItemConflictError: If the collection is not at the expected version.
+        """
+        try:
+            return await self._update_item(
+                collection_id,
+                Collection,
+                updates,
+                add=None if expected_version is not None else {"version": 1},
+                expected_version=expected_version,
+                condition_expression="attribute_exists(id)",
+                return_item=True,
+            )
+        except ItemConflictError:
+            # Only a versioned edit can fail on an existing collection
+            if expected_version is None or await self._get_item(collection_id, Collection) is None:
+                raise ItemNotFoundError(f"Collection {collection_id} not found")
+            raise
 
     async def delete_collection(self, collection_id: str) -> None:
         await self._delete_item(collection_id)
@@ -32,5 +68,38 @@ class CollectionCrud(BaseCrud):
             filter_expression="#flag=:flag",
             expression_attribute_names={"#flag": "publish_flag"},
             expression_attribute_values={":flag": True},
+            limit=None,
         )
         return collections
+
+    async def get_public_collections_page(self, limit: int, cursor: str | None = None) -> Page[Collection]:
+        """Returns up to `limit` published collections and the cursor of the next page.
+
+        DynamoDB filters out unpublished collections after applying `Limit`,
+        so pages are read until `limit` published ones are found. At most
+        `PUBLIC_COLLECTIONS_MAX_ROWS` collections are read per call, so when
+        few are published the page may be shorter, with a cursor to continue.
+
+        Raises:
+            ValueError: If the cursor is malformed.
+        """
+        collections: list[Collection] = []
+        next_cursor: str | None = None
+        async for page in self.iter_items(
+            item_class=Collection,
+            filter_expression="#flag=:flag",
+            expression_attribute_names={"#flag": "publish_flag"},
+            expression_attribute_values={":flag": True},
+            page_size=limit,
+            cursor=cursor,
+            max_rows=PUBLIC_COLLECTIONS_MAX_ROWS,
+        ):
+            needed = limit - len(collections)
+            collections.extend(page.items[:needed])
+            next_cursor = page.cursor
+            if len(page.items) > needed:
+                # Continues after the last collection returned, rather than after the rest of its page
+                next_cursor = encode_cursor({"id": collections[-1].id, "type": Collection.__name__})
+            if len(collections) == limit:
+                break
+        return Page(collections, next_cursor)
@@ -1,120 +1,470 @@
 """Defines CRUD interface for Image API."""
 
-import os
+import asyncio
+import hashlib
+import logging
 import uuid
 from io import BytesIO
-from typing import List
+from typing import Awaitable, BinaryIO, List
 
-import requests
 from fastapi import HTTPException, UploadFile
 from openai import AsyncOpenAI
 
-from linguaphoto.ai.transcribe import transcribe_image
-from linguaphoto.ai.tts import synthesize_text
-from linguaphoto.crud.base import BaseCrud
-from linguaphoto.errors import ItemNotFoundError
-from linguaphoto.models import Collection, Image
+from linguaphoto.ai.client import get_openai_client
+from linguaphoto.ai.images import ImageProbe, probe_image
+from linguaphoto.ai.transcribe import TranscriptionStream
+from linguaphoto.ai.tts import TTS_MODEL, TTS_VOICE, audio_cache_key, normalize_text, synthesize_text
+from linguaphoto.crud.base import BaseCrud, Page, decode_cursor, encode_cursor
+from linguaphoto.errors import BadArtifactError, ImageTooLargeError, ItemConflictError, ItemNotFoundError
+from linguaphoto.models import AudioClip, Collection, Image, Transcription
+from linguaphoto.schemas.events import (
+    EventSink,
+    SentenceAudioReady,
+    TranscriptionReady,
+    TranslationDone,
+    TranslationEvent,
+)
 from linguaphoto.settings import settings
-from linguaphoto.utils.cloudfront_url_signer import CloudFrontUrlSigner
+from linguaphoto.utils.cache import audio_cache, audio_cache_stats, recent_uploads, upload_dedup_stats
+from linguaphoto.utils.cloudfront_url_signer import (
+    covered_by_cookies,
+    get_media_prefix,
+    get_url_signer,
+    sign_for_viewer,
+)
+from linguaphoto.utils.executors import run_in_thread
+from linguaphoto.utils.timing import StageTimer
+
+logger = logging.getLogger(__name__)
 
-key_pair_id = settings.key_pair_id
 media_hosting_server = settings.media_hosting_server
 
+# Content-addressed speech is shared between users, so it lives outside the per-user prefixes.
+AUDIO_CACHE_PREFIX = "tts"
+
+HASH_CHUNK_SIZE = 1 << 20
+# How many earlier uploads with the same content to consider when deduplicating.
+DUPLICATE_SCAN_LIMIT = 25
+# How many times to retry removing an image from a collection which other removals keep changing.
+MAX_COLLECTION_UPDATE_ATTEMPTS = 5
+
+
+def media_filename(url: str) -> str:
+    """Returns the filename under which a media URL, signed or not, was uploaded to S3."""
+    return url.split("?", 1)[0].removeprefix(f"{media_hosting_server}/")
+
+
+def inspect_upload(file: BinaryIO, max_bytes: int = settings.upload_max_bytes) -> tuple[str, int, ImageProbe]:
+    """Validates an uploaded image and returns its SHA-256 hex digest, size and probe.
+
+    The header is probed first, so non-images are rejected without reading
+    the rest of the file; the byte limit is then enforced chunk by chunk
+    while hashing. The file is rewound afterwards.
+
+    Raises:
+        BadArtifactError: If the file is not a supported image.
+        ImageTooLargeError: If the file or the image's dimensions are over the limits.
+    """
+    probe = probe_image(file)
+    file.seek(0)
+    digest = hashlib.sha256()
+    size = 0
+    while chunk := file.read(HASH_CHUNK_SIZE):
+        size += len(chunk)
+        if size > max_bytes:
+            raise ImageTooLargeError(f"Image is too large. Max size is {max_bytes // (1024 * 1024)} MB.")
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest(), size, probe
+
+
+async def _discard_event(event: TranslationEvent) -> None:
+    pass
+
 
 class ImageCrud(BaseCrud):
+    async def _upload_media(
+        self,
+        source: BinaryIO | UploadFile,
+        file_extension: str,
+        user_id: str,
+        content_type: str | None = None,
+    ) -> str:
+        """Uploads a media file to S3 and returns its unsigned URL.
+
+        In signed-cookie mode the file goes under the user's media prefix.
+        """
+        unique_filename = f"{uuid.uuid4()}.{file_extension}"
+        if settings.media_signed_cookies:
+            unique_filename = f"{get_media_prefix(user_id)}/{unique_filename}"
+        await self._upload_to_s3(source, unique_filename, content_type)
+        return f"{media_hosting_server}/{unique_filename}"
+
+    async def _sign_media_urls(self, urls: list[str], shared: bool = False) -> list[str]:
+        """Returns the URLs to store for uploaded media, signed in one batch unless in signed-cookie mode.
+
+        Shared media is outside the per-user prefix the cookies cover, so it is always signed.
+        """
+        if settings.media_signed_cookies and not shared:
+            return urls
+        return await get_url_signer().sign_many(urls, expire_days=100)
+
+    async def _store_media(
+        self,
+        source: BinaryIO | UploadFile,
+        file_extension: str,
+        user_id: str,
+        content_type: str | None = None,
+    ) -> str:
+        """Uploads a media file to S3 and returns the URL it is served from."""
+        [url] = await self._sign_media_urls([await self._upload_media(source, file_extension, user_id, content_type)])
+        return url
+
     async def create_image(self, file: UploadFile, user_id: str, collection_id: str) -> Image:
         if file.filename is None or not file.filename:
             raise HTTPException(status_code=400, detail="File name is missing.")
-        # Generate a unique file name
-        file_extension = file.filename.split(".")[-1] if "." in file.filename else "unknown"
-        unique_filename = f"{uuid.uuid4()}.{file_extension}"
-
-        # Create an instance of CloudFrontUrlSigner
-        private_key_path = os.path.abspath("private_key.pem")
-        cfs = CloudFrontUrlSigner(str(key_pair_id), private_key_path)
-        # Generate a signed URL
-        url = f"{media_hosting_server}/{unique_filename}"
-        custom_policy = cfs.create_custom_policy(url, expire_days=100)
-        s3_url = cfs.generate_presigned_url(url, custom_policy)
-        # Upload the file to S3
-        await self._upload_to_s3(file.file, unique_filename)
+        if file.size is not None and file.size > settings.upload_max_bytes:
+            raise HTTPException(status_code=413, detail="Image is too large.")
+        # Validate and hash the spooled upload off the event loop; hashlib releases the GIL on large chunks
+        try:
+            content_hash, size, probe = await run_in_thread(inspect_upload, file.file, settings.upload_max_bytes)
+        except ImageTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except BadArtifactError as e:
+            raise HTTPException(status_code=415, detail=str(e))
+        duplicate = await self.find_duplicate_image(content_hash, user_id)
+        reused_url: str | None = None
+        if duplicate is not None and (not settings.media_signed_cookies or duplicate.user == user_id):
+            # Point at the existing S3 object
+            reused_url = duplicate.image_url.split("?", 1)[0]
+            s3_url = reused_url
+            upload_dedup_stats.hits += 1
+            upload_dedup_stats.bytes_saved += size
+        else:
+            # Stream the file to S3 in bounded parts, stored under the extension of its probed format
+            s3_url = await self._store_media(file, probe.extension, user_id, probe.content_type)
+        copied = duplicate.transcriptions if duplicate is not None and duplicate.is_translated else []
+        # The reused object and copied speech are re-signed in one batch, so they get a fresh expiry. In
+        # signed-cookie mode the speech is outside the uploader's prefix, as are their own uploads from
+        # before it, so those are signed too.
+        urls = [t.audio_url.split("?", 1)[0] for t in copied if t.audio_url]
+        if reused_url is not None and not (settings.media_signed_cookies and covered_by_cookies(reused_url, user_id)):
+            urls.append(reused_url)
+        signed = dict(zip(urls, await self._sign_media_urls(urls, shared=True))) if urls else {}
+        s3_url = signed.get(s3_url, s3_url)
         # Create new Image
-        new_image = Image.create(image_url=s3_url, user_id=user_id, collection_id=collection_id)
+        new_image = Image.create(
+            image_url=s3_url, user_id=user_id, collection_id=collection_id, content_hash=content_hash
+        )
+        if duplicate is not None:
+            if duplicate.is_translated:
+                new_image.transcriptions = [
+                    t.model_copy(update={"audio_url": signed.get(t.audio_url.split("?", 1)[0], t.audio_url)})
+                    for t in copied
+                ]
+                new_image.is_translated = True
+                new_image.translation_tokens = duplicate.translation_tokens
+                upload_dedup_stats.transcription_hits += 1
+                upload_dedup_stats.tokens_saved += duplicate.translation_tokens
+            logger.info("Upload %s duplicates image %s", new_image.id, duplicate.id)
         await self._add_item(new_image)
-        collection = await self._get_item(collection_id, Collection, True)
-        if collection:
-            collection.images.append(new_image.id)
-            await self._update_item(collection.id, Collection, {"images": collection.images})
-            return new_image
-        raise ItemNotFoundError
+        if (
+            not new_image.is_translated
+            and settings.translation_workers > 0
+            and size <= settings.upload_handoff_max_bytes
+        ):
+            # Hand the bytes to this process's translation workers, so they need not download them again
+            await file.seek(0)
+            recent_uploads.set(new_image.id, await file.read())
+        # Appended in place, so concurrent uploads to the collection do not overwrite each other
+        try:
+            await self._update_item(
+                collection_id,
+                Collection,
+                append={"images": [new_image.id]},
+                add={"version": 1},
+                condition_expression="attribute_exists(id)",
+            )
+        except ItemConflictError:
+            raise ItemNotFoundError
+        return new_image
+
+    async def find_duplicate_image(self, content_hash: str, user_id: str) -> Image | None:
+        """Finds an earlier upload with the same content, preferring translated ones and the user's own."""
+        pages = self.iter_index("content_hash", content_hash, Image, page_size=DUPLICATE_SCAN_LIMIT)
+        page: Page[Image] = await anext(pages, Page([], None))
+        return max(page.items, key=lambda image: (image.is_translated, image.user == user_id), default=None)
 
     # Handles audio file creation by synthesizing and uploading to S3
-    async def create_audio(self, audio_source: BytesIO) -> str:
-        # Generate a unique file name with a '.mp3' extension (or other extension based on the format)
-        unique_filename = f"{uuid.uuid4()}.mp3"  # You can change the extension based on the actual audio format
+    async def create_audio(self, audio_source: BytesIO, user_id: str) -> str:
+        # You can change the extension based on the actual audio format
+        return await self._store_media(audio_source, "mp3", user_id, "audio/mpeg")
 
-        # Create an instance of CloudFrontUrlSigner
-        private_key_path = os.path.abspath("private_key.pem")
-        cfs = CloudFrontUrlSigner(str(key_pair_id), private_key_path)
+    async def get_images(self, collection_id: str) -> List[Image]:
+        collection = await self._get_item(collection_id, Collection)
+        if collection is None:
+            return []
+        return await self._batch_get_items(collection.images, Image)
 
-        # Generate a signed URL
-        url = f"{media_hosting_server}/{unique_filename}"
-        custom_policy = cfs.create_custom_policy(url, expire_days=100)
-        s3_url = cfs.generate_presigned_url(url, custom_policy)
+    async def list_images(self, collection_id: str) -> List[Image]:
+        """Lists a collection's images in upload order with a keyed query on the collection index."""
+        return await self._get_items_from_secondary_index("collection", collection_id, Image)
 
-        # Upload the audio source to S3
-        await self._upload_to_s3(audio_source, unique_filename)
+    async def list_images_page(self, collection_id: str, limit: int, cursor: str | None = None) -> Page[Image]:
+        """Returns one page of a collection's images in upload order, the same as `list_images`.
 
-        # Return the signed S3 URL
-        return s3_url
+        Raises:
+            ValueError: If the cursor is malformed.
+        """
+        pages = self.iter_index("collection", collection_id, Image, page_size=limit, cursor=cursor)
+        return await anext(pages, Page([], None))
 
-    async def get_images(self, collection_id: str) -> List[Image]:
-        images = await self._list_items(
-            item_class=Image,
-            filter_expression="#collection=:collection",
-            expression_attribute_names={"#collection": "collection"},
-            expression_attribute_values={":collection": collection_id},
-        )
-        return images
+    async def get_images_page(self, collection_id: str, limit: int, cursor: str | None = None) -> Page[Image]:
+        """Returns one page of a collection's images in its stored order, the same as `get_images`.
+
+        The cursor holds the last image of the previous page and its offset,
+        so a page resumes after that image even if images before it were
+        removed or reordered since; if it was removed itself, the page
+        resumes at its position.
+
+        Raises:
+            ValueError: If the cursor is malformed.
+        """
+        collection = await self._get_item(collection_id, Collection)
+        if collection is None:
+            return Page([], None)
+        start = 0
+        if cursor is not None:
+            key = decode_cursor(cursor)
+            if not isinstance(key.get("offset"), int) or key["offset"] < 1:
+                raise ValueError("Invalid cursor")
+            if key["id"] in collection.images:
+                start = collection.images.index(key["id"]) + 1
+            else:
+                # Its successor has moved up into its place
+                start = key["offset"] - 1
+        ids = collection.images[start : start + limit]
+        images = await self._batch_get_items(ids, Image)
+        end = start + len(ids)
+        if end >= len(collection.images):
+            return Page(images, None)
+        return Page(images, encode_cursor({"id": ids[-1], "offset": end}))
+
+    async def sign_images_for_viewer(self, images: List[Image], viewer_id: str | None) -> List[Image]:
+        """Returns the images with the media URLs the viewer's signed cookies do not cover signed."""
+        urls = [url for image in images for url in (image.image_url, *(t.audio_url for t in image.transcriptions))]
+        signed = iter(await sign_for_viewer(urls, viewer_id))
+        return [
+            image.model_copy(
+                update={
+                    "image_url": next(signed),
+                    "transcriptions": [t.model_copy(update={"audio_url": next(signed)}) for t in image.transcriptions],
+                }
+            )
+            for image in images
+        ]
 
     async def get_image(self, image_id: str) -> Image | None:
         image = await self._get_item(image_id, Image, True)
         return image
 
-    async def delete_image(self, image_id: str) -> None:
-        await self._delete_item(image_id)
+    async def delete_image(self, image: Image) -> None:
+        """Deletes an image and removes it from its collection's list of images."""
+        for _ in range(MAX_COLLECTION_UPDATE_ATTEMPTS):
+            collection = await self._get_item(image.collection, Collection)
+            if collection is None or image.id not in collection.images:
+                break
+            index = collection.images.index(image.id)
+            try:
+                # Only the one element is removed, and only if no other removal has shifted it since it was read
+                await self._update_item(
+                    collection.id,
+                    Collection,
+                    remove=[f"images[{index}]"],
+                    add={"version": 1},
+                    condition_expression=f"#images[{index}] = :image_id",
+                    condition_values={":image_id": image.id},
+                )
+                break
+            except ItemConflictError:
+                continue
+        else:
+            raise ItemConflictError(f"Collection {image.collection} kept changing while removing {image.id}")
+        await self._delete_item(image.id)
 
     # Translates the images to text and synthesizes audio for the transcriptions
-    async def translate(self, image_id: str, user_id: str) -> Image:
+    async def translate(
+        self,
+        image_id: str,
+        user_id: str,
+        timer: StageTimer | None = None,
+        on_event: EventSink | None = None,
+    ) -> Image:
+        """Transcribes an image and synthesizes the speech of each sentence.
+
+        Progress is stored and, if `on_event` is given, reported as it is
+        made: the transcriptions as soon as the vision model returns, then
+        each sentence's audio, then the finished image.
+        """
         # Retrieve image metadata and download the image content
         image_instance = await self._get_item(image_id, Image, True)
         if image_instance is None:
             raise ItemNotFoundError
-        response = requests.get(image_instance.image_url)
-        if response.status_code == 200:
-            img_source = BytesIO(response.content)
-            # Initialize OpenAI client for transcription and speech synthesis
-            client = AsyncOpenAI(api_key=settings.openai_key)
-            transcription_response = await transcribe_image(img_source, client)
-            # Process each transcription and generate corresponding audio
-            for i, transcription in enumerate(transcription_response.transcriptions):
+        # Callers may pass a timer to collect the per-stage timings, e.g. for benchmarks
+        timer = timer or StageTimer()
+        with timer.stage("download"):
+            # Use the bytes handed over by the upload when it happened in this process
+            content = recent_uploads.get(image_id)
+            if content is None:
+                content = await self._download_from_s3(media_filename(image_instance.image_url))
+            else:
+                recent_uploads.pop(image_id)
+        img_source = BytesIO(content)
+        # Use the shared OpenAI client for transcription and speech synthesis
+        async with get_openai_client() as client:
+            image_instance = await self._translate_with(
+                image_instance, img_source, client, timer, on_event or _discard_event
+            )
+        logger.info(
+            "Translated image %s: %s (speech cache hit rate %.0f%%)",
+            image_id,
+            timer.summary(),
+            audio_cache_stats.hit_rate * 100,
+        )
+        return image_instance
+
+    async def _translate_with(
+        self,
+        image_instance: Image,
+        img_source: BytesIO,
+        client: AsyncOpenAI,
+        timer: StageTimer,
+        on_event: EventSink,
+    ) -> Image:
+        image_id = image_instance.id
+        semaphore = asyncio.Semaphore(settings.tts_concurrency)
+        transcriptions: list[Transcription] = []
+        speech: list[asyncio.Task[str | None]] = []
+        try:
+            with timer.stage("transcribe"):
+                stream = TranscriptionStream(img_source, client)
+                # Start each sentence's speech as soon as the model has written it
+                async for transcription in stream:
+                    transcriptions.append(transcription)
+                    speech.append(asyncio.create_task(self._synthesize_audio(transcription, client, semaphore)))
+            # Store and send the text first, so it can be read while the speech is finished
+            with timer.stage("save"):
+                await self._update_item(
+                    image_id,
+                    Image,
+                    {
+                        "transcriptions": [transcription.model_dump() for transcription in transcriptions],
+                        "translation_tokens": stream.total_tokens,
+                    },
+                )
+            await on_event(
+                TranscriptionReady(
+                    image_id=image_id,
+                    # A snapshot, since the audio URLs are filled in afterwards
+                    transcriptions=[transcription.model_copy() for transcription in transcriptions],
+                    translation_tokens=stream.total_tokens,
+                )
+            )
+            # Store and send each sentence's speech as it is ready
+            with timer.stage("speech"):
+                synthesized = await asyncio.gather(
+                    *(
+                        self._add_sentence_audio(image_id, i, transcription, audio, on_event=on_event)
+                        for i, (transcription, audio) in enumerate(zip(transcriptions, speech))
+                    )
+                )
+        finally:
+            # Speech still running when the translation fails is not needed any more
+            for task in speech:
+                task.cancel()
+        image_instance.transcriptions = transcriptions
+        image_instance.is_translated = True
+        image_instance.translation_tokens = stream.total_tokens
+        with timer.stage("save"):
+            await self._update_item(image_id, Image, {"is_translated": True})
+        await on_event(TranslationDone(image_id=image_id, image=image_instance))
+        if not all(synthesized):
+            logger.warning("Synthesized %d of %d sentences for image %s", sum(synthesized), len(synthesized), image_id)
+        return image_instance
+
+    async def _add_sentence_audio(
+        self,
+        image_id: str,
+        index: int,
+        transcription: Transcription,
+        audio: Awaitable[str | None],
+        *,
+        on_event: EventSink,
+    ) -> bool:
+        """Attaches the speech of one sentence to the stored image, returning whether there was any.
+
+        A sentence whose speech could not be synthesized keeps an empty URL.
+        """
+        url = await audio
+        if url is None:
+            return False
+        [transcription.audio_url] = await self._sign_media_urls([url], shared=True)
+        await self._update_item(image_id, Image, {f"transcriptions[{index}].audio_url": transcription.audio_url})
+        await on_event(SentenceAudioReady(image_id=image_id, index=index, audio_url=transcription.audio_url))
+        return True
+
+    async def _get_cached_audio(self, digest: str) -> str | None:
+        """Looks up content-addressed speech in process, then in the table, returning its unsigned URL."""
+        url = audio_cache.get(digest)
+        if url is not None:
+            audio_cache_stats.memory_hits += 1
+            return url
+        clip = await self._get_item(AudioClip.get_id(digest), AudioClip)
+        if clip is None:
+            audio_cache_stats.misses += 1
+            return None
+        audio_cache_stats.store_hits += 1
+        audio_cache.set(digest, clip.audio_url)
+        return clip.audio_url
+
+    async def _synthesize_audio(
+        self,
+        transcription: Transcription,
+        client: AsyncOpenAI,
+        semaphore: asyncio.Semaphore,
+    ) -> str | None:
+        """Returns the unsigned URL of a sentence's speech, or None if it could not be synthesized.
+
+        Speech is stored under the hash of its text, voice and model, so a
+        sentence that was synthesized before reuses the existing S3 object.
+        """
+        text = normalize_text(transcription.text)
+        digest = audio_cache_key(text)
+        try:
+            url = await self._get_cached_audio(digest)
+            if url is not None:
+                return url
+            async with semaphore:
                 audio_buffer = BytesIO()
-                text = transcription.text
                 # Synthesize text and write the chunks directly into the in-memory buffer
-                async for chunk in await synthesize_text(text, client):
+                async for chunk in await synthesize_text(text, client, voice=TTS_VOICE, model=TTS_MODEL):
                     audio_buffer.write(chunk)
                 # Set buffer position to the start
                 audio_buffer.seek(0)
-                audio_url = await self.create_audio(audio_buffer)
-                if audio_url is None:
-                    continue
-                # Attach the audio URL to the transcription
-                transcription.audio_url = audio_url
-            image_instance.transcriptions = transcription_response.transcriptions
-            image_instance.is_translated = True
-            await self._update_item(
-                image_id,
-                Image,
-                {"transcriptions": transcription_response.model_dump()["transcriptions"], "is_translated": True},
-            )
-        return image_instance
+                filename = f"{AUDIO_CACHE_PREFIX}/{digest}.mp3"
+                await self._upload_to_s3(audio_buffer, filename, "audio/mpeg")
+            url = f"{media_hosting_server}/{filename}"
+            # The object is only published once it is fully uploaded.
+            try:
+                await self._put_item(
+                    AudioClip(id=AudioClip.get_id(digest), audio_url=url, voice=TTS_VOICE, model=TTS_MODEL),
+                    condition_expression="attribute_not_exists(id)",
+                )
+            except ItemConflictError:
+                # Another worker won; it uploaded the same speech under the same key.
+                pass
+            audio_cache.set(digest, url)
+            return url
+        except Exception:
+            logger.exception("Failed to synthesize audio for %r", transcription.text)
+            return None
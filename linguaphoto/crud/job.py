@@ -0,0 +1,155 @@
+"""Defines CRUD interface for translation jobs.
+
+Jobs are claimed with a lease: a worker owns a running job until its
+`available_at` passes, and must renew the lease while it works. All state
+transitions are conditional writes, so several workers (in one process or
+many) can safely compete for the same jobs.
+"""
+
+import time
+from typing import List
+
+from boto3.dynamodb.conditions import Key
+
+from linguaphoto.crud.base import BaseCrud
+from linguaphoto.errors import ItemConflictError
+from linguaphoto.models import TranslationJob
+
+
+def now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+class JobCrud(BaseCrud):
+    async def enqueue_translation(self, image_id: str, user_id: str) -> bool:
+        """Creates a pending job for the image, unless one is already queued or running.
+
+        Returns:
+            Whether a new job was queued.
+        """
+        job = TranslationJob(id=TranslationJob.get_id(image_id), image=image_id, user=user_id, available_at=now_ms())
+        try:
+            # A finished job is replaced by the new one, starting its attempts afresh.
+            await self._put_item(
+                job,
+                condition_expression="attribute_not_exists(id) OR #status IN (:done, :failed)",
+                condition_values={":done": "done", ":failed": "failed"},
+            )
+        except ItemConflictError:
+            return False
+        return True
+
+    async def get_job(self, job_id: str) -> TranslationJob | None:
+        return await self._get_item(job_id, TranslationJob)
+
+    async def claim_job(
+        self, job_id: str, worker_id: str, lease_seconds: int, *, max_attempts: int
+    ) -> TranslationJob | None:
+        """Takes the lease on a job if it is pending or its previous lease expired.
+
+        A job which has already used up its attempts is marked failed instead,
+        so that one which crashes its worker, or keeps outliving its lease, is
+        not reclaimed forever.
+
+        Args:
+            job_id: The job to claim.
+            worker_id: The worker taking the lease.
+            lease_seconds: How long the worker owns the job before it must
+                renew the lease.
+            max_attempts: How many times the job may be started.
+
+        Returns:
+            The claimed job, the job with status "failed" if it was given up
+            on, or None if it is not claimable or another worker won.
+        """
+        job = await self.get_job(job_id)
+        now = now_ms()
+        if job is None or job.status not in ("pending", "running") or job.available_at > now:
+            return None
+        if job.attempts >= max_attempts:
+            updates = {
+                "status": "failed",
+                "available_at": now,
+                "error": f"Gave up after {job.attempts} attempts which did not finish",
+            }
+        else:
+            updates = {
+                "status": "running",
+                "lease_owner": worker_id,
+                "available_at": now + lease_seconds * 1000,
+                "attempts": job.attempts + 1,
+            }
+        try:
+            return await self._update_item(
+                job_id,
+                TranslationJob,
+                updates,
+                # The (status, available_at) pair changes on every transition, so it acts as a version.
+                condition_expression="#status = :expected_status AND #available_at = :expected_available_at",
+                condition_values={":expected_status": job.status, ":expected_available_at": job.available_at},
+                return_item=True,
+            )
+        except ItemConflictError:
+            return None
+
+    async def _update_owned_job(self, job_id: str, worker_id: str, updates: dict) -> bool:
+        try:
+            await self._update_item(
+                job_id,
+                TranslationJob,
+                updates,
+                condition_expression="#status = :running AND #lease_owner = :worker_id",
+                condition_values={":running": "running", ":worker_id": worker_id},
+            )
+        except ItemConflictError:
+            return False
+        return True
+
+    async def renew_lease(self, job_id: str, worker_id: str, lease_seconds: int) -> bool:
+        return await self._update_owned_job(job_id, worker_id, {"available_at": now_ms() + lease_seconds * 1000})
+
+    async def complete_job(self, job_id: str, worker_id: str) -> bool:
+        return await self._update_owned_job(job_id, worker_id, {"status": "done", "available_at": now_ms()})
+
+    async def fail_job(self, job_id: str, worker_id: str, error: str, retry_delay_seconds: float | None) -> bool:
+        """Records a failed attempt, either requeueing the job after a delay or marking it failed.
+
+        Args:
+            job_id: The job which failed.
+            worker_id: The worker holding the lease.
+            error: A description of the failure.
+            retry_delay_seconds: Delay before the job may be retried, or None
+                to give up on it.
+
+        Returns:
+            Whether the worker still held the lease.
+        """
+        if retry_delay_seconds is None:
+            updates = {"status": "failed", "available_at": now_ms(), "error": error}
+        else:
+            updates = {"status": "pending", "available_at": now_ms() + int(retry_delay_seconds * 1000), "error": error}
+        return await self._update_owned_job(job_id, worker_id, updates)
+
+    async def release_job(self, job_id: str, worker_id: str) -> bool:
+        """Hands a running job back to the queue without counting it as a failure."""
+        job = await self.get_job(job_id)
+        attempts = max(job.attempts - 1, 0) if job is not None else 0
+        return await self._update_owned_job(
+            job_id, worker_id, {"status": "pending", "available_at": now_ms(), "attempts": attempts}
+        )
+
+    async def get_claimable_jobs(self, limit: int) -> List[TranslationJob]:
+        """Lists pending jobs which are due and running jobs whose lease expired."""
+        jobs: List[TranslationJob] = []
+        for status in ("pending", "running"):
+            async for page in self.iter_index(
+                "status",
+                status,
+                TranslationJob,
+                sort_key_condition=Key("available_at").lte(now_ms()),
+                page_size=limit,
+            ):
+                jobs.extend(page.items)
+                if len(jobs) >= limit:
+                    return jobs[:limit]
+        return jobs
@@ -7,6 +7,8 @@ from typing import List
 from linguaphoto.crud.base import BaseCrud
 from linguaphoto.models import User
 from linguaphoto.schemas.user import UserSigninFragment, UserSignupFragment
+from linguaphoto.utils.cache import api_key_cache, subscription_cache
+from linguaphoto.utils.executors import run_in_thread
 
 
 def generate_api_key() -> str:
@@ -21,7 +23,8 @@ class UserCrud(BaseCrud):
         duplicated_user = await self._get_items_from_secondary_index("email", user.email, User)
         if duplicated_user:
             return None
-        new_user = User.create(user)
+        # bcrypt is deliberately slow, and releases the GIL while it hashes
+        new_user = await run_in_thread(User.create, user)
         await self._add_item(new_user, unique_fields=["email"])
         return new_user
 
@@ -33,29 +36,33 @@ class UserCrud(BaseCrud):
         return res[0]
 
     async def get_user_by_api_key(self, api_key: str) -> User | None:
-        res = await self._list_items(
-            item_class=User,
-            filter_expression="#api_key=:api_key",
-            expression_attribute_names={"#api_key": "api_key"},
-            expression_attribute_values={":api_key": api_key},
-        )
+        res = await self._get_items_from_secondary_index("api_key", api_key, User)
         if res:
             return res[0]
         return None
 
-    async def verify_user_by_email(self, user: UserSigninFragment) -> bool:
+    async def authenticate(self, user: UserSigninFragment) -> User | None:
+        """Fetches the user with the email once and checks the password off the event loop.
+
+        Returns:
+            The user, or None if there is no such user or the password is wrong.
+        """
         users: List[User] = await self._get_items_from_secondary_index("email", user.email, User)
-        # Access the first user in the list and verify the password
-        if users:
-            user_instance = users[0]
-            return user_instance.verify_password(user.password)
-        else:
-            raise ValueError
+        if not users:
+            return None
+        verified = await run_in_thread(users[0].verify_password, user.password)
+        return users[0] if verified else None
 
     async def update_user(self, id: str, data: dict) -> None:
         await self._update_item(id, User, data)
+        self._invalidate_principal(id)
 
     async def generate_api_key(self, id: str) -> str:
         new_key = generate_api_key()
         await self._update_item(id, User, {"api_key": new_key})
+        self._invalidate_principal(id)
         return new_key
+
+    def _invalidate_principal(self, id: str) -> None:
+        subscription_cache.pop(id)
+        api_key_cache.pop_where(lambda principal: principal.user_id == id)
@@ -3,17 +3,28 @@
 import argparse
 import asyncio
 import logging
-from typing import AsyncGenerator, Literal, Self
+import time
+from typing import AsyncGenerator, Self
 
-from linguaphoto.crud.base import TABLE_NAME, BaseCrud
+from boto3.dynamodb.conditions import Attr, Key
+from botocore.exceptions import ClientError
+from types_aiobotocore_dynamodb.service_resource import Table
+
+from linguaphoto.crud.base import TABLE_NAME, BaseCrud, GlobalSecondaryIndex, TableKey
 from linguaphoto.crud.collection import CollectionCrud
 from linguaphoto.crud.image import ImageCrud
+from linguaphoto.crud.job import JobCrud
 from linguaphoto.crud.user import UserCrud
 
+TABLE_KEYS: list[TableKey] = [("id", "S", "HASH")]
+
+logger = logging.getLogger(__name__)
+
 
 class Crud(
     CollectionCrud,
     ImageCrud,
+    JobCrud,
     UserCrud,
     BaseCrud,
 ):
@@ -39,24 +50,125 @@ async def create_tables(crud: Crud | None = None, deletion_protection: bool = Fa
             await create_tables(new_crud)
 
     else:
-        gsis_set = crud.get_gsis()
-        gsis: list[tuple[str, str, Literal["S", "N", "B"], Literal["HASH", "RANGE"]]] = [
-            (Crud.get_gsi_index_name(g), g, "S", "HASH") for g in gsis_set
-        ]
-
         await asyncio.gather(
             crud._create_dynamodb_table(
                 name=TABLE_NAME,
-                keys=[
-                    ("id", "S", "HASH"),
-                ],
-                gsis=gsis,
+                keys=TABLE_KEYS,
+                gsis=get_gsis(),
                 deletion_protection=deletion_protection,
             ),
             crud._create_s3_bucket(),
         )
 
 
+def get_gsis() -> list[GlobalSecondaryIndex]:
+    """Returns the key entries of every GSI on the table."""
+    gsis: list[GlobalSecondaryIndex] = []
+    sort_keys = Crud.get_gsi_sort_keys()
+    for g in sorted(Crud.get_gsis()):
+        gsis.append((Crud.get_gsi_index_name(g), g, "S", "HASH"))
+        if g in sort_keys:
+            sort_key, sort_key_type = sort_keys[g]
+            gsis.append((Crud.get_gsi_index_name(g), sort_key, sort_key_type, "RANGE"))
+    return gsis
+
+
+async def _first_backfill_timestamp(table: Table) -> int:
+    """Returns the first of a run of timestamps, one per image lacking `created_at`, below every existing one."""
+    query_params: dict = {
+        "IndexName": "type-index",
+        "KeyConditionExpression": Key("type").eq("Image"),
+        "ProjectionExpression": "created_at",
+    }
+    # Images uploaded while the migration runs are stamped with the current time, so they sort after too.
+    earliest = int(time.time() * 1000)
+    num_missing = 0
+    while True:
+        response = await table.query(**query_params)
+        for item in response["Items"]:
+            if "created_at" in item:
+                earliest = min(earliest, int(item["created_at"]))  # type: ignore[arg-type]
+            else:
+                num_missing += 1
+        if "LastEvaluatedKey" not in response:
+            return earliest - num_missing
+        query_params["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+async def _backfill_created_at(table: Table, image_ids: list[str], first_timestamp: int) -> int:
+    """Sets `created_at` on the images which lack it, in the order given, returning how many were updated.
+
+    The updated images get consecutive timestamps from `first_timestamp`.
+    """
+    num_updated = 0
+    for image_id in image_ids:
+        try:
+            await table.update_item(
+                Key={"id": image_id},
+                UpdateExpression="SET created_at = :created_at",
+                ConditionExpression="attribute_exists(id) AND attribute_not_exists(created_at)",
+                ExpressionAttributeValues={":created_at": first_timestamp + num_updated},
+            )
+            num_updated += 1
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+    return num_updated
+
+
+async def migrate_tables(crud: Crud | None = None) -> None:
+    """Brings an existing table up to date with the current schema.
+
+    This creates any missing GSIs and backfills `created_at` on images which
+    predate the collection index. Backfilled timestamps follow the order of
+    each collection's `images` list, so the index reproduces the order users
+    already see; images which no collection lists are then placed after them.
+    All of them sort before every image which already has a timestamp,
+    including ones uploaded while the migration runs, and no two share one.
+    Running it more than once is safe.
+
+    Args:
+        crud: The top-level CRUD class.
+    """
+    logging.basicConfig(level=logging.INFO)
+
+    if crud is None:
+        async with Crud() as new_crud:
+            await migrate_tables(new_crud)
+
+    else:
+        await crud._create_missing_gsis(TABLE_NAME, TABLE_KEYS, get_gsis())
+
+        table = await crud.db.Table(TABLE_NAME)
+        first_timestamp = await _first_backfill_timestamp(table)
+        query_params: dict = {"IndexName": "type-index", "KeyConditionExpression": Key("type").eq("Collection")}
+        num_updated = 0
+        while True:
+            response = await table.query(**query_params)
+            for collection in response["Items"]:
+                image_ids: list[str] = collection.get("images", [])  # type: ignore[assignment]
+                num_updated += await _backfill_created_at(table, image_ids, first_timestamp + num_updated)
+            if "LastEvaluatedKey" not in response:
+                break
+            query_params["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+        # Images which no collection lists, such as ones dropped from it, must still get a sort key to be indexed.
+        query_params = {
+            "IndexName": "type-index",
+            "KeyConditionExpression": Key("type").eq("Image"),
+            "FilterExpression": Attr("created_at").not_exists(),
+            "ProjectionExpression": "id",
+        }
+        while True:
+            response = await table.query(**query_params)
+            image_ids = [str(item["id"]) for item in response["Items"]]
+            num_updated += await _backfill_created_at(table, image_ids, first_timestamp + num_updated)
+            if "LastEvaluatedKey" not in response:
+                break
+            query_params["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+        logger.info("Backfilled created_at on %d images", num_updated)
+
+
 async def delete_tables(crud: Crud | None = None) -> None:
     """Deletes all of the database tables.
 
@@ -90,7 +202,7 @@ async def populate_with_dummy_data(crud: Crud | None = None) -> None:
 
 async def main() -> None:
     parser = argparse.ArgumentParser()
-    parser.add_argument("action", choices=["create", "delete", "populate"])
+    parser.add_argument("action", choices=["create", "delete", "populate", "migrate"])
     args = parser.parse_args()
 
     async with Crud() as crud:
@@ -101,6 +213,8 @@ async def main() -> None:
                 await delete_tables(crud)
             case "populate":
                 await populate_with_dummy_data(crud)
+            case "migrate":
+                await migrate_tables(crud)
             case _:
                 raise ValueError(f"Invalid action: {args.action}")
 
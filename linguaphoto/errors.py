@@ -10,7 +10,13 @@ class NotAuthorizedError(Exception): ...
 class ItemNotFoundError(ValueError): ...
 
 
+class ItemConflictError(ValueError): ...
+
+
 class InternalError(RuntimeError): ...
 
 
 class BadArtifactError(Exception): ...
+
+
+class ImageTooLargeError(BadArtifactError): ...
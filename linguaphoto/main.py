@@ -1,16 +1,36 @@
 """Defines the main entrypoint for the FastAPI app."""
 
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
 import socketio
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from linguaphoto.ai.client import openai_pool
 from linguaphoto.api.api import router
-from linguaphoto.socket_manager import (
-    sio,  # Import the `sio` and `notify_user` from socket.py
-)
+from linguaphoto.crud.base import client_pool
+from linguaphoto.socket_manager import sio
+from linguaphoto.utils.executors import shutdown_executors
+from linguaphoto.utils.metrics import MetricsMiddleware
+from linguaphoto.utils.utils import NEXT_CURSOR_HEADER
+from linguaphoto.worker import translation_pool
+
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Opens the shared AWS and OpenAI clients and runs the translation workers for the lifetime of the app."""
+    async with client_pool, openai_pool:
+        await translation_pool.start()
+        try:
+            yield
+        finally:
+            await translation_pool.drain()
+            shutdown_executors()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Adds CORS middleware.
 app.add_middleware(
@@ -19,8 +39,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
+# Records per-route latencies; added last so that it also times the CORS middleware.
+app.add_middleware(MetricsMiddleware)
+
 app.include_router(router, prefix="")
 app = socketio.ASGIApp(sio, app)
 
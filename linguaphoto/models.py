@@ -1,6 +1,7 @@
 """Models!"""
 
-from typing import List, Optional, Self
+import time
+from typing import List, Literal, Optional, Self
 from uuid import uuid4
 
 from bcrypt import checkpw, gensalt, hashpw
@@ -61,6 +62,8 @@ class Collection(LinguaBaseModel):
     user: str
     featured_image: str = ""
     publish_flag: bool = False
+    # Incremented by every update, so that edits can be made conditional on what the editor last saw.
+    version: int = 0
 
     @classmethod
     def create(cls, title: str, description: str, user_id: str) -> Self:
@@ -77,6 +80,8 @@ class Transcription(BaseModel):
 
 class TranscriptionResponse(BaseModel):
     transcriptions: list[Transcription]
+    # Tokens the vision model used to produce this response.
+    total_tokens: int = 0
 
 
 class Image(LinguaBaseModel):
@@ -85,8 +90,60 @@ class Image(LinguaBaseModel):
     collection: str
     image_url: str
     user: str
+    # Upload time in epoch milliseconds; the sort key of the collection index.
+    created_at: int = 0
+    # SHA-256 of the uploaded file; the key of the content hash index.
+    content_hash: str = ""
+    # Vision model tokens spent on the transcriptions.
+    translation_tokens: int = 0
 
     @classmethod
-    def create(cls, image_url: str, user_id: str, collection_id: str) -> Self:
+    def create(cls, image_url: str, user_id: str, collection_id: str, content_hash: str = "") -> Self:
         """Initializes a new User instance with a unique ID, username, email,and hashed password."""
-        return cls(id=str(uuid4()), image_url=image_url, user=user_id, collection=collection_id)
+        return cls(
+            id=str(uuid4()),
+            image_url=image_url,
+            user=user_id,
+            collection=collection_id,
+            created_at=int(time.time() * 1000),
+            content_hash=content_hash,
+        )
+
+
+class TranslationJob(LinguaBaseModel):
+    """A durable request to translate an image.
+
+    There is at most one job per image. `available_at` (epoch milliseconds) is
+    when a pending job may next be claimed, or when a running job's lease
+    expires; together with `status` it forms the key of the status index,
+    which is how workers find claimable jobs.
+    """
+
+    image: str
+    user: str
+    status: Literal["pending", "running", "done", "failed"] = "pending"
+    attempts: int = 0
+    available_at: int = 0
+    lease_owner: Optional[str] = None
+    error: Optional[str] = None
+
+    @classmethod
+    def get_id(cls, image_id: str) -> str:
+        return f"translation-job-{image_id}"
+
+
+class AudioClip(LinguaBaseModel):
+    """Synthesized speech, stored under a content address.
+
+    The ID is derived from a hash of the normalized text, voice and model (see
+    `linguaphoto.ai.tts.audio_cache_key`), so the same sentence is only
+    synthesized once, whichever image or user it comes from.
+    """
+
+    audio_url: str
+    voice: str
+    model: str
+
+    @classmethod
+    def get_id(cls, digest: str) -> str:
+        return f"tts-audio-{digest}"
@@ -16,6 +16,8 @@ class CollectionEditFragment(BaseModel):
     description: Optional[str]
     images: Optional[List[str]]
     featured_image: Optional[str]
+    # The version the editor read; if given, the edit fails when the collection has changed since.
+    version: Optional[int] = None
 
 
 class CollectionPublishFragment(BaseModel):
@@ -0,0 +1,52 @@
+"""Socket.IO events sent to users while their images are translated.
+
+A translation sends, in order, `translation_transcribed` once the text is
+known, `translation_audio` as each sentence's speech is uploaded, and then
+either `translation_done` or `translation_failed`. Each event is emitted
+under its `name`, with the model's fields as the payload.
+"""
+
+from typing import Awaitable, Callable, ClassVar
+
+from pydantic import BaseModel
+
+from linguaphoto.models import Image, Transcription
+
+
+class TranslationEvent(BaseModel):
+    name: ClassVar[str]
+    image_id: str
+
+
+class TranscriptionReady(TranslationEvent):
+    """The image's sentences, with their pinyin and translation but no audio yet."""
+
+    name = "translation_transcribed"
+    transcriptions: list[Transcription]
+    translation_tokens: int
+
+
+class SentenceAudioReady(TranslationEvent):
+    """The speech of the sentence at `index` in the transcriptions."""
+
+    name = "translation_audio"
+    index: int
+    audio_url: str
+
+
+class TranslationDone(TranslationEvent):
+    """The translated image, as it is stored."""
+
+    name = "translation_done"
+    image: Image
+
+
+class TranslationFailed(TranslationEvent):
+    """The translation failed; `retrying` tells whether it will be attempted again."""
+
+    name = "translation_failed"
+    error: str
+    retrying: bool
+
+
+EventSink = Callable[[TranslationEvent], Awaitable[None]]
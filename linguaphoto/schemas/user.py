@@ -29,4 +29,11 @@ class UserSigninRespondFragment(BaseModel):
     email: EmailStr
     is_subscription: bool
     is_auth: bool
-    api_key: str
+    api_key: str | None = None
+
+
+class Principal(BaseModel):
+    """The authenticated caller, resolved once per request."""
+
+    user_id: str
+    is_subscription: bool
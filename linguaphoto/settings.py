@@ -22,6 +22,7 @@ class Settings:
     dynamodb_table_name = os.getenv("DYNAMODB_TABLE_NAME", "linguaphoto")
     media_hosting_server = os.getenv("MEDIA_HOSTING_SERVER")
     key_pair_id = os.getenv("KEY_PAIR_ID")
+    private_key_path = os.getenv("CLOUDFRONT_PRIVATE_KEY_PATH", "private_key.pem")
     aws_region_name = os.getenv("AWS_REGION")
     aws_access_key_id = os.getenv("AWS_ACCESS_KEY_ID")
     aws_secret_access_key = os.getenv("AWS_SECRET_ACCESS_KEY")
@@ -30,5 +31,91 @@ class Settings:
     stripe_price_id = os.getenv("STRIPE_PRODUCT_PRICE_ID", "price_1Q0ZaMKeTo38dsfeSWRDGCEf")
     homepage_url = os.getenv("HOMEPAGE_URL", "http://localhost:3000")
 
+    # Socket.IO rooms are shared between workers through this pub/sub manager
+    # (a redis:// URL, or fakeredis:// locally); unset keeps them in-process.
+    socketio_manager_url = os.getenv("SOCKETIO_MANAGER_URL", "")
+    socketio_channel = os.getenv("SOCKETIO_CHANNEL", "linguaphoto")
+
+    # Shared AWS client pool.
+    aws_max_pool_connections = int(os.getenv("AWS_MAX_POOL_CONNECTIONS", "50"))
+    aws_retry_mode = os.getenv("AWS_RETRY_MODE", "adaptive")
+    aws_max_attempts = int(os.getenv("AWS_MAX_ATTEMPTS", "5"))
+    aws_keepalive_timeout = float(os.getenv("AWS_KEEPALIVE_TIMEOUT", "60"))
+    aws_tcp_keepalive = os.getenv("AWS_TCP_KEEPALIVE", "true").lower() == "true"
+    # Asks DynamoDB to report consumed capacity, which is exported at /metrics.
+    dynamodb_consumed_capacity = os.getenv("DYNAMODB_CONSUMED_CAPACITY", "true").lower() == "true"
+    # Bearer token scrapers send to read /metrics; unset, the endpoint is not served.
+    metrics_token = os.getenv("METRICS_TOKEN")
+
+    # In-process authentication caches. Changes to a user invalidate the entries
+    # of the process which made them only; every other API or worker process
+    # keeps accepting a replaced API key, or the old subscription flag, until its
+    # entry expires, so these TTLs bound how long that window stays open.
+    auth_cache_size = int(os.getenv("AUTH_CACHE_SIZE", "4096"))
+    api_key_cache_ttl = float(os.getenv("API_KEY_CACHE_TTL_SECONDS", "30"))
+    subscription_cache_ttl = float(os.getenv("SUBSCRIPTION_CACHE_TTL_SECONDS", "30"))
+
+    # CloudFront URL signing.
+    url_signer_cache_size = int(os.getenv("URL_SIGNER_CACHE_SIZE", "10000"))
+    url_signer_expiry_bucket_seconds = int(os.getenv("URL_SIGNER_EXPIRY_BUCKET_SECONDS", "3600"))
+
+    # Signed-cookie mode for media: plain URLs, authorized by per-user CloudFront cookies.
+    media_signed_cookies = os.getenv("MEDIA_SIGNED_COOKIES", "false").lower() == "true"
+    media_cookie_domain = os.getenv("MEDIA_COOKIE_DOMAIN")
+    media_cookie_expire_days = int(os.getenv("MEDIA_COOKIE_EXPIRE_DAYS", "1"))
+
+    # Translation job workers. Set TRANSLATION_WORKERS=0 to only enqueue jobs
+    # from the API and run `python -m linguaphoto.worker` separately.
+    translation_workers = int(os.getenv("TRANSLATION_WORKERS", "4"))
+    translation_queue_size = int(os.getenv("TRANSLATION_QUEUE_SIZE", "100"))
+    translation_lease_seconds = int(os.getenv("TRANSLATION_LEASE_SECONDS", "300"))
+    translation_max_attempts = int(os.getenv("TRANSLATION_MAX_ATTEMPTS", "3"))
+    translation_poll_seconds = float(os.getenv("TRANSLATION_POLL_SECONDS", "10"))
+    translation_drain_seconds = float(os.getenv("TRANSLATION_DRAIN_SECONDS", "30"))
+
+    # Upload limits, checked before anything is stored.
+    upload_max_bytes = int(os.getenv("UPLOAD_MAX_BYTES", str(20 * 1024 * 1024)))
+    upload_max_dimension = int(os.getenv("UPLOAD_MAX_DIMENSION", "12000"))
+    upload_max_pixels = int(os.getenv("UPLOAD_MAX_PIXELS", "50000000"))
+
+    # Shared OpenAI client. OPENAI_BASE_URL points the pipeline at a stand-in server.
+    openai_base_url = os.getenv("OPENAI_BASE_URL")
+    openai_max_connections = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+    openai_max_keepalive_connections = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "10"))
+    openai_keepalive_expiry = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY_SECONDS", "60"))
+    openai_timeout = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "120"))
+    openai_connect_timeout = float(os.getenv("OPENAI_CONNECT_TIMEOUT_SECONDS", "10"))
+    openai_max_retries = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+
+    # Shared executors for CPU-bound work (see `linguaphoto.utils.executors`).
+    # Set CPU_EXECUTOR=process to run pure-Python work such as RSA signing on a process pool.
+    executor_threads = int(os.getenv("EXECUTOR_THREADS", "8"))
+    cpu_executor = os.getenv("CPU_EXECUTOR", "thread")
+    cpu_workers = int(os.getenv("CPU_WORKERS", str(os.cpu_count() or 2)))
+
+    # Preprocessing of images before the vision call. The API scales high-detail
+    # images to a short side of at most 768px, so larger images only cost upload time.
+    vision_max_long_edge = int(os.getenv("VISION_MAX_LONG_EDGE", "1536"))
+    vision_jpeg_quality = int(os.getenv("VISION_JPEG_QUALITY", "85"))
+    # Streams vision responses, so speech synthesis starts on the first sentences while the rest are written.
+    vision_stream = os.getenv("VISION_STREAM", "true").lower() == "true"
+    vision_max_tokens = int(os.getenv("VISION_MAX_TOKENS", "1024"))
+
+    # Uploaded images kept in memory for translation workers in the same process.
+    upload_handoff_size = int(os.getenv("UPLOAD_HANDOFF_SIZE", "16"))
+    upload_handoff_max_bytes = int(os.getenv("UPLOAD_HANDOFF_MAX_BYTES", str(10 * 1024 * 1024)))
+    upload_handoff_ttl = float(os.getenv("UPLOAD_HANDOFF_TTL_SECONDS", "600"))
+
+    # S3 multipart uploads; each upload buffers at most part size times concurrency bytes.
+    s3_part_size = int(os.getenv("S3_PART_SIZE", str(8 * 1024 * 1024)))
+    s3_upload_concurrency = int(os.getenv("S3_UPLOAD_CONCURRENCY", "4"))
+
+    # Maximum number of sentences synthesized and uploaded at once per image.
+    tts_concurrency = int(os.getenv("TTS_CONCURRENCY", "4"))
+
+    # In-process cache of content-addressed speech, in front of the table lookup.
+    tts_cache_size = int(os.getenv("TTS_CACHE_SIZE", "10000"))
+    tts_cache_ttl = float(os.getenv("TTS_CACHE_TTL_SECONDS", "86400"))
+
 
 settings = Settings()
@@ -1,46 +1,125 @@
-"""Socket part."""
+"""Defines the Socket.IO server which pushes notifications to users.
+
+A socket registers by sending the user's access token, and joins the room
+`user:<id>` of the user the token belongs to, so a notification reaches each
+of the user's devices and nobody else's, and Socket.IO drops the socket from its
+rooms when it disconnects. The rooms are kept by the server's client manager,
+chosen by `SOCKETIO_MANAGER_URL`:
+
+- unset: rooms live in this process, which is enough for a single worker.
+- `redis://host:6379/0`: processes share rooms through Redis pub/sub, so a
+  notification emitted by any API or translation worker reaches the user
+  whichever process their socket is connected to.
+- `fakeredis://`: the same pub/sub manager on an in-memory fake, shared by
+  the servers of one process, for development and tests.
+"""
+
+import logging
+from typing import TYPE_CHECKING
 
 import socketio
 
+from linguaphoto.schemas.events import TranslationEvent
 from linguaphoto.settings import settings
+from linguaphoto.utils.auth import decode_access_token
+
+if TYPE_CHECKING:
+    from fakeredis import FakeServer
+
+logger = logging.getLogger(__name__)
+
+FAKE_REDIS_SCHEME = "fakeredis://"
+
+
+def user_room(user_id: str) -> str:
+    return f"user:{user_id}"
+
+
+class FakeRedisManager(socketio.AsyncRedisManager):
+    """A Redis pub/sub manager backed by fakeredis, for running several servers in one process."""
+
+    # Shared by every manager in the process, so that they see each other's messages.
+    _server: "FakeServer | None" = None
+
+    def __init__(self, channel: str, write_only: bool = False) -> None:
+        super().__init__(url=FAKE_REDIS_SCHEME, channel=channel, write_only=write_only)
+
+    def _redis_connect(self) -> None:
+        # Development dependency, so it is only imported when asked for.
+        import fakeredis  # noqa: PLC0415
+
+        if FakeRedisManager._server is None:
+            FakeRedisManager._server = fakeredis.FakeServer()
+        self.redis = fakeredis.FakeAsyncRedis(server=FakeRedisManager._server)
+        self.pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        self.connected = True
+
+
+def create_client_manager(url: str, channel: str, write_only: bool = False) -> socketio.AsyncManager:
+    """Creates the client manager which keeps the server's rooms.
+
+    Args:
+        url: A Redis URL to share rooms between processes, `fakeredis://` to
+            share them between the servers of this process, or an empty
+            string to keep them in this process.
+        channel: The pub/sub channel the servers talk on.
+        write_only: Whether the manager only emits, without listening for
+            events from other servers.
+
+    Returns:
+        The client manager to pass to `socketio.AsyncServer`.
+    """
+    if not url:
+        return socketio.AsyncManager()
+    if url.startswith(FAKE_REDIS_SCHEME):
+        return FakeRedisManager(channel, write_only=write_only)
+    return socketio.AsyncRedisManager(url, channel=channel, write_only=write_only)
+
 
-# Create a new Socket.IO server with CORS enabled
-sio = socketio.AsyncServer(
-    async_mode="asgi",
-    cors_allowed_origins=[settings.homepage_url],  # Update this to match your frontend URL
-)
-# Dictionary to store connected users by their socket ID
-connected_users: dict[str, str] = {}
+class NotificationNamespace(socketio.AsyncNamespace):
+    async def on_connect(self, sid: str, environ: dict) -> None:
+        logger.debug("Socket %s connected", sid)
 
+    async def on_disconnect(self, sid: str, reason: str | None = None) -> None:
+        # The server removes the socket from its rooms, so there is nothing to clean up.
+        logger.debug("Socket %s disconnected (%s)", sid, reason)
 
-# Handle client connection
-@sio.event
-async def connect(sid: str, environ: dict) -> None:
-    print(f"User connected: {sid}")
+    async def on_register_user(self, sid: str, token: str) -> bool:
+        """Joins the socket to the room of the token's user, returning whether the token was valid."""
+        # The room is taken from the token, never from the client, since it receives the user's media URLs.
+        user_id = decode_access_token(token) if isinstance(token, str) else None
+        if user_id is None:
+            logger.warning("Socket %s sent an invalid token", sid)
+            return False
+        await self.enter_room(sid, user_room(user_id))
+        logger.debug("Socket %s registered for user %s", sid, user_id)
+        return True
 
 
-# Handle client disconnection
-@sio.event
-async def disconnect(sid: str) -> None:
-    if sid in connected_users:
-        print(f"User {connected_users[sid]} disconnected")
-        del connected_users[sid]
+def create_server(client_manager: socketio.AsyncManager | None = None) -> socketio.AsyncServer:
+    """Creates a Socket.IO server which handles the notification events.
 
+    Args:
+        client_manager: The manager keeping the server's rooms, by default
+            the one configured in the settings.
 
-# Event for registering a specific user (e.g., after authentication)
-@sio.event
-async def register_user(sid: str, user_id: str) -> None:
-    connected_users[user_id] = sid
-    print(f"User {user_id} registered with session ID {sid}")
+    Returns:
+        The server, to be wrapped in `socketio.ASGIApp`.
+    """
+    if client_manager is None:
+        client_manager = create_client_manager(settings.socketio_manager_url, settings.socketio_channel)
+    server = socketio.AsyncServer(
+        async_mode="asgi",
+        cors_allowed_origins=[settings.homepage_url],
+        client_manager=client_manager,
+    )
+    server.register_namespace(NotificationNamespace("/"))
+    return server
 
 
-# Event to notify a specific user
-async def notify_user(user_id: str, message: dict) -> None:
-    sid = connected_users.get(user_id)
-    if sid:
-        await sio.emit("notification", message, room=sid)
-    else:
-        print(f"User {user_id} is not connected")
+sio = create_server()
 
 
-# Export the `sio` instance so it can be used in other files
+async def notify_user(user_id: str, event: TranslationEvent) -> None:
+    """Sends an event to every socket the user registered, on any worker."""
+    await sio.emit(event.name, event.model_dump(), room=user_room(user_id))
@@ -9,6 +9,12 @@ Functions:
 
 OAuth2PasswordBearer:
 - An instance of OAuth2PasswordBearer for token-based authentication, used as a dependency in FastAPI endpoints.
+
+Callers are resolved to a `Principal` once per request (FastAPI caches
+dependency results per request), backed by bounded TTL caches across
+requests: `api_key_cache` for API keys and `subscription_cache` for JWT
+users. Hot routes therefore do not pay a DynamoDB read just to check the
+subscription flag.
 """
 
 from datetime import datetime, timedelta
@@ -19,6 +25,8 @@ from fastapi import Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
 
 from linguaphoto.crud.user import UserCrud
+from linguaphoto.schemas.user import Principal
+from linguaphoto.utils.cache import api_key_cache, subscription_cache
 
 SECRET_KEY = "your_secret_key"
 ALGORITHM = "HS256"
@@ -45,6 +53,7 @@ def decode_access_token(token: str) -> Union[str, None]:
 
 
 oauth2_schema = OAuth2PasswordBearer(tokenUrl="token")
+optional_oauth2_schema = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
 
 
 # Dependency to decode token and return user_id
@@ -55,34 +64,53 @@ async def get_current_user_id(token: str = Depends(oauth2_schema)) -> str:
     return user_id
 
 
-# Dependency to get token and compare with api_key
-async def get_current_user_id_by_api_key(api_key: str = Depends(oauth2_schema), user_crud: UserCrud = Depends()) -> str:
-    async with user_crud:
-        user = await user_crud.get_user_by_api_key(api_key)
-        if user is None:
-            raise HTTPException(status_code=422, detail="Could not validate credentials")
-        return user.id
+# Dependency to identify the caller on routes which anonymous visitors may also use.
+async def get_optional_user_id(token: str | None = Depends(optional_oauth2_schema)) -> str | None:
+    return decode_access_token(token) if token else None
 
 
-async def subscription_validate(token: str = Depends(oauth2_schema), user_crud: UserCrud = Depends()) -> bool:
-    user_id = decode_access_token(token)
-    if user_id is None:
+# Dependency to resolve the JWT's user to a principal.
+async def get_current_principal(
+    user_id: str = Depends(get_current_user_id), user_crud: UserCrud = Depends()
+) -> Principal:
+    principal = subscription_cache.get(user_id)
+    if principal is not None:
+        return principal
+    async with user_crud:
+        user = await user_crud.get_user(user_id)
+    if user is None:
         raise HTTPException(status_code=422, detail="Could not validate credentials")
+    principal = Principal(user_id=user.id, is_subscription=user.is_subscription)
+    subscription_cache.set(user_id, principal)
+    return principal
+
+
+# Dependency to resolve an api_key to the principal which owns it.
+async def get_api_key_principal(api_key: str = Depends(oauth2_schema), user_crud: UserCrud = Depends()) -> Principal:
+    principal = api_key_cache.get(api_key)
+    if principal is not None:
+        return principal
     async with user_crud:
-        user = await user_crud.get_user(user_id, True)
+        user = await user_crud.get_user_by_api_key(api_key)
     if user is None:
         raise HTTPException(status_code=422, detail="Could not validate credentials")
-    if user.is_subscription is False:
+    principal = Principal(user_id=user.id, is_subscription=user.is_subscription)
+    api_key_cache.set(api_key, principal)
+    return principal
+
+
+# Dependency to get token and compare with api_key
+async def get_current_user_id_by_api_key(principal: Principal = Depends(get_api_key_principal)) -> str:
+    return principal.user_id
+
+
+async def subscription_validate(principal: Principal = Depends(get_current_principal)) -> bool:
+    if principal.is_subscription is False:
         raise HTTPException(status_code=422, detail="You need to subscribe.")
     return True
 
 
-async def subscription_validate_by_api_key(
-    api_key: str = Depends(oauth2_schema), user_crud: UserCrud = Depends()
-) -> bool:
-    user = await user_crud.get_user_by_api_key(api_key)
-    if user is None:
-        raise HTTPException(status_code=422, detail="Could not validate credentials")
-    if user.is_subscription is False:
+async def subscription_validate_by_api_key(principal: Principal = Depends(get_api_key_principal)) -> bool:
+    if principal.is_subscription is False:
         raise HTTPException(status_code=422, detail="You need to subscribe.")
     return True
@@ -0,0 +1,111 @@
+"""Defines small in-process caches used on hot request paths.
+
+The caches are plain module-level objects so that both the code reading
+them (for example `linguaphoto.utils.auth`) and the CRUD code invalidating
+them can import them without an import cycle.
+"""
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Generic, Hashable, TypeVar
+
+from linguaphoto.schemas.user import Principal
+from linguaphoto.settings import settings
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class TTLCache(Generic[K, V]):
+    """A bounded LRU cache whose entries expire after a fixed time-to-live.
+
+    The cache is only used from the event loop thread, so it does no locking.
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[K, tuple[float, V]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: K) -> V | None:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: K, value: V) -> None:
+        if self.maxsize <= 0:
+            return
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: K) -> None:
+        self._data.pop(key, None)
+
+    def pop_where(self, predicate: Callable[[V], bool]) -> None:
+        """Removes every entry whose value matches the predicate."""
+        for key in [k for k, (_, v) in self._data.items() if predicate(v)]:
+            del self._data[key]
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
+@dataclass
+class CacheStats:
+    """Lookup counters for a cache with an in-process tier in front of a shared store."""
+
+    memory_hits: int = 0
+    store_hits: int = 0
+    misses: int = 0
+
+    @property
+    def lookups(self) -> int:
+        return self.memory_hits + self.store_hits + self.misses
+
+    @property
+    def hit_rate(self) -> float:
+        return (self.memory_hits + self.store_hits) / self.lookups if self.lookups else 0.0
+
+
+@dataclass
+class DedupStats:
+    """Counters for uploads which matched the content of an earlier upload.
+
+    `hits` counts uploads which reused the earlier S3 object, saving
+    `bytes_saved`, and `transcription_hits` those which copied its
+    transcriptions, saving `tokens_saved`. An upload can do either or both.
+    """
+
+    hits: int = 0
+    bytes_saved: int = 0
+    transcription_hits: int = 0
+    tokens_saved: int = 0
+
+
+# Maps an API key to the principal which owns it; see `Settings.api_key_cache_ttl`.
+api_key_cache: TTLCache[str, Principal] = TTLCache(settings.auth_cache_size, settings.api_key_cache_ttl)
+
+# Maps a user ID to its principal. The TTL is short because this is what gates
+# subscriber-only routes; `UserCrud.update_user` also invalidates it directly.
+subscription_cache: TTLCache[str, Principal] = TTLCache(settings.auth_cache_size, settings.subscription_cache_ttl)
+
+# Maps the content address of synthesized speech to its unsigned URL.
+audio_cache: TTLCache[str, str] = TTLCache(settings.tts_cache_size, settings.tts_cache_ttl)
+audio_cache_stats = CacheStats()
+
+upload_dedup_stats = DedupStats()
+
+# Recently uploaded images, by image ID, for translation workers in the same process.
+recent_uploads: TTLCache[str, bytes] = TTLCache(settings.upload_handoff_size, settings.upload_handoff_ttl)
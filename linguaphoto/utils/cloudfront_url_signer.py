@@ -1,14 +1,42 @@
 """This module provides a class to generate signed URLs for AWS CloudFront using RSA keys.
 
 The `CloudFrontUrlSigner` class allows you to create and sign CloudFront URLs with optional custom policies.
+The application shares a single signer, returned by `get_url_signer`, which parses the private key once
+and signs batches of URLs off the event loop, on the CPU pool from `linguaphoto.utils.executors`.
+
+When `settings.media_signed_cookies` is enabled, media is stored under a per-user prefix and returned as
+plain, CDN-cacheable URLs. Access is instead granted by CloudFront signed cookies carrying a wildcard
+policy for the user's prefix, so there is one signature per session rather than one per object. Media
+the viewer's cookies do not cover, such as images in other users' published collections, is signed
+when it is read, by `sign_for_viewer`.
 """
 
+import base64
 import json
+import math
+import os
+import time
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Any, Dict, Optional
 
 import rsa
-from botocore.signers import CloudFrontSigner
+
+from linguaphoto.settings import settings
+from linguaphoto.utils.cache import TTLCache
+from linguaphoto.utils.executors import run_cpu_bound
+
+
+@lru_cache(maxsize=None)
+def _load_private_key(private_key_path: str) -> rsa.PrivateKey:
+    with open(private_key_path, "rb") as key_file:
+        return rsa.PrivateKey.load_pkcs1(key_file.read())
+
+
+def _rsa_sign_many(private_key_path: str, messages: list[bytes]) -> list[bytes]:
+    # Runs on the CPU pool, which may be another process, so the key is loaded there by path.
+    private_key = _load_private_key(private_key_path)
+    return [rsa.sign(message, private_key, "SHA-1") for message in messages]
 
 
 class CloudFrontUrlSigner:
@@ -22,30 +50,18 @@ class CloudFrontUrlSigner:
         """
         self.key_id = key_id
         self.private_key_path = private_key_path
-        self.cf_signer = CloudFrontSigner(key_id, self._rsa_signer)
-
-    def _rsa_signer(self, message: bytes) -> bytes:
-        """RSA signer function that signs a message using the private key.
-
-        :param message: The message to be signed.
-        :return: The RSA signature of the message as bytes.
-        """
-        with open(self.private_key_path, "r") as key_file:
-            private_key = key_file.read()
-        return rsa.sign(
-            message,  # Ensure message is in bytes
-            rsa.PrivateKey.load_pkcs1(private_key.encode("utf8")),
-            "SHA-1",  # CloudFront requires SHA-1 hash
+        # Fails fast on a missing or malformed key; the signing workers load their own cached copy.
+        _load_private_key(private_key_path)
+        # Signed URLs are deterministic for a given resource and expiry, so
+        # expiries are rounded up to a bucket and the results are reused.
+        self._signed_urls: TTLCache[tuple[str, int], str] = TTLCache(
+            settings.url_signer_cache_size,
+            settings.url_signer_expiry_bucket_seconds,
+        )
+        self._signed_cookies: TTLCache[tuple[str, int], dict[str, str]] = TTLCache(
+            settings.url_signer_cache_size,
+            settings.url_signer_expiry_bucket_seconds,
         )
-
-    def generate_presigned_url(self, url: str, policy: Optional[str] = None) -> str:
-        """Generate a presigned URL for CloudFront using an optional custom policy.
-
-        :param url: The URL to sign.
-        :param policy: (Optional) A custom policy for the URL.
-        :return: The signed URL.
-        """
-        return self.cf_signer.generate_presigned_url(url, policy=policy)
 
     def create_custom_policy(self, url: str, expire_days: int = 1, ip_range: Optional[str] = None) -> str:
         """Create a custom policy for CloudFront signed URLs.
@@ -56,6 +72,9 @@ class CloudFrontUrlSigner:
         :return: The custom policy in JSON format.
         """
         expiration_time = int((datetime.utcnow() + timedelta(days=expire_days)).timestamp())
+        return self._create_policy(url, expiration_time, ip_range)
+
+    def _create_policy(self, url: str, expiration_time: int, ip_range: Optional[str] = None) -> str:
         policy: Dict[str, Any] = {
             "Statement": [
                 {
@@ -71,13 +90,110 @@ class CloudFrontUrlSigner:
 
         return json.dumps(policy, separators=(",", ":"))  # Minified JSON
 
+    def _bucketed_expiry(self, expire_days: int) -> int:
+        bucket = settings.url_signer_expiry_bucket_seconds
+        return int(math.ceil((time.time() + expire_days * 86400) / bucket) * bucket)
+
+    async def sign_many(self, urls: list[str], expire_days: int = 1) -> list[str]:
+        """Signs a batch of URLs, computing the missing signatures on the CPU pool.
+
+        :param urls: The URLs to sign.
+        :param expire_days: Minimum number of days the signatures stay valid.
+        :return: The signed URLs, in the same order as `urls`.
+        """
+        expiration_time = self._bucketed_expiry(expire_days)
+        signed_urls: dict[str, str] = {}
+        missing: list[str] = []
+        for url in urls:
+            signed_url = self._signed_urls.get((url, expiration_time))
+            if signed_url is not None:
+                signed_urls[url] = signed_url
+            elif url not in missing:
+                missing.append(url)
+        if missing:
+            policies = [self._create_policy(url, expiration_time).encode("utf-8") for url in missing]
+            signatures = await run_cpu_bound(_rsa_sign_many, self.private_key_path, policies)
+            for url, policy, signature in zip(missing, policies, signatures):
+                signed_urls[url] = self._build_signed_url(url, policy, signature)
+                self._signed_urls.set((url, expiration_time), signed_urls[url])
+        return [signed_urls[url] for url in urls]
+
+    def _build_signed_url(self, url: str, policy: bytes, signature: bytes) -> str:
+        # The same format as botocore's `CloudFrontSigner.generate_presigned_url` with a custom policy.
+        params = [
+            f"Policy={_url_b64encode(policy)}",
+            f"Signature={_url_b64encode(signature)}",
+            f"Key-Pair-Id={self.key_id}",
+        ]
+        return url + ("&" if "?" in url else "?") + "&".join(params)
+
+    async def sign_cookies(self, resource: str, expire_days: int = 1) -> dict[str, str]:
+        """Create CloudFront signed cookies granting access to a resource, signing on the CPU pool.
+
+        :param resource: The resource to grant access to; may end in a `*` wildcard.
+        :param expire_days: Minimum number of days the cookies stay valid.
+        :return: The cookie names mapped to their values.
+        """
+        expiration_time = self._bucketed_expiry(expire_days)
+        cookies = self._signed_cookies.get((resource, expiration_time))
+        if cookies is None:
+            policy = self._create_policy(resource, expiration_time).encode("utf-8")
+            [signature] = await run_cpu_bound(_rsa_sign_many, self.private_key_path, [policy])
+            cookies = self._build_cookies(policy, signature)
+            self._signed_cookies.set((resource, expiration_time), cookies)
+        return cookies
+
+    def _build_cookies(self, policy: bytes, signature: bytes) -> dict[str, str]:
+        return {
+            "CloudFront-Policy": _url_b64encode(policy),
+            "CloudFront-Signature": _url_b64encode(signature),
+            "CloudFront-Key-Pair-Id": self.key_id,
+        }
+
+
+def _url_b64encode(data: bytes) -> str:
+    # CloudFront's URL-safe variant of base64.
+    return base64.b64encode(data).decode("ascii").replace("+", "-").replace("=", "_").replace("/", "~")
+
+
+def get_media_prefix(user_id: str) -> str:
+    """Returns the media path prefix holding a user's files in signed-cookie mode."""
+    return f"users/{user_id}"
+
+
+def covered_by_cookies(url: str, user_id: str | None) -> bool:
+    """Returns whether the user's signed cookies grant access to a plain media URL."""
+    return user_id is not None and url.startswith(f"{settings.media_hosting_server}/{get_media_prefix(user_id)}/")
+
+
+async def sign_for_viewer(urls: list[str], viewer_id: str | None) -> list[str]:
+    """Signs the media URLs which the viewer's signed cookies do not cover, in signed-cookie mode.
+
+    Args:
+        urls: The URLs as they are stored; ones which are already signed, or
+            are not media, are returned as they are.
+        viewer_id: The signed-in user, or None for anonymous visitors, whose
+            cookies cover nothing.
+
+    Returns:
+        The URLs to send to the viewer, in the same order as `urls`.
+    """
+    if not settings.media_signed_cookies:
+        return urls
+    uncovered = [
+        url
+        for url in urls
+        if url.startswith(f"{settings.media_hosting_server}/")
+        and "?" not in url
+        and not covered_by_cookies(url, viewer_id)
+    ]
+    if not uncovered:
+        return urls
+    signed = dict(zip(uncovered, await get_url_signer().sign_many(uncovered)))
+    return [signed.get(url, url) for url in urls]
 
-# Example usage:
-# key_id = 'your_cloudfront_key_id'
-# private_key_path = 'path/to/your/private_key.pem'
-# url = 'https://your-distribution.cloudfront.net/your-file'
-# my_policy = None  # Replace with your custom policy if needed
 
-# signer = CloudFrontUrlSigner(key_id, private_key_path)
-# signed_url = signer.generate_presigned_url(url, policy=my_policy)
-# print(signed_url)
+@lru_cache(maxsize=None)
+def get_url_signer() -> CloudFrontUrlSigner:
+    """Returns the process-wide signer, loading the private key on first use."""
+    return CloudFrontUrlSigner(str(settings.key_pair_id), os.path.abspath(settings.private_key_path))
@@ -0,0 +1,67 @@
+"""Defines the shared executors which keep CPU-bound work off the event loop.
+
+There are two pools:
+
+- `run_in_thread` uses a thread pool, for work which releases the GIL while
+  it runs, such as bcrypt hashing and PIL decoding, resizing and encoding.
+- `run_cpu_bound` is for pure-Python work, such as RSA signing, which holds
+  the GIL. With `CPU_EXECUTOR=process` it runs on a process pool, so it
+  cannot slow down the event loop's thread; the function and its arguments
+  must then be picklable. Otherwise it shares the thread pool.
+
+The pools are created on first use and shut down with the app.
+"""
+
+import asyncio
+import functools
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, ParamSpec, TypeVar
+
+from linguaphoto.settings import settings
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+_thread_pool: ThreadPoolExecutor | None = None
+_process_pool: ProcessPoolExecutor | None = None
+
+
+def get_thread_pool() -> ThreadPoolExecutor:
+    global _thread_pool
+    if _thread_pool is None:
+        _thread_pool = ThreadPoolExecutor(max_workers=settings.executor_threads, thread_name_prefix="cpu")
+    return _thread_pool
+
+
+def get_cpu_pool() -> Executor:
+    global _process_pool
+    if settings.cpu_executor != "process":
+        return get_thread_pool()
+    if _process_pool is None:
+        # Forking a process which is running an event loop and threads is unsafe, so workers are spawned.
+        _process_pool = ProcessPoolExecutor(
+            max_workers=settings.cpu_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _process_pool
+
+
+async def run_in_thread(func: Callable[P, R], *args: P.args, **kwargs: P.kwargs) -> R:
+    """Runs a function which releases the GIL on the shared thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_thread_pool(), functools.partial(func, *args, **kwargs))
+
+
+async def run_cpu_bound(func: Callable[P, R], *args: P.args, **kwargs: P.kwargs) -> R:
+    """Runs a pure-Python, CPU-bound function on the CPU pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_cpu_pool(), functools.partial(func, *args, **kwargs))
+
+
+def shutdown_executors() -> None:
+    global _thread_pool, _process_pool
+    for pool in (_thread_pool, _process_pool):
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+    _thread_pool = _process_pool = None
@@ -0,0 +1,120 @@
+"""Defines an incremental parser for the elements of a JSON array inside a streamed object.
+
+Language models write JSON a few characters at a time. Rather than waiting
+for the whole document, `ArrayElementParser` scans the text as it arrives
+and returns each object in the array under a given key as soon as its
+closing brace is written, so the caller can start working on the first
+element while the rest is still being generated. Elements which are not
+valid JSON are skipped instead of failing the whole document, and an
+element cut off at the end of the stream, such as when the model hits its
+token limit, is repaired where possible.
+"""
+
+import json
+import logging
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+class ArrayElementParser:
+    """Yields the objects of the array under `key` in the top-level object of a streamed JSON document.
+
+    Feed the text with `feed` as it arrives, then call `close` at the end of
+    the stream to get the repaired last element, if it was cut off. Text
+    outside the top-level object, such as a Markdown code fence, is ignored.
+    """
+
+    def __init__(self, key: str) -> None:
+        self.key = key
+        self.skipped = 0
+        self._stack: list[str] = []
+        self._in_string = False
+        self._escaped = False
+        # The last string closed directly in the top-level object, i.e. the key of the next value.
+        self._last_key: list[str] = []
+        self._string: list[str] | None = None
+        # The depth of the elements of the array under `key`, once it has been opened.
+        self._array_depth: int | None = None
+        self._element: list[str] = []
+        # Where the commas between the element's own fields are, for cutting off broken fields.
+        self._commas: list[int] = []
+
+    def feed(self, text: str) -> list[dict[str, Any]]:
+        """Parses the next piece of the document, returning the elements it completes."""
+        complete: list[dict[str, Any]] = []
+        for char in text:
+            if self._element:
+                self._element.append(char)
+            if self._in_string:
+                if self._string is not None:
+                    self._string.append(char)
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._string is not None:
+                        self._last_key = self._string[:-1]
+                        self._string = None
+                continue
+            if char == '"':
+                self._in_string = True
+                if len(self._stack) == 1:
+                    self._string = []
+            elif char in _CLOSERS:
+                if char == "{" and self._array_depth is not None and len(self._stack) == self._array_depth:
+                    self._element = [char]
+                    self._commas = []
+                elif char == "[" and len(self._stack) == 1 and "".join(self._last_key) == self.key:
+                    self._array_depth = 2
+                self._stack.append(char)
+            elif char in "}]":
+                if self._stack:
+                    self._stack.pop()
+                if self._element and len(self._stack) == self._array_depth:
+                    element = self._decode("".join(self._element))
+                    if element is not None:
+                        complete.append(element)
+                    self._element = []
+                elif self._array_depth is not None and len(self._stack) < self._array_depth:
+                    # The array is closed; anything after it belongs to other keys.
+                    self._array_depth = None
+            elif char == "," and self._element and self._array_depth is not None:
+                if len(self._stack) == self._array_depth + 1:
+                    self._commas.append(len(self._element) - 1)
+        return complete
+
+    def close(self) -> list[dict[str, Any]]:
+        """Ends the document, returning the element it was cut off in, repaired, if it can be."""
+        if not self._element or self._array_depth is None:
+            return []
+        text = "".join(self._element)
+        self._element = []
+        closers = "".join(_CLOSERS[opener] for opener in reversed(self._stack[self._array_depth :]))
+        candidates = []
+        if not self._in_string:
+            candidates.append(text + closers)
+        # Otherwise drop the fields from the one which was being written, closing the element before it.
+        candidates.extend(text[:comma] + "}" for comma in reversed(self._commas))
+        for candidate in candidates:
+            try:
+                element = json.loads(candidate)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(element, dict):
+                return [element]
+        self.skipped += 1
+        return []
+
+    def _decode(self, text: str) -> dict[str, Any] | None:
+        try:
+            element = json.loads(text)
+        except json.JSONDecodeError:
+            logger.warning("Skipping malformed element of %r: %.200s", self.key, text)
+            self.skipped += 1
+            return None
+        return element if isinstance(element, dict) else None
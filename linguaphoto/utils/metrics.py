@@ -0,0 +1,153 @@
+"""Defines the process metrics exported in the Prometheus text format at `/metrics`.
+
+The metrics live in their own `prometheus_client` registry, so the export
+holds only the app's series. Labelled series are created on first use and
+kept for the life of the process, so label values must come from a small,
+fixed set (route templates, operation names), never from user input.
+"""
+
+import functools
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Iterator, ParamSpec, TypeVar
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+SLOW_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+UNMATCHED_ROUTE = "unmatched"
+
+registry = CollectorRegistry()
+
+
+def render() -> bytes:
+    """Returns every metric in the Prometheus text exposition format."""
+    return generate_latest(registry)
+
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds",
+    "Time spent handling HTTP requests, by route template.",
+    ("method", "route"),
+    registry=registry,
+)
+http_requests = Counter(
+    "http_requests",
+    "HTTP requests handled, by route template and status.",
+    ("method", "route", "status"),
+    registry=registry,
+)
+crud_operation_duration = Histogram(
+    "crud_operation_duration_seconds",
+    "Time spent in each BaseCrud operation.",
+    ("operation",),
+    registry=registry,
+)
+crud_operation_errors = Counter(
+    "crud_operation_errors", "BaseCrud operations which raised.", ("operation",), registry=registry
+)
+aws_requests = Counter(
+    "aws_requests", "AWS API calls, by service and operation.", ("service", "operation"), registry=registry
+)
+aws_request_errors = Counter(
+    "aws_request_errors", "AWS API calls which returned an error.", ("service", "operation"), registry=registry
+)
+aws_request_retries = Counter(
+    "aws_request_retries", "Retries made by the AWS clients.", ("service", "operation"), registry=registry
+)
+dynamodb_consumed_capacity = Counter(
+    "dynamodb_consumed_capacity_units",
+    "Capacity units DynamoDB reported consuming, by operation.",
+    ("operation",),
+    registry=registry,
+)
+openai_request_duration = Histogram(
+    "openai_request_duration_seconds",
+    "Time until OpenAI responded, including the client's retries.",
+    ("operation",),
+    buckets=SLOW_BUCKETS,
+    registry=registry,
+)
+openai_request_errors = Counter(
+    "openai_request_errors", "OpenAI requests which failed.", ("operation",), registry=registry
+)
+translation_queue_depth = Gauge(
+    "translation_queue_depth", "Translation jobs waiting for a worker in this process.", registry=registry
+)
+translation_jobs_in_flight = Gauge(
+    "translation_jobs_in_flight", "Translation jobs running in this process.", registry=registry
+)
+
+
+@contextmanager
+def timed(duration: Histogram, errors: Counter | None = None) -> Iterator[None]:
+    """Observes how long the block takes, counting it as an error if it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        if errors is not None:
+            errors.inc()
+        raise
+    finally:
+        duration.observe(time.perf_counter() - start)
+
+
+def track_operation(func: Callable[P, Awaitable[R]]) -> Callable[P, Awaitable[R]]:
+    """Records the latency and errors of a CRUD coroutine under its name, without the leading underscore."""
+    operation = func.__name__.lstrip("_")
+    # The series are looked up once here rather than on every call.
+    duration = crud_operation_duration.labels(operation)
+    errors = crud_operation_errors.labels(operation)
+
+    @functools.wraps(func)
+    async def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+        start = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        except BaseException:
+            errors.inc()
+            raise
+        finally:
+            duration.observe(time.perf_counter() - start)
+
+    return wrapper
+
+
+def route_template(scope: Scope) -> str:
+    """Returns the path template of the route a request matched, such as `/collection/get`."""
+    # FastAPI copies the routes of included routers with their prefixes, except in releases which route
+    # through the included routers instead and keep the prefixed route as the effective route context.
+    route = scope.get("fastapi", {}).get("effective_route_context") or scope.get("route")
+    return getattr(route, "path", UNMATCHED_ROUTE)
+
+
+class MetricsMiddleware:
+    """Records the latency and status of every HTTP request under the template of the route it matched."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = route_template(scope)
+            http_request_duration.labels(scope["method"], route).observe(time.perf_counter() - start)
+            http_requests.labels(scope["method"], route, status).inc()
@@ -0,0 +1,32 @@
+"""Defines helpers for measuring how long each stage of a pipeline takes."""
+
+import math
+import time
+from contextlib import contextmanager
+from typing import Iterable, Iterator
+
+
+class StageTimer:
+    """Accumulates wall-clock time per named stage."""
+
+    def __init__(self) -> None:
+        self.durations: dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.durations[name] = self.durations.get(name, 0.0) + time.perf_counter() - start
+
+    def summary(self) -> str:
+        return " ".join(f"{name}={duration * 1000:.0f}ms" for name, duration in self.durations.items())
+
+
+def percentiles(values: Iterable[float], quantiles: Iterable[int] = (50, 95, 99)) -> dict[int, float]:
+    """Returns nearest-rank percentiles of the values, or zeros if there are none."""
+    ordered = sorted(values)
+    if not ordered:
+        return {q: 0.0 for q in quantiles}
+    return {q: ordered[max(math.ceil(q / 100 * len(ordered)) - 1, 0)] for q in quantiles}
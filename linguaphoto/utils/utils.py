@@ -2,6 +2,9 @@
 
 from linguaphoto.settings import settings
 
+# Response header carrying the cursor of the next page on paginated routes.
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
 LOCALHOST_URLS = [
     "http://127.0.0.1:3000",
     "http://localhost:3000",
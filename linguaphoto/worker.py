@@ -0,0 +1,259 @@
+"""Defines the translation job worker pool.
+
+Translation requests are persisted as `TranslationJob` rows and processed by
+a bounded pool of asyncio workers. The API process runs a pool by default;
+setting `TRANSLATION_WORKERS=0` makes the API only enqueue jobs, which are
+then processed by standalone workers:
+
+    python -m linguaphoto.worker
+
+Every pool also polls the table for due jobs, so jobs left behind by a
+crashed or restarted process are resumed once their lease expires.
+"""
+
+import argparse
+import asyncio
+import functools
+import logging
+import os
+import signal
+import socket
+import uuid
+
+from linguaphoto.ai.client import openai_pool
+from linguaphoto.crud.base import client_pool
+from linguaphoto.crud.image import ImageCrud
+from linguaphoto.crud.job import JobCrud
+from linguaphoto.errors import ItemNotFoundError
+from linguaphoto.models import TranslationJob
+from linguaphoto.schemas.events import TranslationFailed
+from linguaphoto.settings import settings
+from linguaphoto.socket_manager import notify_user
+from linguaphoto.utils.executors import shutdown_executors
+from linguaphoto.utils.metrics import translation_jobs_in_flight, translation_queue_depth
+
+logger = logging.getLogger(__name__)
+
+RETRY_BASE_DELAY_SECONDS = 5.0
+
+# Failures are stored by exception type only and users are sent one of these, since
+# exception messages may hold internal details such as table names or upstream responses.
+FAILURE_MESSAGES = {ItemNotFoundError.__name__: "The image no longer exists"}
+DEFAULT_FAILURE_MESSAGE = "The translation failed"
+
+
+def failure_message(error: str | None) -> str:
+    return FAILURE_MESSAGES.get(error or "", DEFAULT_FAILURE_MESSAGE)
+
+
+class TranslationWorkerPool:
+    def __init__(
+        self,
+        num_workers: int = settings.translation_workers,
+        queue_size: int = settings.translation_queue_size,
+        lease_seconds: int = settings.translation_lease_seconds,
+        max_attempts: int = settings.translation_max_attempts,
+        poll_seconds: float = settings.translation_poll_seconds,
+    ) -> None:
+        self.num_workers = num_workers
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.poll_seconds = poll_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._queue: asyncio.Queue[str] = asyncio.Queue(maxsize=queue_size)
+        self._queued: set[str] = set()
+        self._running: set[str] = set()
+        self._tasks: list[asyncio.Task] = []
+        self._accepting = False
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._running)
+
+    async def start(self) -> None:
+        if self._tasks or self.num_workers <= 0:
+            return
+        self._accepting = True
+        self._tasks = [asyncio.create_task(self._worker_loop()) for _ in range(self.num_workers)]
+        self._tasks.append(asyncio.create_task(self._poll_loop()))
+        logger.info("Started %d translation workers as %s", self.num_workers, self.worker_id)
+
+    async def enqueue(self, image_id: str, user_id: str) -> bool:
+        """Persists a translation job for the image and schedules it locally if possible.
+
+        Returns:
+            Whether a new job was queued; False if the image is already queued
+            or being translated by any worker.
+        """
+        async with JobCrud() as job_crud:
+            queued = await job_crud.enqueue_translation(image_id, user_id)
+        if queued:
+            self._submit(TranslationJob.get_id(image_id))
+        return queued
+
+    def _submit(self, job_id: str) -> None:
+        if not self._accepting or job_id in self._queued or job_id in self._running:
+            return
+        try:
+            self._queue.put_nowait(job_id)
+        except asyncio.QueueFull:
+            # The job is persisted, so the poller will pick it up once there is room.
+            return
+        self._queued.add(job_id)
+
+    async def _poll_loop(self) -> None:
+        while self._accepting:
+            try:
+                free_slots = self._queue.maxsize - self._queue.qsize()
+                if free_slots > 0:
+                    async with JobCrud() as job_crud:
+                        jobs = await job_crud.get_claimable_jobs(free_slots)
+                    for job in jobs:
+                        self._submit(job.id)
+            except Exception:
+                logger.exception("Failed to poll for translation jobs")
+            await asyncio.sleep(self.poll_seconds)
+
+    async def _worker_loop(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            self._queued.discard(job_id)
+            self._running.add(job_id)
+            try:
+                await self._run_job(job_id)
+            except Exception:
+                logger.exception("Translation job %s crashed", job_id)
+            finally:
+                self._running.discard(job_id)
+                self._queue.task_done()
+
+    async def _renew_lease(self, job_id: str, translation: asyncio.Task) -> None:
+        loop = asyncio.get_running_loop()
+        # The job was claimed just before this started.
+        expires_at = loop.time() + self.lease_seconds
+        delay = self.lease_seconds / 3
+        while True:
+            await asyncio.sleep(delay)
+            attempted_at = loop.time()
+            try:
+                async with JobCrud() as job_crud:
+                    renewed = await job_crud.renew_lease(job_id, self.worker_id, self.lease_seconds)
+            except Exception:
+                if loop.time() < expires_at:
+                    # Errors such as throttling are retried sooner, while the lease still holds.
+                    logger.exception("Failed to renew the lease on translation job %s, retrying", job_id)
+                    delay = min(self.lease_seconds / 10, expires_at - loop.time())
+                    continue
+                logger.exception("Could not renew the lease on translation job %s before it expired", job_id)
+                renewed = False
+            if not renewed:
+                # Another worker may own the job now, so this one must stop writing to the image.
+                logger.warning("Lost the lease on translation job %s, cancelling it", job_id)
+                translation.cancel()
+                return
+            expires_at = attempted_at + self.lease_seconds
+            delay = self.lease_seconds / 3
+
+    async def _translate(self, job: TranslationJob) -> None:
+        async with ImageCrud() as image_crud:
+            # The user is sent the transcription, each sentence's audio and the result as they are ready
+            await image_crud.translate(job.image, job.user, on_event=functools.partial(notify_user, job.user))
+
+    async def _run_job(self, job_id: str) -> None:
+        async with JobCrud() as job_crud:
+            job = await job_crud.claim_job(job_id, self.worker_id, self.lease_seconds, max_attempts=self.max_attempts)
+        if job is None:
+            return
+        if job.status == "failed":
+            logger.error("Translation job %s gave up after %d attempts", job_id, job.attempts)
+            await notify_user(
+                job.user, TranslationFailed(image_id=job.image, error=failure_message(job.error), retrying=False)
+            )
+            return
+
+        translation = asyncio.create_task(self._translate(job))
+        renew_task = asyncio.create_task(self._renew_lease(job_id, translation))
+        try:
+            await translation
+        except asyncio.CancelledError:
+            current_task = asyncio.current_task()
+            if current_task is None or not current_task.cancelling():
+                # Cancelled by `_renew_lease`; the job is left to whichever worker claims it next.
+                return
+            async with JobCrud() as job_crud:
+                await job_crud.release_job(job_id, self.worker_id)
+            raise
+        except Exception as e:
+            logger.exception("Translation job %s failed on attempt %d", job_id, job.attempts)
+            retry_delay: float | None = RETRY_BASE_DELAY_SECONDS * 2 ** (job.attempts - 1)
+            if isinstance(e, ItemNotFoundError) or job.attempts >= self.max_attempts:
+                retry_delay = None
+            error = type(e).__name__
+            async with JobCrud() as job_crud:
+                await job_crud.fail_job(job_id, self.worker_id, error, retry_delay)
+            await notify_user(
+                job.user,
+                TranslationFailed(image_id=job.image, error=failure_message(error), retrying=retry_delay is not None),
+            )
+            return
+        finally:
+            renew_task.cancel()
+
+        async with JobCrud() as job_crud:
+            await job_crud.complete_job(job_id, self.worker_id)
+
+    async def drain(self, timeout: float = settings.translation_drain_seconds) -> None:
+        """Stops taking new jobs and waits for in-flight ones to finish.
+
+        Jobs still running after `timeout` are cancelled and released back to
+        the queue; queued jobs which never started stay pending in the table.
+        """
+        if not self._tasks:
+            return
+        self._accepting = False
+        while not self._queue.empty():
+            self._queued.discard(self._queue.get_nowait())
+            self._queue.task_done()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self._running and loop.time() < deadline:
+            await asyncio.sleep(0.1)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("Stopped translation workers %s", self.worker_id)
+
+
+translation_pool = TranslationWorkerPool()
+translation_queue_depth.set_function(lambda: translation_pool.queue_depth)
+translation_jobs_in_flight.set_function(lambda: translation_pool.in_flight)
+
+
+async def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Runs translation workers outside of the API process.")
+    parser.add_argument("--workers", type=int, default=max(settings.translation_workers, 1))
+    args = parser.parse_args()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    pool = TranslationWorkerPool(num_workers=args.workers)
+    async with client_pool, openai_pool:
+        await pool.start()
+        await stop.wait()
+        await pool.drain()
+    shutdown_executors()
+
+
+if __name__ == "__main__":
+    # python -m linguaphoto.worker
+    asyncio.run(main())
@@ -0,0 +1,35 @@
+"""Benchmarks the per-request overhead of entering a CRUD context."""
+
+import time
+
+import pytest
+
+from linguaphoto.crud.base import client_pool
+from linguaphoto.crud.collection import CollectionCrud
+
+NUM_REQUESTS = 25
+
+
+async def _simulate_requests(collection_id: str) -> float:
+    start = time.perf_counter()
+    for _ in range(NUM_REQUESTS):
+        async with CollectionCrud() as crud:
+            await crud.get_collection(collection_id)
+    return (time.perf_counter() - start) / NUM_REQUESTS
+
+
+@pytest.mark.slow
+@pytest.mark.asyncio
+async def test_client_pool_overhead(aws_tables: str) -> None:
+    async with CollectionCrud() as crud:
+        collection = await crud.create_collection("user", "title", "description")
+
+    # Before: every request builds its own session and resources.
+    unpooled = await _simulate_requests(collection.id)
+
+    # After: requests borrow the process-wide resources.
+    async with client_pool:
+        pooled = await _simulate_requests(collection.id)
+
+    print(f"\nPer-request latency: unpooled={unpooled * 1000:.2f}ms pooled={pooled * 1000:.2f}ms")
+    assert pooled < unpooled
@@ -0,0 +1,297 @@
+"""Benchmarks the CRUD layer at realistic table sizes.
+
+Each operation runs sequentially for a number of rounds against a table
+seeded with users, collections and images, and is reported as ops/sec,
+latency percentiles and DynamoDB read units per call. Read units are
+estimated from the sizes of the items each call reads, following DynamoDB's
+rules for eventually consistent reads (0.5 units per 4 KB), because moto
+reports flat capacity regardless of the work done.
+
+The results are compared with the stored baseline for the backend, and the
+run fails if an operation reads noticeably more than before. After an
+intended change, store new baselines with `CRUD_BENCH_SAVE=1`.
+
+By default the table grows to 1k and then 10k items in moto. For larger
+tables, run against DynamoDB Local (the `dynamodb` service in
+docker-compose.yml):
+
+    CRUD_BENCH_ENDPOINT=http://localhost:8002 CRUD_BENCH_SIZES=10000,100000,1000000 \
+        pytest -s -m slow tests/benchmarks/test_crud_bench.py
+"""
+
+import json
+import math
+import os
+import re
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Generator
+
+import aioboto3
+import httpx
+import pytest
+from botocore.model import OperationModel
+from types_aiobotocore_dynamodb.client import DynamoDBClient
+
+from linguaphoto.crud.base import TABLE_NAME, BaseCrud
+from linguaphoto.db import Crud, create_tables
+from linguaphoto.models import Collection, Image, LinguaBaseModel, Transcription, User
+from linguaphoto.settings import settings
+from linguaphoto.utils.timing import percentiles
+
+SIZES = [int(size) for size in os.getenv("CRUD_BENCH_SIZES", "1000,10000").split(",")]
+ROUNDS = int(os.getenv("CRUD_BENCH_ROUNDS", "30"))
+ENDPOINT = os.getenv("CRUD_BENCH_ENDPOINT")
+SAVE_BASELINE = os.getenv("CRUD_BENCH_SAVE") == "1"
+BACKEND = "dynamodb-local" if ENDPOINT else "moto"
+BASELINE_PATH = Path(__file__).parent / "baselines" / f"crud-{BACKEND}.json"
+# Read units may drift slightly with generated IDs and timestamps.
+READ_UNIT_TOLERANCE = 1.1
+
+# One user in USER_EVERY items; each user has COLLECTIONS_PER_USER collections sharing the rest as images.
+USER_EVERY = 200
+COLLECTIONS_PER_USER = 4
+PUBLIC_COLLECTION_EVERY = 10
+
+
+def _value_size(value: dict[str, Any]) -> int:
+    """Returns the size DynamoDB bills for a typed attribute value."""
+    ((kind, data),) = value.items()
+    if kind == "S":
+        return len(data.encode("utf-8"))
+    if kind == "N":
+        return len(data.lstrip("-").replace(".", "")) // 2 + 1
+    if kind == "B":
+        return len(data)
+    if kind in ("BOOL", "NULL"):
+        return 1
+    if kind == "L":
+        return 3 + sum(_value_size(item) + 1 for item in data)
+    if kind == "M":
+        return 3 + sum(len(k.encode("utf-8")) + _value_size(v) + 1 for k, v in data.items())
+    return sum(len(str(item)) for item in data)
+
+
+def _item_size(item: dict[str, Any]) -> int:
+    return sum(len(name.encode("utf-8")) + _value_size(value) for name, value in item.items())
+
+
+def _read_units(size: int) -> float:
+    return max(math.ceil(size / 4096), 1) * 0.5
+
+
+class CapacityMeter:
+    """Counts DynamoDB calls and the read units they would consume.
+
+    A filtered query is billed for every item it evaluates, but moto does not
+    report which those were, so filtered queries are replayed without their
+    filter on a separate client to find them.
+    """
+
+    def __init__(self, client: DynamoDBClient) -> None:
+        self.calls: Counter[str] = Counter()
+        self.read_units = 0.0
+        self._client = client
+
+    def reset(self) -> None:
+        self.calls.clear()
+        self.read_units = 0.0
+
+    async def _evaluated_items(self, request: dict[str, Any]) -> list[dict[str, Any]]:
+        params = {k: v for k, v in request.items() if k not in ("FilterExpression", "ReturnConsumedCapacity")}
+        # The names and values only the filter used are rejected as unused once it is removed.
+        referenced = set(re.findall(r"[#:]\w+", params.get("KeyConditionExpression", "")))
+        for key in ("ExpressionAttributeNames", "ExpressionAttributeValues"):
+            if key in params:
+                params[key] = {k: v for k, v in params[key].items() if k in referenced} or None
+                if params[key] is None:
+                    del params[key]
+        response = await getattr(self._client, "query" if "KeyConditionExpression" in params else "scan")(**params)
+        return response["Items"]
+
+    async def before_call(
+        self, params: dict[str, Any], model: OperationModel, context: dict[str, Any], **kwargs: object
+    ) -> None:
+        if model.name in ("Query", "Scan"):
+            context["capacity_meter_request"] = json.loads(params["body"])
+
+    async def after_call(
+        self, parsed: dict[str, Any], model: OperationModel, context: dict[str, Any], **kwargs: object
+    ) -> None:
+        self.calls[model.name] += 1
+        if model.name == "GetItem":
+            self.read_units += _read_units(_item_size(parsed.get("Item", {})))
+        elif model.name in ("Query", "Scan"):
+            request = context.get("capacity_meter_request", {})
+            items = parsed.get("Items", [])
+            if "FilterExpression" in request:
+                items = await self._evaluated_items(request)
+            # A query is billed on the total size of the items it reads, not per item.
+            self.read_units += _read_units(sum(_item_size(item) for item in items))
+        elif model.name == "BatchGetItem":
+            for items in parsed.get("Responses", {}).values():
+                self.read_units += sum(_read_units(_item_size(item)) for item in items)
+
+    def attach(self, crud: BaseCrud) -> None:
+        # Registered first, so they see the typed response before the resource layer deserializes it.
+        # The handlers are coroutines, which aiobotocore's event emitter awaits.
+        events = crud.db.meta.client.meta.events
+        events.register_first(
+            "before-call.dynamodb", self.before_call, unique_id="capacity-meter-request"  # type: ignore[arg-type]
+        )
+        events.register_first(
+            "after-call.dynamodb", self.after_call, unique_id="capacity-meter-response"  # type: ignore[arg-type]
+        )
+
+
+def _row(item: LinguaBaseModel) -> dict[str, Any]:
+    row = {k: v for k, v in item.model_dump().items() if v is not None and v != ""}
+    row["type"] = item.__class__.__name__
+    return row
+
+
+class Fixture:
+    """The seeded table and the entities the benchmarks look up."""
+
+    def __init__(self) -> None:
+        self.size = 0
+        self.user: User | None = None
+        self.collection: Collection | None = None
+        self.image_ids: list[str] = []
+
+    def _user(self, i: int) -> User:
+        # The password hash is a placeholder; hashing a million passwords would dominate seeding.
+        return User(
+            id=str(uuid.uuid4()),
+            username=f"user{i}",
+            email=f"user{i}@example.com",
+            password_hash="x" * 60,
+            is_subscription=i % 3 == 0,
+            api_key=str(uuid.uuid4()),
+        )
+
+    def _image(self, user: User, collection: Collection, i: int) -> Image:
+        image = Image.create(f"https://media.example.com/{uuid.uuid4()}.jpg", user.id, collection.id, f"{i:064x}")
+        if i % 2 == 0:
+            sentence = Transcription(
+                text="这是一句话。", pinyin="zhè shì yī jù huà.", translation="A sentence.", audio_url=""
+            )
+            image.is_translated = True
+            image.transcriptions = [sentence] * 3
+        return image
+
+    async def grow(self, crud: Crud, size: int) -> None:
+        """Adds users, each with collections of images, until the table holds `size` items."""
+        table = await crud.db.Table(TABLE_NAME)
+        async with table.batch_writer() as batch:
+            while self.size < size:
+                user = self._user(self.size)
+                await batch.put_item(Item=_row(user))
+                collections = [Collection.create(f"Book {j}", "Seeded", user.id) for j in range(COLLECTIONS_PER_USER)]
+                per_collection = (USER_EVERY - 1 - COLLECTIONS_PER_USER) // COLLECTIONS_PER_USER
+                for collection in collections:
+                    collection.publish_flag = self.size % (USER_EVERY * PUBLIC_COLLECTION_EVERY) == 0
+                    images = [self._image(user, collection, self.size + k) for k in range(per_collection)]
+                    collection.images = [image.id for image in images]
+                    for image in images:
+                        await batch.put_item(Item=_row(image))
+                    await batch.put_item(Item=_row(collection))
+                self.size += USER_EVERY
+                self.user, self.collection = user, collections[0]
+                self.image_ids = self.collection.images
+
+
+async def _measure(rounds: int, meter: CapacityMeter, op: Callable[[int], Awaitable[Any]]) -> dict[str, float]:
+    for i in range(min(3, rounds)):
+        await op(i)
+    meter.reset()
+    durations = []
+    for i in range(rounds):
+        start = time.perf_counter()
+        await op(i)
+        durations.append(time.perf_counter() - start)
+    p = percentiles(d * 1000 for d in durations)
+    return {
+        "ops_per_sec": round(rounds / sum(durations), 1),
+        "p50_ms": round(p[50], 2),
+        "p95_ms": round(p[95], 2),
+        "read_units": round(meter.read_units / rounds, 2),
+        "calls": round(sum(meter.calls.values()) / rounds, 2),
+    }
+
+
+async def _benchmark(crud: Crud, fixture: Fixture, meter: CapacityMeter) -> dict[str, dict[str, float]]:
+    assert fixture.user is not None and fixture.collection is not None
+    user, collection, image_ids = fixture.user, fixture.collection, fixture.image_ids
+    ops: dict[str, Callable[[int], Awaitable[Any]]] = {
+        "_add_item": lambda i: crud._add_item(
+            Image.create("https://media.example.com/new.jpg", user.id, collection.id)
+        ),
+        "_get_item": lambda i: crud._get_item(image_ids[i % len(image_ids)], Image),
+        "_update_item": lambda i: crud._update_item(image_ids[i % len(image_ids)], Image, {"translation_tokens": i}),
+        "_list_items": lambda i: crud._list_items(
+            Collection,
+            filter_expression="#flag=:flag",
+            expression_attribute_names={"#flag": "publish_flag"},
+            expression_attribute_values={":flag": True},
+            limit=12,
+        ),
+        "get_collections": lambda i: crud.get_collections(user.id),
+        "get_images": lambda i: crud.get_images(collection.id),
+        "get_user_by_api_key": lambda i: crud.get_user_by_api_key(str(user.api_key)),
+    }
+    return {name: await _measure(ROUNDS, meter, op) for name, op in ops.items()}
+
+
+def _report(results: dict[str, dict[str, dict[str, float]]], baseline: dict[str, Any]) -> list[str]:
+    """Prints the results next to the baseline and returns the operations which read more than before."""
+    regressions = []
+    print(f"\nCRUD benchmarks ({BACKEND}, {ROUNDS} rounds)")
+    for size, ops in results.items():
+        print(f"{int(size):>9} items {'ops/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'RU/op':>7} {'calls':>6}  baseline")
+        for name, result in ops.items():
+            base = baseline.get(size, {}).get(name)
+            vs = ""
+            if base is not None:
+                vs = f"{result['ops_per_sec'] / base['ops_per_sec']:.2f}x ops/s, {base['read_units']} RU/op"
+                if result["read_units"] > base["read_units"] * READ_UNIT_TOLERANCE + 0.5:
+                    regressions.append(f"{name} at {size} items")
+            print(
+                f"  {name:>21} {result['ops_per_sec']:>7.1f} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f}"
+                f" {result['read_units']:>7.2f} {result['calls']:>6.2f}  {vs}"
+            )
+    return regressions
+
+
+@pytest.fixture()
+def crud_endpoint(moto_server: str) -> Generator[str, None, None]:
+    endpoint = ENDPOINT or moto_server
+    os.environ["AWS_ENDPOINT_URL"] = endpoint
+    yield endpoint
+    if ENDPOINT is None:
+        httpx.post(f"{moto_server}/moto-api/reset", timeout=10)
+    del os.environ["AWS_ENDPOINT_URL"]
+
+
+@pytest.mark.slow
+@pytest.mark.asyncio
+async def test_crud_benchmarks(crud_endpoint: str) -> None:
+    fixture = Fixture()
+    results: dict[str, dict[str, dict[str, float]]] = {}
+    session = aioboto3.Session()
+    async with session.client("dynamodb", region_name=settings.aws_region_name) as client, Crud() as crud:
+        meter = CapacityMeter(client)
+        await create_tables(crud)
+        meter.attach(crud)
+        for size in sorted(SIZES):
+            await fixture.grow(crud, size)
+            results[str(size)] = await _benchmark(crud, fixture, meter)
+
+    baseline = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+    regressions = _report(results, baseline)
+    if SAVE_BASELINE:
+        BASELINE_PATH.parent.mkdir(exist_ok=True)
+        BASELINE_PATH.write_text(json.dumps({**baseline, **results}, indent=2, sort_keys=True) + "\n")
+    assert not regressions, f"Read units increased for {', '.join(regressions)}"
@@ -0,0 +1,44 @@
+"""Benchmarks the vision payload with and without downscaling before the call."""
+
+import base64
+import time
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from linguaphoto.ai.images import prepare_image
+
+
+def _photo_bytes(width: int, height: int) -> bytes:
+    # Smooth gradients plus noise compress roughly like a phone photo.
+    gradient = Image.linear_gradient("L").resize((width, height))
+    noise = Image.effect_noise((width, height), 24)
+    image = Image.merge("RGB", (gradient, noise, gradient.transpose(Image.Transpose.ROTATE_180)))
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG", quality=92)
+    return buffer.getvalue()
+
+
+@pytest.mark.slow
+def test_prepare_image_payload() -> None:
+    content = _photo_bytes(4032, 3024)
+
+    # Before: decode at full resolution and re-encode at the default quality.
+    start = time.perf_counter()
+    buffer = BytesIO()
+    Image.open(BytesIO(content)).convert("RGB").save(buffer, format="JPEG")
+    before_payload = len(base64.b64encode(buffer.getvalue()))
+    before_seconds = time.perf_counter() - start
+
+    # After: draft-mode decode, downscale and re-encode.
+    start = time.perf_counter()
+    prepared = prepare_image(content)
+    after_payload = len(base64.b64encode(prepared.data))
+    after_seconds = time.perf_counter() - start
+
+    print(
+        f"\nPayload: before={before_payload // 1024}KB after={after_payload // 1024}KB"
+        f"\nLatency: before={before_seconds * 1000:.0f}ms after={after_seconds * 1000:.0f}ms ({prepared.summary()})"
+    )
+    assert after_payload < before_payload / 2
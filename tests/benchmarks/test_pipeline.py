@@ -0,0 +1,172 @@
+"""Benchmarks the upload and translation pipeline end to end.
+
+OpenAI is replaced by the local stand-in server and AWS by moto, so the
+numbers show the pipeline's own overhead and concurrency behaviour under a
+given model latency. The load can be tuned with environment variables:
+
+    PIPELINE_IMAGES=64 PIPELINE_CONCURRENCY=16 PIPELINE_LATENCY=0.5 PIPELINE_JITTER=0.2 \
+        pytest -s -m slow tests/benchmarks/test_pipeline.py
+"""
+
+import asyncio
+import os
+import time
+from io import BytesIO
+from pathlib import Path
+
+import httpx
+import pytest
+import rsa
+from aiohttp.test_utils import TestServer
+from PIL import Image as PILImage
+from pytest_mock import MockerFixture
+
+from linguaphoto.ai.client import openai_pool
+from linguaphoto.ai.fake_openai import STATS_KEY, FakeOpenAIConfig, create_app
+from linguaphoto.crud.base import client_pool
+from linguaphoto.db import Crud
+from linguaphoto.main import app
+from linguaphoto.models import Collection, Image, User
+from linguaphoto.schemas.events import TranscriptionReady, TranslationEvent
+from linguaphoto.schemas.user import UserSignupFragment
+from linguaphoto.settings import settings
+from linguaphoto.utils.auth import create_access_token
+from linguaphoto.utils.cache import audio_cache, recent_uploads
+from linguaphoto.utils.timing import StageTimer, percentiles
+
+NUM_IMAGES = int(os.getenv("PIPELINE_IMAGES", "24"))
+CONCURRENCY = int(os.getenv("PIPELINE_CONCURRENCY", "8"))
+LATENCY = float(os.getenv("PIPELINE_LATENCY", "0.2"))
+JITTER = float(os.getenv("PIPELINE_JITTER", "0.05"))
+# Seconds between streamed chunks of the vision response, so speech can start before it ends.
+TOKEN_LATENCY = float(os.getenv("PIPELINE_TOKEN_LATENCY", "0.005"))
+ERROR_RATE = float(os.getenv("PIPELINE_ERROR_RATE", "0.0"))
+RATE_LIMIT_RATE = float(os.getenv("PIPELINE_RATE_LIMIT_RATE", "0.0"))
+
+
+def _png_bytes(seed: int) -> bytes:
+    # Distinct images, so uploads are not deduplicated against each other.
+    buffer = BytesIO()
+    PILImage.effect_noise((640, 480), 32 + seed % 64).convert("RGB").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _report(name: str, seconds: float, durations: list[dict[str, float]]) -> str:
+    lines = [f"{name}: {len(durations)} in {seconds:.2f}s ({len(durations) / seconds:.1f}/s)"]
+    for stage in durations[0] if durations else {}:
+        p = percentiles(d[stage] * 1000 for d in durations if stage in d)
+        lines.append(f"  {stage:>10}: p50={p[50]:.0f}ms p95={p[95]:.0f}ms p99={p[99]:.0f}ms")
+    return "\n".join(lines)
+
+
+async def _bounded(coroutines: list, concurrency: int) -> list:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(coroutine: object) -> object:
+        async with semaphore:
+            return await coroutine  # type: ignore[misc]
+
+    return await asyncio.gather(*(run(coroutine) for coroutine in coroutines))
+
+
+async def _benchmark_uploads(user: User, collection: Collection) -> tuple[float, list[dict[str, float]]]:
+    token = create_access_token({"id": user.id})
+    headers = {"Authorization": f"Bearer {token}"}
+    images = [_png_bytes(i) for i in range(NUM_IMAGES)]
+
+    # Requests go straight to the FastAPI app; the translation pool is not started, so jobs only get queued.
+    transport = httpx.ASGITransport(app=app.other_asgi_app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", headers=headers) as http:
+
+        async def upload(i: int) -> dict[str, float]:
+            start = time.perf_counter()
+            response = await http.post(
+                "/image/upload",
+                files={"file": (f"page-{i}.png", images[i], "image/png")},
+                data={"id": collection.id},
+            )
+            assert response.status_code == 200, response.text
+            return {"upload": time.perf_counter() - start}
+
+        start = time.perf_counter()
+        durations = await _bounded([upload(i) for i in range(NUM_IMAGES)], CONCURRENCY)
+        return time.perf_counter() - start, durations
+
+
+async def _benchmark_translations(image_ids: list[str], user_id: str) -> tuple[float, list[dict[str, float]]]:
+    async def translate(image_id: str) -> dict[str, float]:
+        timer = StageTimer()
+        start = time.perf_counter()
+        first_content = 0.0
+
+        async def on_event(event: TranslationEvent) -> None:
+            nonlocal first_content
+            if isinstance(event, TranscriptionReady):
+                first_content = time.perf_counter() - start
+
+        async with Crud() as crud:
+            await crud.translate(image_id, user_id, timer, on_event=on_event)
+        # Time until the user is sent the text, as opposed to the whole pipeline.
+        return {"total": time.perf_counter() - start, "first": first_content, **timer.durations}
+
+    start = time.perf_counter()
+    durations = await _bounded([translate(image_id) for image_id in image_ids], CONCURRENCY)
+    return time.perf_counter() - start, durations
+
+
+@pytest.mark.slow
+@pytest.mark.asyncio
+async def test_pipeline_throughput(aws_tables: str, tmp_path: Path, mocker: MockerFixture) -> None:
+    _, private_key = rsa.newkeys(1024)
+    key_path = tmp_path / "private_key.pem"
+    key_path.write_bytes(private_key.save_pkcs1())
+    mocker.patch.object(settings, "private_key_path", str(key_path))
+    mocker.patch.object(settings, "key_pair_id", "KTEST")
+    mocker.patch.object(settings, "openai_key", "fake")
+    mocker.patch.object(settings, "translation_workers", 0)
+    mocker.patch("linguaphoto.crud.image.media_hosting_server", "https://media.example.com")
+    audio_cache.clear()
+    recent_uploads.clear()
+
+    config = FakeOpenAIConfig(
+        latency=LATENCY,
+        jitter=JITTER,
+        token_latency=TOKEN_LATENCY,
+        error_rate=ERROR_RATE,
+        rate_limit_rate=RATE_LIMIT_RATE,
+        seed=0,
+    )
+    fake_app = create_app(config)
+    async with TestServer(fake_app) as server:
+        mocker.patch.object(settings, "openai_base_url", str(server.make_url("/v1")))
+        async with client_pool, openai_pool:
+            async with Crud() as crud:
+                user = User.create(UserSignupFragment(email="bench@example.com", password="password", username="b"))
+                user.is_subscription = True
+                await crud._add_item(user)
+                collection = Collection.create("Benchmark", "Pipeline benchmark", user.id)
+                await crud._add_item(collection)
+
+            upload_seconds, upload_durations = await _benchmark_uploads(user, collection)
+
+            # Listed from the collection index, since moto may drop concurrent appends to the collection's list
+            async with Crud() as crud:
+                images = await crud.list_images(collection.id)
+            assert len(images) == NUM_IMAGES
+            translate_seconds, translate_durations = await _benchmark_translations(
+                [image.id for image in images], user.id
+            )
+
+            async with Crud() as crud:
+                translated: list[Image] = await crud.list_images(collection.id)
+
+    print(
+        f"\nFake OpenAI: latency={LATENCY}s jitter={JITTER}s token_latency={TOKEN_LATENCY}s concurrency={CONCURRENCY}"
+        f" stats={dict(fake_app[STATS_KEY])}"
+        f"\n{_report('Uploads', upload_seconds, upload_durations)}"
+        f"\n{_report('Translations', translate_seconds, translate_durations)}"
+    )
+    assert all(image.is_translated for image in translated)
+    # With concurrent images, the run takes far less than the sum of the model latencies.
+    if LATENCY > 0 and CONCURRENCY > 1:
+        assert translate_seconds < NUM_IMAGES * 2 * LATENCY
@@ -0,0 +1,92 @@
+"""Benchmarks how long notifications take to reach users' sockets across workers.
+
+Every worker is a Socket.IO server on its own port, sharing rooms through the
+pub/sub manager, and the clients are spread over them round-robin, several
+devices per user. Notifications are emitted from a server without sockets,
+as the standalone translation workers do, so each one crosses the pub/sub
+channel. The fakeredis manager keeps everything in this process; point
+`SOCKET_FANOUT_MANAGER_URL` at a Redis server to include its round trips:
+
+    SOCKET_FANOUT_WORKERS=1,4,8 SOCKET_FANOUT_CLIENTS=500 SOCKET_FANOUT_MANAGER_URL=redis://localhost:6379/0 \
+        pytest -s -m slow tests/benchmarks/test_socket_fanout.py
+"""
+
+import asyncio
+import os
+import time
+import uuid
+from typing import Callable
+
+import pytest
+import socketio
+
+from linguaphoto.socket_manager import create_client_manager, create_server, user_room
+from linguaphoto.utils.auth import create_access_token
+from linguaphoto.utils.timing import percentiles
+
+WORKERS = [int(n) for n in os.getenv("SOCKET_FANOUT_WORKERS", "1,4").split(",")]
+CLIENTS = [int(n) for n in os.getenv("SOCKET_FANOUT_CLIENTS", "200").split(",")]
+DEVICES_PER_USER = int(os.getenv("SOCKET_FANOUT_DEVICES", "2"))
+ROUNDS = int(os.getenv("SOCKET_FANOUT_ROUNDS", "10"))
+MANAGER_URL = os.getenv("SOCKET_FANOUT_MANAGER_URL", "fakeredis://")
+
+
+async def _wait_for(condition: Callable[[], bool], timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "Timed out waiting for the sockets"
+        await asyncio.sleep(0.005)
+
+
+async def _fan_out(serve_socketio: Callable, num_workers: int, num_clients: int) -> str:
+    # A channel per run, so that a shared Redis server does not mix the runs.
+    channel = f"fanout-{uuid.uuid4().hex}"
+    servers = [create_server(create_client_manager(MANAGER_URL, channel)) for _ in range(num_workers)]
+    notifier = create_server(create_client_manager(MANAGER_URL, channel, write_only=True))
+    num_users = max(num_clients // DEVICES_PER_USER, 1)
+    latencies: list[float] = []
+    received = 0
+
+    def on_notification(message: dict) -> None:
+        nonlocal received
+        latencies.append(time.perf_counter() - message["sent"])
+        received += 1
+
+    async with serve_socketio(servers) as urls:
+        clients = []
+        for i in range(num_clients):
+            client = socketio.AsyncClient()
+            client.on("notification", on_notification)
+            await client.connect(urls[i % num_workers], transports=["websocket"])
+            assert await client.call("register_user", create_access_token({"id": f"user-{i % num_users}"}))
+            clients.append(client)
+        await _wait_for(lambda: all(server.manager.pubsub and server.manager.pubsub.subscribed for server in servers))
+
+        start = time.perf_counter()
+        for round_number in range(ROUNDS):
+            await asyncio.gather(
+                *(
+                    notifier.emit("notification", {"sent": time.perf_counter()}, room=user_room(f"user-{user}"))
+                    for user in range(num_users)
+                )
+            )
+            await _wait_for(lambda: received == (round_number + 1) * num_clients)
+        seconds = time.perf_counter() - start
+
+        await asyncio.gather(*(client.disconnect() for client in clients))
+
+    p = percentiles(latency * 1000 for latency in latencies)
+    return (
+        f"{num_workers} workers, {num_clients} sockets, {num_users} users: {received} deliveries in {seconds:.2f}s"
+        f" ({received / seconds:.0f}/s) p50={p[50]:.1f}ms p95={p[95]:.1f}ms p99={p[99]:.1f}ms"
+    )
+
+
+@pytest.mark.slow
+@pytest.mark.asyncio
+async def test_socket_fanout_latency(serve_socketio: Callable) -> None:
+    lines = [f"Socket.IO fan-out through {MANAGER_URL}, {ROUNDS} rounds:"]
+    for num_workers in WORKERS:
+        for num_clients in CLIENTS:
+            lines.append(await _fan_out(serve_socketio, num_workers, num_clients))
+    print("\n" + "\n".join(lines))
@@ -0,0 +1,79 @@
+"""Benchmarks CloudFront URL signing throughput and its impact on the event loop."""
+
+import asyncio
+import time
+from pathlib import Path
+from typing import Awaitable, Callable
+
+import pytest
+import rsa
+from botocore.signers import CloudFrontSigner
+
+from linguaphoto.utils.cloudfront_url_signer import CloudFrontUrlSigner
+
+NUM_URLS = 40
+
+
+@pytest.fixture(scope="module")
+def private_key_path(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    _, private_key = rsa.newkeys(2048)
+    path = tmp_path_factory.mktemp("keys") / "private_key.pem"
+    path.write_bytes(private_key.save_pkcs1())
+    return path
+
+
+async def _measure(sign: Callable[[], Awaitable[None]]) -> tuple[float, float]:
+    """Returns signatures per second and the longest event loop stall while signing."""
+    max_lag = 0.0
+    done = False
+
+    async def ticker() -> None:
+        nonlocal max_lag
+        while not done:
+            start = time.perf_counter()
+            await asyncio.sleep(0.001)
+            max_lag = max(max_lag, time.perf_counter() - start)
+
+    ticker_task = asyncio.create_task(ticker())
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    await sign()
+    elapsed = time.perf_counter() - start
+    done = True
+    await ticker_task
+    return NUM_URLS / elapsed, max_lag
+
+
+@pytest.mark.slow
+@pytest.mark.asyncio
+async def test_url_signer_throughput(private_key_path: Path) -> None:
+    urls = [f"https://media.example.com/{i}.mp3" for i in range(NUM_URLS)]
+
+    # Before: a new botocore signer per URL, re-reading the key and signing on the event loop.
+    async def sign_inline() -> None:
+        for url in urls:
+            private_key = rsa.PrivateKey.load_pkcs1(private_key_path.read_bytes())
+            inline_signer = CloudFrontSigner("key-id", lambda message: rsa.sign(message, private_key, "SHA-1"))
+            inline_signer.generate_presigned_url(url, policy=signer.create_custom_policy(url, expire_days=100))
+
+    # After: one signer, signing the whole batch on the signing pool.
+    signer = CloudFrontUrlSigner("key-id", str(private_key_path))
+    signed_urls: list[str] = []
+
+    async def sign_batch() -> None:
+        signed_urls.extend(await signer.sign_many(urls, expire_days=100))
+
+    async def sign_cached() -> None:
+        assert await signer.sign_many(urls, expire_days=100) == signed_urls
+
+    before, before_lag = await _measure(sign_inline)
+    after, after_lag = await _measure(sign_batch)
+    cached, _ = await _measure(sign_cached)
+
+    print(
+        f"\nSignatures/sec: before={before:.0f} after={after:.0f} cached={cached:.0f}"
+        f"\nMax event loop stall: before={before_lag * 1000:.1f}ms after={after_lag * 1000:.1f}ms"
+    )
+    assert all(signed_url.startswith(url + "?Policy=") for url, signed_url in zip(urls, signed_urls))
+    assert after_lag < before_lag
+    assert cached > after
@@ -1,15 +1,25 @@
 """Pytest configuration file."""
 
+import asyncio
 import os
-from typing import Generator, Optional
+import socket
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Generator, Optional
 
 import fakeredis
+import httpx
 import pytest
+import socketio
+import uvicorn
 from _pytest.python import Function
 from fastapi.testclient import TestClient
 from moto import mock_dynamodb  # Updated import
+from moto.server import ThreadedMotoServer
 from pytest_mock.plugin import MockerFixture
 
+from linguaphoto.db import create_tables
+from linguaphoto.main import app
+
 os.environ["LINGUAPHOTO_ENVIRONMENT"] = "local"
 
 
@@ -57,9 +67,52 @@ def mock_redis(mocker: MockerFixture) -> None:
     # mocker.patch("linguaphoto.crud.base.Redis", return_value=fake_redis)
 
 
+@pytest.fixture(scope="session")
+def moto_server() -> Generator[str, None, None]:
+    """Runs moto as a real HTTP endpoint, which the async AWS clients can talk to."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=port, verbose=False)
+    server.start()
+    yield f"http://127.0.0.1:{port}"
+    server.stop()
+
+
 @pytest.fixture()
-def app_client() -> Generator[TestClient, None, None]:
-    from linguaphoto.main import app
+def aws_tables(moto_server: str) -> Generator[str, None, None]:
+    """Points the AWS clients at the moto server and creates the table and bucket."""
+    os.environ["AWS_ENDPOINT_URL"] = moto_server
+    asyncio.run(create_tables())
+    yield moto_server
+    httpx.post(f"{moto_server}/moto-api/reset", timeout=10)
+    del os.environ["AWS_ENDPOINT_URL"]
+
 
+@pytest.fixture()
+def app_client() -> Generator[TestClient, None, None]:
     with TestClient(app) as app_client:
         yield app_client
+
+
+@asynccontextmanager
+async def _serve_socketio(servers: list[socketio.AsyncServer]) -> AsyncIterator[list[str]]:
+    running = [
+        uvicorn.Server(uvicorn.Config(socketio.ASGIApp(server), host="127.0.0.1", port=0, log_level="warning"))
+        for server in servers
+    ]
+    tasks = [asyncio.create_task(server.serve()) for server in running]
+    try:
+        while not all(server.started for server in running):
+            await asyncio.sleep(0.01)
+        yield [f"http://127.0.0.1:{server.servers[0].sockets[0].getsockname()[1]}" for server in running]
+    finally:
+        for server in running:
+            server.should_exit = True
+        await asyncio.gather(*tasks)
+
+
+@pytest.fixture()
+def serve_socketio() -> Callable:
+    """Serves Socket.IO servers over HTTP, each as if it were a separate worker, yielding their URLs."""
+    return _serve_socketio
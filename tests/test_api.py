@@ -0,0 +1,229 @@
+"""Tests for the HTTP routes."""
+
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from pytest_mock import MockerFixture
+
+from linguaphoto.crud.user import UserCrud
+from linguaphoto.db import Crud
+from linguaphoto.models import Image, Transcription
+from linguaphoto.schemas.user import UserSignupFragment
+from linguaphoto.settings import settings
+from linguaphoto.utils.auth import create_access_token
+from linguaphoto.utils.utils import NEXT_CURSOR_HEADER
+
+MEDIA = "https://media.example.com"
+
+
+async def _create_public_collections(count: int) -> None:
+    async with Crud() as crud:
+        for i in range(count):
+            collection = await crud.create_collection("user", f"title-{i}", "description")
+            await crud.edit_collection(collection.id, {"publish_flag": True})
+            # Most collections are not published.
+            for _ in range(4):
+                await crud.create_collection("user", "private", "description")
+
+
+@pytest.fixture()
+def public_collections(aws_tables: str) -> None:
+    # Seeds the table before `app_client` starts the app's client pool on its own loop.
+    asyncio.run(_create_public_collections(5))
+
+
+def _public_titles(app_client: TestClient, limit: int) -> list[list[str]]:
+    pages: list[list[str]] = []
+    params: dict[str, str | int] = {"limit": limit}
+    while True:
+        response = app_client.get("/collection/get_public_items", params=params)
+        assert response.status_code == 200
+        pages.append([collection["title"] for collection in response.json()])
+        if NEXT_CURSOR_HEADER not in response.headers:
+            return pages
+        params["cursor"] = response.headers[NEXT_CURSOR_HEADER]
+
+
+def test_public_collections_pagination(public_collections: None, app_client: TestClient, mocker: MockerFixture) -> None:
+    response = app_client.get("/collection/get_public_items")
+    assert response.status_code == 200
+    assert len(response.json()) == 5
+    assert NEXT_CURSOR_HEADER not in response.headers
+
+    # Pages are filled although the unpublished collections are filtered out after they are read.
+    pages = _public_titles(app_client, 2)
+    assert [len(page) for page in pages[:2]] == [2, 2] and sorted(sum(pages, [])) == [f"title-{i}" for i in range(5)]
+
+    # Reading fewer collections per page than it takes to fill one returns shorter pages which still cover all.
+    mocker.patch("linguaphoto.crud.collection.PUBLIC_COLLECTIONS_MAX_ROWS", 3)
+    pages = _public_titles(app_client, 2)
+    assert len(pages) > 3 and sorted(sum(pages, [])) == [f"title-{i}" for i in range(5)]
+
+    assert app_client.get("/collection/get_public_items", params={"cursor": "bad"}).status_code == 400
+
+
+def test_signin_fetches_the_user_once(aws_tables: str, app_client: TestClient, mocker: MockerFixture) -> None:
+    signup = {"username": "user", "email": "user@example.com", "password": "hunter22"}
+    assert app_client.post("/user/signup", json=signup).status_code == 200
+
+    query = mocker.spy(UserCrud, "_get_items_from_secondary_index")
+    response = app_client.post("/user/signin", json={"email": "user@example.com", "password": "hunter22"})
+    assert response.status_code == 200
+    assert response.json()["email"] == "user@example.com" and response.json()["token"]
+    assert query.call_count == 1
+
+    response = app_client.post("/user/signin", json={"email": "user@example.com", "password": "wrong"})
+    assert response.status_code == 422
+    response = app_client.post("/user/signin", json={"email": "nobody@example.com", "password": "hunter22"})
+    assert response.status_code == 422
+
+
+def test_collection_edits_follow_the_returned_version(aws_tables: str, app_client: TestClient) -> None:
+    signup = {"username": "user", "email": "user@example.com", "password": "hunter22"}
+    token = app_client.post("/user/signup", json=signup).json()["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    created = app_client.post("/collection/create", json={"title": "t", "description": "d"}, headers=headers).json()
+    loaded = app_client.get("/collection/get", params={"id": created["id"]}).json()
+
+    response = app_client.post("/collection/set_publish", json={"id": loaded["id"], "flag": True}, headers=headers)
+    assert response.status_code == 200
+    published = response.json()
+    assert published["publish_flag"] and published["version"] == loaded["version"] + 1
+
+    # The version loaded before publishing is stale, so the edit is refused rather than undoing the change.
+    assert app_client.post("/collection/edit", json={**loaded, "title": "stale"}, headers=headers).status_code == 409
+
+    # Editing from the collection each response returns keeps working, one save after another.
+    response = app_client.post("/collection/edit", json={**published, "title": "first"}, headers=headers)
+    assert response.status_code == 200
+    first = response.json()
+    response = app_client.post("/collection/edit", json={**first, "title": "second"}, headers=headers)
+    assert response.status_code == 200
+    second = response.json()
+    assert second["title"] == "second" and second["publish_flag"] and second["version"] == published["version"] + 2
+
+    response = app_client.post(
+        "/collection/set_featured_image",
+        json={"collection_id": second["id"], "image_url": "https://media.example.com/a.jpg"},
+        headers=headers,
+    )
+    assert response.status_code == 200 and response.json()["version"] == second["version"] + 1
+
+    # Reordering without a version could undo uploads made meanwhile, so it is refused.
+    unversioned = {**second, "images": [], "version": None}
+    assert app_client.post("/collection/edit", json=unversioned, headers=headers).status_code == 400
+    # Edits to a missing collection do not create one.
+    missing = {**second, "id": "missing"}
+    assert app_client.post("/collection/edit", json=missing, headers=headers).status_code == 404
+    assert (
+        app_client.post(
+            "/collection/edit", json={**missing, "images": None, "version": None}, headers=headers
+        ).status_code
+        == 404
+    )
+    response = app_client.post("/collection/set_publish", json={"id": "missing", "flag": True}, headers=headers)
+    assert response.status_code == 404
+
+
+async def _create_published_collection() -> str:
+    async with Crud() as crud:
+        collection = await crud.create_collection("owner", "title", "description")
+        image = Image.create(image_url=f"{MEDIA}/users/owner/a.jpg", user_id="owner", collection_id=collection.id)
+        image.transcriptions = [
+            Transcription(text="你好", pinyin="nǐhǎo", translation="Hello", audio_url=f"{MEDIA}/users/owner/a.mp3")
+        ]
+        await crud._add_item(image)
+        await crud.edit_collection(
+            collection.id, {"images": [image.id], "featured_image": image.image_url, "publish_flag": True}
+        )
+        return collection.id
+
+
+@pytest.fixture()
+def published_collection(aws_tables: str) -> str:
+    return asyncio.run(_create_published_collection())
+
+
+def test_published_media_is_signed_for_other_viewers(
+    published_collection: str, app_client: TestClient, mocker: MockerFixture
+) -> None:
+    mocker.patch.object(settings, "media_signed_cookies", True)
+    mocker.patch.object(settings, "media_hosting_server", MEDIA)
+    signer = mocker.patch("linguaphoto.utils.cloudfront_url_signer.get_url_signer").return_value
+    signer.sign_many = mocker.AsyncMock(side_effect=lambda urls: [f"{url}?signed" for url in urls])
+
+    def image_urls(user_id: str | None) -> list[str]:
+        headers = {"Authorization": f"Bearer {create_access_token({'id': user_id})}"} if user_id else {}
+        response = app_client.get("/image/get_all", params={"collection_id": published_collection}, headers=headers)
+        assert response.status_code == 200
+        [image] = response.json()
+        return [image["image_url"], image["transcriptions"][0]["audio_url"]]
+
+    owner_urls = [f"{MEDIA}/users/owner/a.jpg", f"{MEDIA}/users/owner/a.mp3"]
+    # The owner's cookies cover their prefix, but nobody else's do, signed in or not.
+    assert image_urls("owner") == owner_urls
+    assert image_urls("viewer") == [f"{url}?signed" for url in owner_urls]
+    assert image_urls(None) == [f"{url}?signed" for url in owner_urls]
+    # Listing in upload order, from the collection index, signs them the same way.
+    params: dict[str, str | int] = {"collection_id": published_collection, "order": "uploaded", "limit": 1}
+    response = app_client.get("/image/get_all", params=params)
+    assert [image["image_url"] for image in response.json()] == [f"{owner_urls[0]}?signed"]
+
+    [collection] = app_client.get("/collection/get_public_items").json()
+    assert collection["featured_image"] == f"{owner_urls[0]}?signed"
+
+
+async def _create_api_key_user() -> tuple[str, str, str]:
+    async with Crud() as crud:
+        user = await crud.create_user_from_email(
+            UserSignupFragment(username="user", email="user@example.com", password="hunter22")
+        )
+        assert user is not None
+        api_key = await crud.generate_api_key(user.id)
+        collection = await crud.create_collection(user.id, "title", "description")
+        await crud.edit_collection(collection.id, {"featured_image": f"{MEDIA}/users/{user.id}/a.jpg"})
+        return user.id, api_key, collection.id
+
+
+@pytest.fixture()
+def api_key_user(aws_tables: str) -> tuple[str, str, str]:
+    return asyncio.run(_create_api_key_user())
+
+
+def test_media_is_signed_for_callers_without_cookies(
+    api_key_user: tuple[str, str, str], app_client: TestClient, mocker: MockerFixture
+) -> None:
+    mocker.patch.object(settings, "media_signed_cookies", True)
+    mocker.patch.object(settings, "media_hosting_server", MEDIA)
+    signer = mocker.patch("linguaphoto.utils.cloudfront_url_signer.get_url_signer").return_value
+    signer.sign_many = mocker.AsyncMock(side_effect=lambda urls: [f"{url}?signed" for url in urls])
+    user_id, api_key, collection_id = api_key_user
+    featured_image = f"{MEDIA}/users/{user_id}/a.jpg"
+
+    # API-key clients never receive the cookies, even for their own media.
+    response = app_client.get("/collection/get_all_api_key", headers={"Authorization": f"Bearer {api_key}"})
+    assert response.status_code == 200
+    assert [collection["featured_image"] for collection in response.json()] == [f"{featured_image}?signed"]
+
+    # Edits return the featured image signed the same way as a fresh `/get`.
+    headers = {"Authorization": f"Bearer {create_access_token({'id': user_id})}"}
+    other_image = f"{MEDIA}/users/other/b.jpg"
+    response = app_client.post(
+        "/collection/set_featured_image",
+        json={"collection_id": collection_id, "image_url": other_image},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    edited = response.json()
+    assert edited == app_client.get("/collection/get", params={"id": collection_id}, headers=headers).json()
+    assert edited["featured_image"] == f"{other_image}?signed"
+
+    response = app_client.post("/collection/set_publish", json={"id": collection_id, "flag": True}, headers=headers)
+    assert response.status_code == 200 and response.json()["featured_image"] == f"{other_image}?signed"
+    response = app_client.post(
+        "/collection/edit",
+        json={**edited, "featured_image": featured_image, "images": None, "version": None},
+        headers=headers,
+    )
+    assert response.status_code == 200 and response.json()["featured_image"] == featured_image
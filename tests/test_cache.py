@@ -0,0 +1,23 @@
+"""Tests for the in-process caches."""
+
+import time
+
+from linguaphoto.utils.cache import TTLCache
+
+
+def test_ttl_cache_evicts_lru_and_expired() -> None:
+    cache: TTLCache[str, int] = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+    cache.pop_where(lambda value: value == 3)
+    assert cache.get("c") is None
+
+    cache.ttl = 0.01
+    cache.set("d", 4)
+    time.sleep(0.02)
+    assert cache.get("d") is None
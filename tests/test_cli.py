@@ -0,0 +1,58 @@
+"""Tests for the batch pipeline CLI, with OpenAI calls stubbed out."""
+
+import json
+from pathlib import Path
+from typing import AsyncIterator
+
+import pytest
+from PIL import Image
+from pytest_mock import MockerFixture
+
+from linguaphoto.ai.cli import run_batch
+from linguaphoto.models import Transcription, TranscriptionResponse
+from linguaphoto.settings import settings
+
+
+async def _audio_chunks(text: str) -> AsyncIterator[bytes]:
+    yield text.encode("utf-8")
+
+
+@pytest.mark.asyncio
+async def test_batch_run_resumes_from_manifest(tmp_path: Path, mocker: MockerFixture) -> None:
+    mocker.patch.object(settings, "openai_key", "test")
+    (tmp_path / "book" / "chapter").mkdir(parents=True)
+    for name in ["book/1.png", "book/chapter/2.png", "book/chapter/3.jpg"]:
+        Image.new("RGB", (16, 16)).save(tmp_path / name)
+    (tmp_path / "book" / "notes.txt").write_text("not an image")
+
+    transcribe = mocker.patch(
+        "linguaphoto.ai.cli.transcribe_image",
+        side_effect=[
+            RuntimeError("vision failed"),
+            *[
+                TranscriptionResponse(
+                    transcriptions=[
+                        Transcription(text=t, pinyin="", translation="", audio_url="") for t in ["一", "二"]
+                    ],
+                    total_tokens=100,
+                )
+            ]
+            * 3,
+        ],
+    )
+    mocker.patch("linguaphoto.ai.cli.synthesize_text", side_effect=lambda text, client: _audio_chunks(text))
+
+    output = tmp_path / "output"
+    first = await run_batch([str(tmp_path / "book")], output, concurrency=1)
+    assert (first.total, first.done, first.failed, first.tokens) == (3, 2, 1, 200)
+
+    second = await run_batch([str(tmp_path / "book" / "**" / "*.png"), str(tmp_path / "book")], output)
+    assert (second.total, second.skipped, second.done, second.failed) == (3, 2, 1, 0)
+    assert transcribe.call_count == 4
+
+    entries = [json.loads(line) for line in (output / "manifest.jsonl").read_text().splitlines()]
+    assert len({entry["image"] for entry in entries}) == 3
+    for entry in entries:
+        output_dir = Path(entry["output"])
+        assert (output_dir / "audio_1.mp3").read_bytes() == "二".encode("utf-8")
+        assert json.loads((output_dir / "transcription.json").read_text())["total_tokens"] == 100
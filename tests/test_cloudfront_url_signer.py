@@ -0,0 +1,70 @@
+"""Tests for CloudFront URL and cookie signing."""
+
+import base64
+import json
+from pathlib import Path
+
+import pytest
+import rsa
+from botocore.signers import CloudFrontSigner
+from pytest_mock import MockerFixture
+
+from linguaphoto.settings import settings
+from linguaphoto.utils.cloudfront_url_signer import CloudFrontUrlSigner
+from linguaphoto.utils.executors import shutdown_executors
+
+
+def _url_b64decode(value: str) -> bytes:
+    return base64.b64decode(value.replace("-", "+").replace("_", "=").replace("~", "/"))
+
+
+@pytest.mark.asyncio
+async def test_signed_cookies_cover_wildcard_resource(tmp_path: Path) -> None:
+    public_key, private_key = rsa.newkeys(1024)
+    key_path = tmp_path / "private_key.pem"
+    key_path.write_bytes(private_key.save_pkcs1())
+    signer = CloudFrontUrlSigner("key-id", str(key_path))
+
+    resource = "https://media.example.com/users/user-id/*"
+    try:
+        cookies = await signer.sign_cookies(resource, expire_days=1)
+        # Cookies for the same expiry bucket are reused rather than signed again.
+        assert await signer.sign_cookies(resource, expire_days=1) is cookies
+    finally:
+        shutdown_executors()
+    assert cookies["CloudFront-Key-Pair-Id"] == "key-id"
+
+    policy = _url_b64decode(cookies["CloudFront-Policy"])
+    assert json.loads(policy)["Statement"][0]["Resource"] == resource
+    rsa.verify(policy, _url_b64decode(cookies["CloudFront-Signature"]), public_key)
+
+
+@pytest.mark.asyncio
+async def test_sign_many_on_a_process_pool(tmp_path: Path, mocker: MockerFixture) -> None:
+    mocker.patch.object(settings, "cpu_executor", "process")
+    mocker.patch.object(settings, "cpu_workers", 1)
+    public_key, private_key = rsa.newkeys(1024)
+    key_path = tmp_path / "private_key.pem"
+    key_path.write_bytes(private_key.save_pkcs1())
+    signer = CloudFrontUrlSigner("key-id", str(key_path))
+
+    urls = ["https://media.example.com/a.mp3", "https://media.example.com/b.mp3?x=1", "https://media.example.com/a.mp3"]
+    try:
+        signed_urls = await signer.sign_many(urls, expire_days=1)
+    finally:
+        shutdown_executors()
+
+    # Matches what botocore's signer produces for the same policy.
+    expiration_time = signer._bucketed_expiry(1)
+    botocore_signer = CloudFrontSigner("key-id", lambda message: rsa.sign(message, private_key, "SHA-1"))
+    assert signed_urls == [
+        botocore_signer.generate_presigned_url(url, policy=signer._create_policy(url, expiration_time)) for url in urls
+    ]
+    # The signatures are reused for the same expiry bucket, without going back to the pool.
+    run_cpu_bound = mocker.patch("linguaphoto.utils.cloudfront_url_signer.run_cpu_bound")
+    assert await signer.sign_many(urls, expire_days=1) == signed_urls
+    run_cpu_bound.assert_not_called()
+    assert signed_urls[1].startswith(urls[1] + "&Policy=")
+    params = dict(param.split("=", 1) for param in signed_urls[0].split("?", 1)[1].split("&"))
+    assert params["Key-Pair-Id"] == "key-id"
+    rsa.verify(_url_b64decode(params["Policy"]), _url_b64decode(params["Signature"]), public_key)
@@ -0,0 +1,336 @@
+"""Tests for the CRUD layer, run against a moto server."""
+
+import asyncio
+import os
+import random
+from io import BytesIO
+from typing import Any
+
+import pytest
+from fastapi import HTTPException, UploadFile
+from PIL import Image as PILImage
+from pytest_mock import MockerFixture
+
+from linguaphoto.crud.base import TABLE_NAME
+from linguaphoto.db import Crud, migrate_tables
+from linguaphoto.errors import ItemConflictError, ItemNotFoundError
+from linguaphoto.models import Collection, Image, Transcription
+from linguaphoto.schemas.user import Principal, UserSignupFragment
+from linguaphoto.settings import settings
+from linguaphoto.utils.cache import api_key_cache, subscription_cache, upload_dedup_stats
+
+
+@pytest.mark.asyncio
+async def test_get_images_batches_in_stored_order(aws_tables: str) -> None:
+    async with Crud() as crud:
+        collection = await crud.create_collection("user", "title", "description")
+        images = [Image.create(image_url=f"url-{i}", user_id="user", collection_id=collection.id) for i in range(150)]
+        for image in images:
+            await crud._add_item(image)
+        image_ids = [image.id for image in images]
+        random.shuffle(image_ids)
+        await crud._update_item(collection.id, Collection, {"images": image_ids + ["missing"]})
+
+        fetched = await crud.get_images(collection.id)
+        assert [image.id for image in fetched] == image_ids
+        assert await crud.get_images("missing") == []
+
+
+@pytest.mark.asyncio
+async def test_list_images_uses_upload_order_after_migration(aws_tables: str) -> None:
+    async with Crud() as crud:
+        collection = await crud.create_collection("user", "title", "description")
+        table = await crud.db.Table(TABLE_NAME)
+        legacy_ids = [f"legacy-{i}" for i in range(3)]
+        # The last one is not in the collection's list, e.g. because an earlier edit dropped it.
+        for image_id in [*legacy_ids, "unlisted"]:
+            await table.put_item(
+                Item={"id": image_id, "type": "Image", "collection": collection.id, "image_url": "url", "user": "user"}
+            )
+        # An image which already has a timestamp, however early, stays after every backfilled one.
+        uploaded = Image.create(image_url="url", user_id="user", collection_id=collection.id)
+        uploaded.created_at = 5
+        await crud._add_item(uploaded)
+        await crud._update_item(collection.id, Collection, {"images": [*legacy_ids[::-1], uploaded.id]})
+
+        # Rows written before the index existed have no sort key and are invisible to it.
+        assert [image.id for image in await crud.list_images(collection.id)] == [uploaded.id]
+
+        await migrate_tables(crud)
+        listed = await crud.list_images(collection.id)
+        assert [image.id for image in listed] == [*legacy_ids[::-1], "unlisted", uploaded.id]
+        assert len({image.created_at for image in listed}) == len(listed)
+
+
+@pytest.mark.asyncio
+async def test_image_pages_follow_cursors(aws_tables: str) -> None:
+    async with Crud() as crud:
+        collection = await crud.create_collection("user", "title", "description")
+        images = [Image.create(image_url=f"url-{i}", user_id="user", collection_id=collection.id) for i in range(7)]
+        for i, image in enumerate(images):
+            image.created_at = i
+            await crud._add_item(image)
+        # Pages follow the user's order rather than the upload order, the same as the unpaged listing.
+        order = [image.id for image in images[::-1]]
+        await crud.edit_collection(collection.id, {"images": order})
+
+        seen: list[str] = []
+        cursor = None
+        while True:
+            page = await crud.get_images_page(collection.id, limit=3, cursor=cursor)
+            assert len(page.items) <= 3
+            seen.extend(image.id for image in page.items)
+            if page.cursor is None:
+                break
+            cursor = page.cursor
+        assert seen == order == [image.id for image in await crud.get_images(collection.id)]
+
+        first = await crud.get_images_page(collection.id, limit=3)
+        assert first.cursor is not None
+        # Moving images in front of the last one seen does not repeat or skip any.
+        await crud.edit_collection(collection.id, {"images": [order[1], order[0], *order[2:]]})
+        second = await crud.get_images_page(collection.id, limit=3, cursor=first.cursor)
+        assert [image.id for image in second.items] == order[3:6]
+        # Without the last one seen, the page resumes at its position.
+        await crud.edit_collection(collection.id, {"images": [*order[:2], *order[3:]]})
+        second = await crud.get_images_page(collection.id, limit=3, cursor=first.cursor)
+        assert [image.id for image in second.items] == order[3:6]
+
+        with pytest.raises(ValueError):
+            await crud.get_images_page(collection.id, limit=3, cursor="not-a-cursor")
+
+        # Pages of the collection index follow the upload order instead. Moto applies `Limit` before sorting
+        # by the index's sort key, which is why the images were written in upload order.
+        uploaded: list[str] = []
+        cursor = None
+        while True:
+            page = await crud.list_images_page(collection.id, limit=3, cursor=cursor)
+            assert 0 < len(page.items) <= 3
+            uploaded.extend(image.id for image in page.items)
+            if page.cursor is None:
+                break
+            cursor = page.cursor
+        assert uploaded == [image.id for image in await crud.list_images(collection.id)]
+        # The index lists every image of the collection, including ones no longer in its list.
+        assert uploaded == [image.id for image in images]
+
+
+@pytest.mark.asyncio
+async def test_api_key_lookup_and_cache_invalidation(aws_tables: str) -> None:
+    async with Crud() as crud:
+        user = await crud.create_user_from_email(
+            UserSignupFragment(username="user", email="user@example.com", password="password")
+        )
+        assert user is not None
+        old_key = await crud.generate_api_key(user.id)
+        found = await crud.get_user_by_api_key(old_key)
+        assert found is not None and found.id == user.id
+
+        api_key_cache.set(old_key, Principal(user_id=user.id, is_subscription=False))
+        new_key = await crud.generate_api_key(user.id)
+        assert api_key_cache.get(old_key) is None
+        assert await crud.get_user_by_api_key(old_key) is None
+        assert (await crud.get_user_by_api_key(new_key)) is not None
+
+        api_key_cache.set(new_key, Principal(user_id=user.id, is_subscription=False))
+        subscription_cache.set(user.id, Principal(user_id=user.id, is_subscription=False))
+        await crud.update_user(user.id, {"is_subscription": True})
+        assert api_key_cache.get(new_key) is None
+        assert subscription_cache.get(user.id) is None
+
+
+def _png_bytes(width: int, height: int, noise: bool = False) -> bytes:
+    buffer = BytesIO()
+    if noise:
+        image = PILImage.frombytes("RGB", (width, height), os.urandom(width * height * 3))
+    else:
+        image = PILImage.new("RGB", (width, height), "white")
+    image.save(buffer, format="PNG", compress_level=0)
+    return buffer.getvalue()
+
+
+@pytest.mark.asyncio
+async def test_duplicate_upload_reuses_object_and_transcriptions(aws_tables: str, mocker: MockerFixture) -> None:
+    mocker.patch("linguaphoto.crud.image.media_hosting_server", "https://media.example.com")
+    signer = mocker.patch("linguaphoto.crud.image.get_url_signer").return_value
+    signer.sign_many.side_effect = lambda urls, expire_days=1: asyncio.sleep(0, [f"{url}?signed" for url in urls])
+    content = _png_bytes(64, 48)
+    hits, bytes_saved, transcription_hits, tokens_saved = (
+        upload_dedup_stats.hits,
+        upload_dedup_stats.bytes_saved,
+        upload_dedup_stats.transcription_hits,
+        upload_dedup_stats.tokens_saved,
+    )
+    audio_url = "https://media.example.com/tts/audio.mp3"
+    transcriptions = [
+        Transcription(text="你好", pinyin="nǐhǎo", translation="Hello", audio_url=f"{audio_url}?Expires=old")
+    ]
+    # Copies get the speech re-signed with a fresh expiry, as the image is.
+    copied_transcriptions = [t.model_copy(update={"audio_url": f"{audio_url}?signed"}) for t in transcriptions]
+
+    async with Crud() as crud:
+        collection = await crud.create_collection("user", "title", "description")
+        first = await crud.create_image(UploadFile(BytesIO(content), filename="a.jpg"), "user", collection.id)
+        await crud._update_item(
+            first.id,
+            Image,
+            {
+                "transcriptions": [t.model_dump() for t in transcriptions],
+                "is_translated": True,
+                "translation_tokens": 900,
+            },
+        )
+        second = await crud.create_image(UploadFile(BytesIO(content), filename="b.jpg"), "other", collection.id)
+        different = await crud.create_image(
+            UploadFile(BytesIO(_png_bytes(48, 64)), filename="c.jpg"), "user", collection.id
+        )
+        stored = await crud.get_image(second.id)
+        # In signed-cookie mode another user's object is outside the uploader's prefix, so it is uploaded again.
+        mocker.patch.object(settings, "media_signed_cookies", True)
+        third = await crud.create_image(UploadFile(BytesIO(content), filename="d.jpg"), "third", collection.id)
+        # The user's own upload from before signed-cookie mode is reused, but is outside their prefix, so stays signed.
+        own = await crud.create_image(UploadFile(BytesIO(content), filename="e.jpg"), "user", collection.id)
+
+    assert second.image_url == first.image_url
+    assert stored is not None and stored.is_translated and stored.transcriptions == copied_transcriptions
+    assert stored.content_hash == first.content_hash
+    assert different.image_url != first.image_url and not different.is_translated
+    assert third.image_url != first.image_url and third.transcriptions == copied_transcriptions
+    assert own.image_url == first.image_url
+    assert upload_dedup_stats.hits - hits == 2
+    assert upload_dedup_stats.bytes_saved - bytes_saved == 2 * len(content)
+    assert upload_dedup_stats.transcription_hits - transcription_hits == 3
+    assert upload_dedup_stats.tokens_saved - tokens_saved == 2700
+
+
+@pytest.mark.asyncio
+async def test_upload_rejects_bad_images_before_s3(aws_tables: str, mocker: MockerFixture) -> None:
+    mocker.patch.object(settings, "media_signed_cookies", True)
+    mocker.patch.object(settings, "upload_max_bytes", 100_000)
+    upload = mocker.spy(Crud, "_upload_to_s3")
+    async with Crud() as crud:
+        collection = await crud.create_collection("user", "title", "description")
+        for content, status_code in [
+            (b"<html>not an image</html>", 415),
+            (_png_bytes(20000, 10), 413),
+            (_png_bytes(200, 200, noise=True), 413),
+        ]:
+            with pytest.raises(HTTPException) as exc_info:
+                await crud.create_image(UploadFile(BytesIO(content), filename="a.jpg"), "user", collection.id)
+            assert exc_info.value.status_code == status_code
+    upload.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_large_upload_goes_through_multipart(aws_tables: str, mocker: MockerFixture) -> None:
+    mocker.patch.object(settings, "media_signed_cookies", True)
+    mocker.patch.object(settings, "s3_part_size", 5 * 1024 * 1024)
+    mocker.patch("linguaphoto.crud.image.media_hosting_server", "https://media.example.com")
+    content = _png_bytes(1600, 1600, noise=True)
+    assert len(content) > settings.s3_part_size
+
+    async with Crud() as crud:
+        collection = await crud.create_collection("user", "title", "description")
+        image = await crud.create_image(UploadFile(BytesIO(content), filename="photo"), "user", collection.id)
+        key = "uploads/" + image.image_url.removeprefix("https://media.example.com/")
+        head = await crud.s3.meta.client.head_object(Bucket=settings.bucket_name, Key=key)
+
+    assert key.endswith(".png")
+    assert head["ContentLength"] == len(content)
+    assert head["ContentType"] == "image/png"
+    # Multipart objects have an ETag suffixed with their number of parts.
+    assert head["ETag"].strip('"').endswith("-2")
+
+
+@pytest.mark.asyncio
+async def test_uploads_and_deletes_update_collections_in_place(aws_tables: str, mocker: MockerFixture) -> None:
+    mocker.patch.object(settings, "media_signed_cookies", True)
+    mocker.patch("linguaphoto.crud.image.media_hosting_server", "https://media.example.com")
+    contents = [_png_bytes(16 + i, 16) for i in range(12)]
+
+    async with Crud() as crud:
+        collection = await crud.create_collection("user", "title", "description")
+        # Moto does not apply concurrent updates to an item one after another, as DynamoDB does, so they are
+        # sent one at a time and the test checks that each upload makes its change in a single write instead.
+        lock, update_item = asyncio.Lock(), Crud._update_item
+
+        async def serialized(*args: Any, **kwargs: Any) -> Any:  # noqa: ANN401
+            async with lock:
+                return await update_item(*args, **kwargs)
+
+        update = mocker.patch.object(Crud, "_update_item", autospec=True, side_effect=serialized)
+        get = mocker.spy(Crud, "_get_item")
+        images = await asyncio.gather(
+            *(
+                crud.create_image(UploadFile(BytesIO(content), filename=f"{i}.png"), "user", collection.id)
+                for i, content in enumerate(contents)
+            )
+        )
+        # Each upload appends to the list without reading the collection, so no upload overwrites another's.
+        assert not any(call.args[1] == collection.id for call in get.call_args_list)
+        updates = sorted(update.call_args_list, key=lambda call: call.kwargs["append"]["images"])
+        assert [(call.args[1:], call.kwargs) for call in updates] == [
+            (
+                (collection.id, Collection),
+                {
+                    "append": {"images": [image_id]},
+                    "add": {"version": 1},
+                    "condition_expression": "attribute_exists(id)",
+                },
+            )
+            for image_id in sorted(image.id for image in images)
+        ]
+        uploaded = await crud.get_collection(collection.id)
+        assert uploaded is not None and sorted(uploaded.images) == sorted(image.id for image in images)
+        assert uploaded.version == len(images)
+
+        # Each removal only applies if the element is still at the index it was read from.
+        update.reset_mock()
+        for image in images[::3]:
+            await crud.delete_image(image)
+        expected, image_ids = [], list(uploaded.images)
+        for image in images[::3]:
+            index = image_ids.index(image.id)
+            expected.append((f"#images[{index}] = :image_id", {":image_id": image.id}))
+            image_ids.pop(index)
+        assert [
+            (call.kwargs["condition_expression"], call.kwargs["condition_values"]) for call in update.call_args_list
+        ] == expected
+        remaining = await crud.get_collection(collection.id)
+        with pytest.raises(ItemNotFoundError):
+            await crud.create_image(UploadFile(BytesIO(contents[0]), filename="a.png"), "user", "missing")
+
+    assert remaining is not None
+    assert remaining.images == [image_id for image_id in uploaded.images if image_id not in {i.id for i in images[::3]}]
+
+
+@pytest.mark.asyncio
+async def test_update_expressions(aws_tables: str) -> None:
+    async with Crud() as crud:
+        collection = await crud.create_collection("user", "title", "description")
+        updated = await crud._update_item(
+            collection.id,
+            Collection,
+            {"title": "new"},
+            append={"images": ["a", "b", "c"]},
+            add={"version": 2},
+            return_item=True,
+        )
+        assert updated is not None and (updated.title, updated.images, updated.version) == ("new", ["a", "b", "c"], 2)
+
+        updated = await crud._update_item(collection.id, Collection, remove=["images[1]"], return_item=True)
+        assert updated is not None and updated.images == ["a", "c"]
+
+        # Versioned edits only apply to the version they were based on.
+        edited = await crud.edit_collection(collection.id, {"images": ["c", "a"]}, expected_version=2)
+        assert edited is not None and (edited.images, edited.version) == (["c", "a"], 3)
+        with pytest.raises(ItemConflictError):
+            await crud.edit_collection(collection.id, {"images": ["a"]}, expected_version=2)
+        stored = await crud.get_collection(collection.id)
+        assert stored is not None and stored.images == ["c", "a"]
+
+        # Edits to a missing collection fail rather than creating a partial one.
+        for expected_version in (None, 0, 3):
+            with pytest.raises(ItemNotFoundError):
+                await crud.edit_collection("missing", {"title": "new"}, expected_version=expected_version)
+        assert await crud._get_item("missing", Collection) is None
@@ -0,0 +1,73 @@
+"""Tests for the local OpenAI stand-in server."""
+
+import time
+from io import BytesIO
+
+import openai
+import pytest
+from aiohttp.test_utils import TestServer
+from PIL import Image
+from pytest_mock import MockerFixture
+
+from linguaphoto.ai.client import get_openai_client
+from linguaphoto.ai.fake_openai import STATS_KEY, FakeOpenAIConfig, create_app
+from linguaphoto.ai.transcribe import TranscriptionStream, transcribe_image
+from linguaphoto.ai.tts import synthesize_text
+from linguaphoto.settings import settings
+
+
+@pytest.mark.asyncio
+async def test_fake_server_answers_like_openai(mocker: MockerFixture) -> None:
+    app = create_app(FakeOpenAIConfig(sentences=2, audio_bytes_per_char=100, audio_chunk_size=64))
+    buffer = BytesIO()
+    Image.new("RGB", (64, 64), "white").save(buffer, format="PNG")
+
+    async with TestServer(app) as server:
+        mocker.patch.object(settings, "openai_key", "fake")
+        mocker.patch.object(settings, "openai_base_url", str(server.make_url("/v1")))
+        async with get_openai_client() as client:
+            first = await transcribe_image(BytesIO(buffer.getvalue()), client)
+            second = await transcribe_image(BytesIO(buffer.getvalue()), client)
+            audio = b"".join([chunk async for chunk in await synthesize_text("你好", client)])
+
+    assert len(first.transcriptions) == 2 and first.total_tokens > 0
+    # Every response has new sentences, so the speech cache does not hide the TTS load.
+    assert first.transcriptions[0].text != second.transcriptions[0].text
+    assert len(audio) == 200
+    assert app[STATS_KEY]["chat_requests"] == 2
+
+
+@pytest.mark.asyncio
+async def test_fake_server_rate_limits_are_retried(mocker: MockerFixture) -> None:
+    app = create_app(FakeOpenAIConfig(rate_limit_rate=1.0))
+
+    async with TestServer(app) as server:
+        mocker.patch.object(settings, "openai_key", "fake")
+        mocker.patch.object(settings, "openai_base_url", str(server.make_url("/v1")))
+        mocker.patch.object(settings, "openai_max_retries", 2)
+        async with get_openai_client() as client:
+            with pytest.raises(openai.RateLimitError):
+                await synthesize_text("你好", client)
+
+    assert app[STATS_KEY]["speech_rate_limited"] == 3
+
+
+@pytest.mark.asyncio
+async def test_streamed_sentences_arrive_before_the_response_ends(mocker: MockerFixture) -> None:
+    # Cut off before the fourth sentence is translated, as if the model ran out of tokens.
+    app = create_app(FakeOpenAIConfig(sentences=4, token_latency=0.01, truncate_at=400))
+    buffer = BytesIO()
+    Image.new("RGB", (64, 64), "white").save(buffer, format="PNG")
+
+    async with TestServer(app) as server:
+        mocker.patch.object(settings, "openai_key", "fake")
+        mocker.patch.object(settings, "openai_base_url", str(server.make_url("/v1")))
+        async with get_openai_client() as client:
+            stream = TranscriptionStream(BytesIO(buffer.getvalue()), client)
+            arrivals = [(time.perf_counter(), transcription) async for transcription in stream]
+            end = time.perf_counter()
+
+    assert [t.translation for _, t in arrivals] == ["This is sentence 1.", "This is sentence 2.", "This is sentence 3."]
+    assert stream.truncated and stream.total_tokens > 0
+    # The first sentence is ready while most of the response is still being written.
+    assert end - arrivals[0][0] > 0.1
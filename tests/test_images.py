@@ -0,0 +1,42 @@
+"""Tests for image probing and preprocessing."""
+
+from io import BytesIO
+
+from PIL import Image
+
+from linguaphoto.ai.images import prepare_image
+
+
+def _jpeg_bytes(width: int, height: int, orientation: int | None = None) -> bytes:
+    image = Image.new("RGB", (width, height), "white")
+    # Mark the top left corner, to check where it ends up.
+    image.paste((255, 0, 0), (0, 0, width // 4, height // 4))
+    exif = Image.Exif()
+    if orientation is not None:
+        exif[0x0112] = orientation
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG", quality=95, exif=exif)
+    return buffer.getvalue()
+
+
+def test_prepare_image_downscales_and_applies_orientation() -> None:
+    # Orientation 6 means the camera was rotated, and the image must be turned 90 degrees clockwise.
+    content = _jpeg_bytes(4000, 3000, orientation=6)
+    prepared = prepare_image(content, max_long_edge=1000, quality=80)
+
+    assert (prepared.original_width, prepared.original_height) == (4000, 3000)
+    assert (prepared.width, prepared.height) == (750, 1000)
+    assert len(prepared.data) < len(content)
+    with Image.open(BytesIO(prepared.data)) as image:
+        assert image.format == "JPEG"
+        assert image.size == (750, 1000)
+        # The red corner is now at the top right.
+        red, green, _ = image.getpixel((image.width - 10, 10))  # type: ignore[misc]
+        assert red > 200 and green < 50
+
+
+def test_prepare_image_keeps_small_images() -> None:
+    buffer = BytesIO()
+    Image.new("RGBA", (300, 200)).save(buffer, format="PNG")
+    prepared = prepare_image(buffer.getvalue(), max_long_edge=1000)
+    assert (prepared.width, prepared.height) == (300, 200)
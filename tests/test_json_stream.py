@@ -0,0 +1,49 @@
+"""Tests for the incremental JSON array parser."""
+
+import json
+
+from linguaphoto.utils.json_stream import ArrayElementParser
+
+SENTENCES = [
+    {"text": "你好，“朋友”", "pinyin": "nǐhǎo", "translation": 'Hello, "friend" {}', "audio_url": ""},
+    {"text": "再见", "pinyin": "zàijiàn", "translation": "Goodbye", "audio_url": ""},
+]
+
+
+def test_elements_are_returned_as_soon_as_they_are_complete() -> None:
+    document = "```json\n" + json.dumps({"other": [{"x": 1}], "transcriptions": SENTENCES}, ensure_ascii=False)
+    end_of_first = document.index('""}') + 3
+
+    for size in (1, 5, len(document)):
+        parser = ArrayElementParser("transcriptions")
+        seen: list[tuple[int, dict]] = []
+        for i in range(0, len(document), size):
+            seen.extend((i + size, element) for element in parser.feed(document[i : i + size]))
+        assert [element for _, element in seen] == SENTENCES
+        assert parser.close() == []
+        if size == 1:
+            # Each element is returned by the piece that closes it, not at the end.
+            assert seen[0][0] == end_of_first
+
+
+def test_malformed_elements_are_skipped() -> None:
+    parser = ArrayElementParser("transcriptions")
+    elements = parser.feed('{"transcriptions": [{"text": "一" "pinyin": "yī"}, {"text": "二"}]}')
+    assert elements == [{"text": "二"}]
+    assert parser.skipped == 1
+
+
+def test_truncated_element_keeps_its_complete_fields() -> None:
+    document = json.dumps({"transcriptions": SENTENCES}, ensure_ascii=False)
+    start = document.index('{"text": "再见"')
+    cases = {
+        '{"text": "再': [],
+        '{"text": "再见", "pinyin": "zài': [{"text": "再见"}],
+        '{"text": "再见", "pinyin": "zàijiàn"': [{"text": "再见", "pinyin": "zàijiàn"}],
+        '{"text": "再见", "pinyin": "zàijiàn", "transl': [{"text": "再见", "pinyin": "zàijiàn"}],
+        '{"text": "再见", "pinyin": "zàijiàn", "translation":': [{"text": "再见", "pinyin": "zàijiàn"}],
+    }
+    for truncated, repaired in cases.items():
+        parser = ArrayElementParser("transcriptions")
+        assert parser.feed(document[:start] + truncated) == SENTENCES[:1]
+        assert parser.close() == repaired
@@ -0,0 +1,48 @@
+"""Tests for the metrics exported at /metrics."""
+
+from fastapi import APIRouter, FastAPI, Request
+from fastapi.testclient import TestClient
+from pytest_mock import MockerFixture
+
+from linguaphoto.settings import settings
+from linguaphoto.utils.metrics import UNMATCHED_ROUTE, route_template
+
+
+def test_route_template_includes_the_router_prefixes() -> None:
+    files = APIRouter()
+
+    @files.get("/items/{path:path}")
+    async def item(path: str, request: Request) -> str:
+        return route_template(request.scope)
+
+    api = APIRouter()
+    api.include_router(files, prefix="/files")
+    app = FastAPI()
+    app.include_router(api, prefix="/v1")
+
+    # Path parameters may hold slashes, so the template cannot be rebuilt from the request path.
+    assert TestClient(app).get("/v1/files/items/a/b").json() == "/v1/files/items/{path:path}"
+    assert route_template({"type": "http", "path": "/no-such-route"}) == UNMATCHED_ROUTE
+
+
+def test_metrics_endpoint(aws_tables: str, app_client: TestClient, mocker: MockerFixture) -> None:
+    # Without a token the endpoint is not served, and with one only to scrapers sending it.
+    assert app_client.get("/metrics").status_code == 404
+    mocker.patch.object(settings, "metrics_token", "scrape")
+    assert app_client.get("/metrics").status_code == 401
+    assert app_client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+
+    assert app_client.get("/collection/get_public_items").status_code == 200
+    assert app_client.post("/user/signin", json={"email": "nobody@example.com", "password": "x"}).status_code == 422
+    app_client.get("/no-such-route")
+
+    response = app_client.get("/metrics", headers={"Authorization": "Bearer scrape"})
+    assert response.status_code == 200
+    text = response.text
+    assert 'http_request_duration_seconds_count{method="GET",route="/collection/get_public_items"}' in text
+    assert 'http_requests_total{method="POST",route="/user/signin",status="422"} ' in text
+    assert 'http_requests_total{method="GET",route="unmatched",status="404"} ' in text
+    assert 'crud_operation_duration_seconds_count{operation="get_items_from_secondary_index"}' in text
+    assert 'aws_requests_total{operation="Query",service="dynamodb"}' in text
+    assert 'dynamodb_consumed_capacity_units_total{operation="Query"}' in text
+    assert "translation_queue_depth 0.0" in text
@@ -0,0 +1,71 @@
+"""Tests for the shared OpenAI client, against a local stand-in server."""
+
+import json
+from io import BytesIO
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from PIL import Image
+from pytest_mock import MockerFixture
+
+from linguaphoto.ai.client import get_openai_client, openai_pool
+from linguaphoto.ai.transcribe import transcribe_image
+from linguaphoto.ai.tts import synthesize_text
+from linguaphoto.settings import settings
+
+
+@pytest.mark.asyncio
+async def test_pipeline_shares_one_keep_alive_connection(mocker: MockerFixture) -> None:
+    peers: set[tuple[str, int]] = set()
+
+    async def chat_completions(request: web.Request) -> web.Response:
+        peers.add(request.transport.get_extra_info("peername") if request.transport else ("", 0))
+        body = await request.json()
+        assert body["messages"][0]["content"][1]["image_url"]["url"].startswith("data:image/jpeg;base64,")
+        content = {"transcriptions": [{"text": "你好", "pinyin": "nǐhǎo", "translation": "Hello", "audio_url": ""}]}
+        return web.json_response(
+            {
+                "id": "chatcmpl-test",
+                "object": "chat.completion",
+                "created": 0,
+                "model": body["model"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "finish_reason": "stop",
+                        "message": {"role": "assistant", "content": json.dumps(content)},
+                    }
+                ],
+                "usage": {"prompt_tokens": 100, "completion_tokens": 20, "total_tokens": 120},
+            }
+        )
+
+    async def speech(request: web.Request) -> web.Response:
+        peers.add(request.transport.get_extra_info("peername") if request.transport else ("", 0))
+        body = await request.json()
+        return web.Response(body=body["input"].encode("utf-8"), content_type="audio/mpeg")
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    app.router.add_post("/v1/audio/speech", speech)
+    buffer = BytesIO()
+    Image.new("RGB", (64, 64), "white").save(buffer, format="PNG")
+
+    async with TestServer(app) as server:
+        mocker.patch.object(settings, "openai_key", "test")
+        mocker.patch.object(settings, "openai_base_url", str(server.make_url("/v1")))
+        # This server only answers whole completions.
+        mocker.patch.object(settings, "vision_stream", False)
+        async with openai_pool:
+            for _ in range(3):
+                async with get_openai_client() as client:
+                    response = await transcribe_image(BytesIO(buffer.getvalue()), client)
+                    audio = b"".join([chunk async for chunk in await synthesize_text("你好", client)])
+            assert openai_pool.started
+
+    assert [t.text for t in response.transcriptions] == ["你好"]
+    assert response.total_tokens == 120
+    assert audio == "你好".encode("utf-8")
+    # Six requests, all over the same pooled connection.
+    assert len(peers) == 1
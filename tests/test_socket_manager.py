@@ -0,0 +1,77 @@
+"""Tests for the Socket.IO notifications."""
+
+import asyncio
+from typing import Callable
+
+import pytest
+import socketio
+
+from linguaphoto.socket_manager import create_client_manager, create_server, user_room
+from linguaphoto.utils.auth import create_access_token
+
+
+async def _connect(url: str, user_id: str, received: list) -> socketio.AsyncClient:
+    client = socketio.AsyncClient()
+    client.on("notification", received.append)
+    await client.connect(url, transports=["websocket"])
+    # Asking for an acknowledgement waits until the socket has joined the user's room.
+    assert await client.call("register_user", create_access_token({"id": user_id}))
+    return client
+
+
+async def _until(condition: Callable[[], object]) -> None:
+    async def wait() -> None:
+        while not condition():
+            await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(wait(), timeout=5)
+
+
+@pytest.mark.asyncio
+async def test_notifications_reach_every_device_on_every_worker(serve_socketio: Callable) -> None:
+    servers = [create_server(create_client_manager("fakeredis://", "test-notify")) for _ in range(2)]
+    async with serve_socketio(servers) as urls:
+        phone: list[dict] = []
+        laptop: list[dict] = []
+        other_user: list[dict] = []
+        clients = [
+            await _connect(urls[0], "alice", phone),
+            await _connect(urls[1], "alice", laptop),
+            await _connect(urls[1], "bob", other_user),
+        ]
+        # Each worker starts listening on the channel after its first connection.
+        await _until(lambda: all(server.manager.pubsub and server.manager.pubsub.subscribed for server in servers))
+
+        # Sent from the first worker, which only has one of the user's sockets.
+        await servers[0].emit("notification", {"id": "image"}, room=user_room("alice"))
+        await _until(lambda: phone and laptop)
+
+        for client in clients:
+            await client.disconnect()
+        # Disconnected sockets leave their rooms, so nothing is kept for users who are gone.
+        await _until(lambda: not any(server.manager.rooms.get("/", {}).get(user_room("alice")) for server in servers))
+
+    assert phone == laptop == [{"id": "image"}]
+    assert other_user == []
+
+
+@pytest.mark.asyncio
+async def test_registering_needs_the_users_token(serve_socketio: Callable) -> None:
+    server = create_server(create_client_manager("", "test-register"))
+    async with serve_socketio([server]) as [url]:
+        owner: list[dict] = []
+        intruder: list[dict] = []
+        clients = [await _connect(url, "alice", owner), socketio.AsyncClient()]
+        clients[1].on("notification", intruder.append)
+        await clients[1].connect(url, transports=["websocket"])
+        # Naming another user, or sending a forged token, joins no room.
+        assert not await clients[1].call("register_user", "alice")
+        assert not await clients[1].call("register_user", "not-a-token")
+
+        await server.emit("notification", {"id": "image"}, room=user_room("alice"))
+        await _until(lambda: owner)
+        for client in clients:
+            await client.disconnect()
+
+    assert owner == [{"id": "image"}]
+    assert intruder == []
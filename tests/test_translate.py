@@ -0,0 +1,224 @@
+"""Tests for the image translation pipeline, with OpenAI calls stubbed out."""
+
+import asyncio
+import pkgutil
+import threading
+from io import BytesIO
+from typing import AsyncIterator, Callable, ParamSpec, TypeVar
+
+import pytest
+from fastapi import UploadFile
+from PIL import Image as PILImage
+from pytest_mock import MockerFixture
+
+from linguaphoto.ai.images import prepare_image
+from linguaphoto.ai.transcribe import TranscriptionStream
+from linguaphoto.crud.image import inspect_upload
+from linguaphoto.db import Crud
+from linguaphoto.models import Image, Transcription, TranscriptionResponse
+from linguaphoto.schemas.events import SentenceAudioReady, TranscriptionReady, TranslationDone, TranslationEvent
+from linguaphoto.settings import settings
+from linguaphoto.utils.cache import audio_cache, audio_cache_stats, recent_uploads
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+
+async def _fake_sign_many(urls: list[str], expire_days: int = 1) -> list[str]:
+    return [f"{url}?signed" for url in urls]
+
+
+def _record_thread(func: Callable[P, R], threads: list[threading.Thread]) -> Callable[P, R]:
+    def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+        threads.append(threading.current_thread())
+        return func(*args, **kwargs)
+
+    return wrapper
+
+
+def _off_the_loop(func: Callable[P, R]) -> Callable[P, R]:
+    """Wraps a blocking call so that it fails when made on a thread which is running an event loop."""
+
+    def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return func(*args, **kwargs)
+        raise AssertionError(f"Blocking call to {func.__qualname__} on the event loop")
+
+    return wrapper
+
+
+async def _audio_chunks(text: str) -> AsyncIterator[bytes]:
+    yield text.encode("utf-8")
+
+
+class _FakeStream:
+    """Stands in for `TranscriptionStream`, yielding the sentences of a response."""
+
+    def __init__(self, response: TranscriptionResponse) -> None:
+        self.response = response
+        self.total_tokens = response.total_tokens
+
+    async def __aiter__(self) -> AsyncIterator[Transcription]:
+        for transcription in self.response.transcriptions:
+            yield transcription.model_copy()
+
+
+@pytest.mark.asyncio
+async def test_translate_synthesizes_sentences_concurrently_in_order(aws_tables: str, mocker: MockerFixture) -> None:
+    mocker.patch.object(settings, "media_signed_cookies", True)
+    mocker.patch.object(settings, "tts_concurrency", 3)
+    mocker.patch.object(settings, "openai_key", "test")
+    mocker.patch("linguaphoto.crud.image.media_hosting_server", "https://media.example.com")
+    mocker.patch.object(Crud, "_download_from_s3", return_value=b"image")
+    mocker.patch("linguaphoto.crud.image.get_url_signer").return_value.sign_many.side_effect = _fake_sign_many
+    audio_cache.clear()
+    texts = [f"sentence {i}" for i in range(6)]
+    mocker.patch(
+        "linguaphoto.crud.image.TranscriptionStream",
+        return_value=_FakeStream(
+            TranscriptionResponse(
+                transcriptions=[Transcription(text=text, pinyin="", translation="", audio_url="") for text in texts]
+            )
+        ),
+    )
+
+    in_flight = 0
+    max_in_flight = 0
+
+    async def synthesize_text(text: str, client: object, **kwargs: str) -> AsyncIterator[bytes]:
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        # Later sentences finish first, so the order has to be restored.
+        await asyncio.sleep(0.05 * (len(texts) - int(text.rsplit(maxsplit=1)[-1])))
+        in_flight -= 1
+        if text == "sentence 2":
+            raise RuntimeError("TTS failed")
+        return _audio_chunks(text)
+
+    mocker.patch("linguaphoto.crud.image.synthesize_text", side_effect=synthesize_text)
+    events: list[TranslationEvent] = []
+
+    async def on_event(event: TranslationEvent) -> None:
+        events.append(event)
+
+    async with Crud() as crud:
+        image = Image.create(image_url="https://media.example.com/image.jpg", user_id="user", collection_id="c")
+        await crud._add_item(image)
+        translated = await crud.translate(image.id, "user", on_event=on_event)
+        stored = await crud.get_image(image.id)
+
+    assert max_in_flight == 3
+    assert stored is not None and stored.is_translated
+    assert [t.text for t in stored.transcriptions] == texts
+    assert stored.transcriptions[2].audio_url == ""
+    assert all(
+        t.audio_url.startswith("https://media.example.com/tts/") and t.audio_url.endswith(".mp3?signed")
+        for i, t in enumerate(stored.transcriptions)
+        if i != 2
+    )
+    assert translated.transcriptions == stored.transcriptions
+
+    # The text is sent before any speech, then each sentence's speech as it is uploaded, in any order.
+    assert isinstance(events[0], TranscriptionReady)
+    assert [(t.text, t.audio_url) for t in events[0].transcriptions] == [(text, "") for text in texts]
+    audio_events = events[1:-1]
+    assert all(isinstance(event, SentenceAudioReady) for event in audio_events)
+    assert sorted((e.index, e.audio_url) for e in audio_events) == [  # type: ignore[attr-defined]
+        (i, stored.transcriptions[i].audio_url) for i in (0, 1, 3, 4, 5)
+    ]
+    assert events[-1] == TranslationDone(image_id=image.id, image=stored)
+
+
+@pytest.mark.asyncio
+async def test_translate_reuses_cached_speech(aws_tables: str, mocker: MockerFixture) -> None:
+    mocker.patch.object(settings, "openai_key", "test")
+    mocker.patch("linguaphoto.crud.image.media_hosting_server", "https://media.example.com")
+    mocker.patch.object(Crud, "_download_from_s3", return_value=b"image")
+    mocker.patch("linguaphoto.crud.image.get_url_signer").return_value.sign_many.side_effect = _fake_sign_many
+    transcribe = mocker.patch("linguaphoto.crud.image.TranscriptionStream")
+    synthesize = mocker.patch(
+        "linguaphoto.crud.image.synthesize_text",
+        side_effect=lambda text, client, **kwargs: _audio_chunks(text),
+    )
+    audio_cache.clear()
+    stats_before = (audio_cache_stats.memory_hits, audio_cache_stats.store_hits, audio_cache_stats.misses)
+
+    def transcriptions(*texts: str) -> _FakeStream:
+        return _FakeStream(
+            TranscriptionResponse(
+                transcriptions=[Transcription(text=text, pinyin="", translation="", audio_url="") for text in texts]
+            )
+        )
+
+    async with Crud() as crud:
+        images = [
+            Image.create(image_url=f"https://media.example.com/{i}.jpg", user_id="u", collection_id="c")
+            for i in range(3)
+        ]
+        for image in images:
+            await crud._add_item(image)
+
+        transcribe.return_value = transcriptions("你好", "再见")
+        first = await crud.translate(images[0].id, "u")
+        # Equivalent text (after whitespace normalization) hits the in-process cache.
+        transcribe.return_value = transcriptions(" 你好 ", "谢谢")
+        second = await crud.translate(images[1].id, "u")
+        # A fresh process falls back to the table.
+        audio_cache.clear()
+        transcribe.return_value = transcriptions("再见")
+        third = await crud.translate(images[2].id, "u")
+
+    # Sentences are synthesized concurrently, so only the set of texts is fixed.
+    assert sorted(call.args[0] for call in synthesize.call_args_list) == sorted(["你好", "再见", "谢谢"])
+    assert first.transcriptions[0].audio_url == second.transcriptions[0].audio_url
+    assert first.transcriptions[1].audio_url == third.transcriptions[0].audio_url
+    assert (
+        audio_cache_stats.memory_hits - stats_before[0],
+        audio_cache_stats.store_hits - stats_before[1],
+        audio_cache_stats.misses - stats_before[2],
+    ) == (1, 1, 3)
+
+
+@pytest.mark.asyncio
+async def test_translate_does_not_block_the_event_loop(aws_tables: str, mocker: MockerFixture) -> None:
+    mocker.patch.object(settings, "openai_key", "test")
+    mocker.patch.object(settings, "media_signed_cookies", True)
+    mocker.patch("linguaphoto.crud.image.media_hosting_server", "https://media.example.com")
+    mocker.patch("linguaphoto.crud.image.get_url_signer").return_value.sign_many.side_effect = _fake_sign_many
+
+    async def no_sentences(self: TranscriptionStream, base64_image: str) -> AsyncIterator[str]:
+        yield '{"transcriptions": []}'
+
+    # The real stream runs, so the image is decoded and re-encoded; only the vision request is stubbed.
+    mocker.patch.object(TranscriptionStream, "_completion_text", no_sentences)
+    # Blocking network I/O, such as downloading the image again with requests, fails the test.
+    for target in ("socket.create_connection", "urllib.request.urlopen", "requests.Session.request"):
+        mocker.patch(target, side_effect=_off_the_loop(pkgutil.resolve_name(target)))
+    threads: list[threading.Thread] = []
+    prepare = mocker.patch("linguaphoto.ai.images.prepare_image", side_effect=_record_thread(prepare_image, threads))
+    inspect = mocker.patch("linguaphoto.crud.image.inspect_upload", side_effect=_record_thread(inspect_upload, threads))
+    buffer = BytesIO()
+    PILImage.new("RGB", (32, 32), "white").save(buffer, format="PNG")
+
+    async with Crud() as crud:
+        collection = await crud.create_collection("user", "title", "description")
+        image = await crud.create_image(UploadFile(BytesIO(buffer.getvalue()), filename="a.png"), "user", collection.id)
+        # Without the in-process handoff the image is streamed back from S3.
+        recent_uploads.clear()
+        download = mocker.spy(Crud, "_download_from_s3")
+        await crud.translate(image.id, "user")
+
+        # Images uploaded in this process are handed over without a download.
+        second = await crud.create_image(
+            UploadFile(BytesIO(buffer.getvalue() + b"x"), filename="b.png"), "user", collection.id
+        )
+        await crud.translate(second.id, "user")
+
+    # Hashing and PIL work ran on the shared pool rather than on the event loop's thread.
+    assert inspect.call_count == 2 and prepare.call_count == 2
+    assert len(threads) == 4 and threading.current_thread() not in threads
+    assert download.call_count == 1
+    assert [call.args[0] for call in prepare.call_args_list] == [buffer.getvalue(), buffer.getvalue() + b"x"]
@@ -0,0 +1,171 @@
+"""Tests for translation jobs and the worker pool."""
+
+import asyncio
+
+import pytest
+from pytest_mock import MockerFixture
+
+from linguaphoto.crud.image import ImageCrud
+from linguaphoto.crud.job import JobCrud
+from linguaphoto.errors import ItemNotFoundError
+from linguaphoto.models import Image, TranslationJob
+from linguaphoto.schemas.events import TranslationDone, TranslationFailed
+from linguaphoto.worker import DEFAULT_FAILURE_MESSAGE, TranslationWorkerPool
+
+
+@pytest.mark.asyncio
+async def test_job_leases(aws_tables: str) -> None:
+    job_id = TranslationJob.get_id("image")
+    async with JobCrud() as crud:
+        assert await crud.enqueue_translation("image", "user")
+        assert not await crud.enqueue_translation("image", "user")
+        assert [job.id for job in await crud.get_claimable_jobs(10)] == [job_id]
+
+        job = await crud.claim_job(job_id, "worker-a", lease_seconds=60, max_attempts=3)
+        assert job is not None and job.status == "running" and job.attempts == 1
+        assert await crud.claim_job(job_id, "worker-b", lease_seconds=60, max_attempts=3) is None
+        assert await crud.get_claimable_jobs(10) == []
+
+        # A zero-length lease expires immediately, so another worker can take over.
+        assert await crud.renew_lease(job_id, "worker-a", lease_seconds=0)
+        job = await crud.claim_job(job_id, "worker-b", lease_seconds=60, max_attempts=3)
+        assert job is not None and job.lease_owner == "worker-b" and job.attempts == 2
+        assert not await crud.complete_job(job_id, "worker-a")
+
+        assert await crud.complete_job(job_id, "worker-b")
+        assert await crud.enqueue_translation("image", "user")
+        # The finished job is replaced by a fresh one.
+        job = await crud.get_job(job_id)
+        assert job is not None and (job.status, job.attempts, job.lease_owner) == ("pending", 0, None)
+
+
+@pytest.mark.asyncio
+async def test_claim_gives_up_on_jobs_which_keep_losing_their_lease(aws_tables: str) -> None:
+    job_id = TranslationJob.get_id("image")
+    async with JobCrud() as crud:
+        assert await crud.enqueue_translation("image", "user")
+        assert await crud.claim_job(job_id, "worker-a", lease_seconds=0, max_attempts=1) is not None
+
+        # The worker died without failing the job, so its lease ran out.
+        job = await crud.claim_job(job_id, "worker-b", lease_seconds=60, max_attempts=1)
+        assert job is not None and job.status == "failed" and job.attempts == 1
+        assert await crud.get_claimable_jobs(10) == []
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_runs_jobs(aws_tables: str, mocker: MockerFixture) -> None:
+    image = Image.create(image_url="url", user_id="user", collection_id="collection")
+    translate = mocker.patch.object(ImageCrud, "translate", return_value=image)
+    notify_user = mocker.patch("linguaphoto.worker.notify_user")
+
+    pool = TranslationWorkerPool(num_workers=2, queue_size=10, lease_seconds=60, poll_seconds=0.1)
+    await pool.start()
+    assert await pool.enqueue(image.id, "user")
+    assert not await pool.enqueue(image.id, "user")
+
+    async with JobCrud() as crud:
+        for _ in range(50):
+            job = await crud.get_job(TranslationJob.get_id(image.id))
+            if job is not None and job.status == "done":
+                break
+            await asyncio.sleep(0.1)
+    await pool.drain()
+
+    assert job is not None and job.status == "done"
+    translate.assert_awaited_once()
+    assert translate.await_args.args == (image.id, "user")
+    # The events are sent by the translation itself, to the job's user.
+    on_event = translate.await_args.kwargs["on_event"]
+    await on_event(TranslationDone(image_id=image.id, image=image))
+    notify_user.assert_awaited_once_with("user", TranslationDone(image_id=image.id, image=image))
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "error, message",
+    [
+        (RuntimeError("vision model unavailable at https://internal"), DEFAULT_FAILURE_MESSAGE),
+        (ItemNotFoundError("Image not found in table Linguaphoto"), "The image no longer exists"),
+    ],
+)
+async def test_worker_pool_reports_failures(
+    aws_tables: str, mocker: MockerFixture, error: Exception, message: str
+) -> None:
+    mocker.patch.object(ImageCrud, "translate", side_effect=error)
+    notify_user = mocker.patch("linguaphoto.worker.notify_user")
+
+    pool = TranslationWorkerPool(num_workers=1, queue_size=10, lease_seconds=60, max_attempts=1, poll_seconds=0.1)
+    await pool.start()
+    assert await pool.enqueue("image", "user")
+    async with JobCrud() as crud:
+        for _ in range(50):
+            job = await crud.get_job(TranslationJob.get_id("image"))
+            if job is not None and job.status == "failed":
+                break
+            await asyncio.sleep(0.1)
+    await pool.drain()
+
+    # The user is not sent the exception's message, which may hold internal details.
+    assert job is not None and job.status == "failed" and job.error == type(error).__name__
+    notify_user.assert_awaited_once_with("user", TranslationFailed(image_id="image", error=message, retrying=False))
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "renewal",
+    [
+        {"return_value": False},
+        # Renewal errors are retried, but the translation is stopped once the lease has expired meanwhile.
+        {"side_effect": RuntimeError("throttled")},
+    ],
+    ids=["taken", "failing"],
+)
+async def test_worker_pool_cancels_translation_after_losing_lease(
+    aws_tables: str, mocker: MockerFixture, renewal: dict
+) -> None:
+    cancelled = asyncio.Event()
+
+    async def translate(*args: object, **kwargs: object) -> None:
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    mocker.patch.object(ImageCrud, "translate", side_effect=translate)
+    mocker.patch.object(JobCrud, "renew_lease", **renewal)
+
+    pool = TranslationWorkerPool(num_workers=1, queue_size=10, lease_seconds=1, poll_seconds=60)
+    await pool.start()
+    assert await pool.enqueue("image", "user")
+    await asyncio.wait_for(cancelled.wait(), timeout=5)
+    await pool.drain()
+
+    async with JobCrud() as crud:
+        job = await crud.get_job(TranslationJob.get_id("image"))
+    # Left running, so that it is reclaimed once the lease expires.
+    assert job is not None and job.status == "running" and job.attempts == 1
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_retries_failed_lease_renewals(aws_tables: str, mocker: MockerFixture) -> None:
+    async def translate(*args: object, **kwargs: object) -> None:
+        await asyncio.sleep(1.5)
+
+    mocker.patch.object(ImageCrud, "translate", side_effect=translate)
+    renew_lease = mocker.patch.object(JobCrud, "renew_lease", side_effect=[RuntimeError("throttled"), True, True, True])
+
+    pool = TranslationWorkerPool(num_workers=1, queue_size=10, lease_seconds=1, poll_seconds=60)
+    await pool.start()
+    assert await pool.enqueue("image", "user")
+    async with JobCrud() as crud:
+        for _ in range(50):
+            job = await crud.get_job(TranslationJob.get_id("image"))
+            if job is not None and job.status == "done":
+                break
+            await asyncio.sleep(0.1)
+    await pool.drain()
+
+    # The translation outlived its first lease, but kept it by retrying the renewal which failed.
+    assert job is not None and job.status == "done"
+    assert renew_lease.await_count >= 2